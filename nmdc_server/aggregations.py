@@ -1,12 +1,13 @@
-from typing import Any, Dict, List, Type, cast
+from typing import Any, Dict, List, Optional, Type, cast
 
-from sqlalchemy import Column, func, or_, select, union_all
+from sqlalchemy import Column, func, literal, or_, select, union_all
 from sqlalchemy.orm import Query, Session
 from sqlalchemy.sql import Alias, Selectable
 
 from nmdc_server import models, query, schemas
 from nmdc_server.attribute_units import get_attribute_units
 from nmdc_server.data_object_filters import WorkflowActivityTypeEnum
+from nmdc_server.ingest import environment_rollup
 
 
 def get_annotation_summary(
@@ -219,23 +220,37 @@ def get_wfe_output_data_objects(db: Session) -> List[models.DataObject]:
     return q.all()
 
 
+def _environment_source(db: Session, biosample_query: query.BiosampleQuerySchema) -> Any:
+    """Return the environment rollup rows of the biosamples matching a query.
+
+    Without conditions, these are read from the rollup computed at ingest.  Otherwise every
+    matching biosample is a row with a count of 1.
+    """
+    if not biosample_query.conditions and environment_rollup.is_loaded(db):
+        return models.EnvironmentRollup.__table__
+    subquery = biosample_query.query(db).subquery()
+    return (
+        db.query(*environment_rollup.dimensions, literal(1).label("count"))
+        .join(subquery, models.Biosample.id == subquery.c.id)
+        .subquery()
+    )
+
+
 def get_sankey_aggregation(
     db: Session,
     biosample_query: query.BiosampleQuerySchema,
 ) -> List[schemas.EnvironmentSankeyAggregation]:
+    source = _environment_source(db, biosample_query)
     columns = [
-        models.Biosample.ecosystem,
-        models.Biosample.ecosystem_category,
-        models.Biosample.ecosystem_type,
-        models.Biosample.ecosystem_subtype,
-        models.Biosample.ecosystem_subtype,
-        models.Biosample.specific_ecosystem,
+        source.c.ecosystem,
+        source.c.ecosystem_category,
+        source.c.ecosystem_type,
+        source.c.ecosystem_subtype,
+        source.c.specific_ecosystem,
     ]
-    subquery = biosample_query.query(db).subquery()
     rows = (
-        db.query(func.count().label("count"), *columns)
+        db.query(func.sum(source.c.count).label("count"), *columns)
         .filter(or_(*[column.isnot(None) for column in columns]))
-        .join(subquery, models.Biosample.id == subquery.c.id)
         .group_by(*columns)
     )
     return [schemas.EnvironmentSankeyAggregation.from_orm(r) for r in rows]
@@ -244,19 +259,33 @@ def get_sankey_aggregation(
 def get_geospatial_aggregation(
     db: Session,
     biosample_query: query.BiosampleQuerySchema,
+    zoom: Optional[int] = None,
 ) -> List[schemas.EnvironmentGeospatialAggregation]:
-    columns = [
-        models.Biosample.latitude,
-        models.Biosample.longitude,
-        models.Biosample.ecosystem,
-        models.Biosample.ecosystem_category,
-    ]
-    subquery = biosample_query.query(db).subquery()
-    rows = (
-        db.query(func.count().label("count"), *columns)
-        .join(subquery, models.Biosample.id == subquery.c.id)
-        .group_by(*columns)
-    )
+    """Count the matching biosamples by location and ecosystem.
+
+    If a zoom level is given, the locations are clustered on a grid of 2^zoom cells around
+    the globe, and each cluster is reported at the weighted center of its locations.
+    """
+    source = _environment_source(db, biosample_query)
+    count = func.sum(source.c.count)
+    ecosystem_columns = [source.c.ecosystem, source.c.ecosystem_category]
+    if zoom is None:
+        coordinates = [source.c.latitude, source.c.longitude]
+        rows = db.query(count.label("count"), *coordinates, *ecosystem_columns).group_by(
+            *coordinates, *ecosystem_columns
+        )
+    else:
+        cell_size = 360 / 2**zoom
+        cells = [
+            func.floor(source.c.latitude / cell_size),
+            func.floor(source.c.longitude / cell_size),
+        ]
+        rows = db.query(
+            count.label("count"),
+            (func.sum(source.c.latitude * source.c.count) / count).label("latitude"),
+            (func.sum(source.c.longitude * source.c.count) / count).label("longitude"),
+            *ecosystem_columns,
+        ).group_by(*cells, *ecosystem_columns)
     return [schemas.EnvironmentGeospatialAggregation.from_orm(r) for r in rows]
 
 
@@ -1,17 +1,15 @@
 import csv
-import datetime
-import json
 import time
-import zipfile
 from enum import StrEnum
+from functools import lru_cache
 from importlib import resources
-from io import BytesIO, RawIOBase, StringIO
-from typing import IO, Any, Dict, List, Optional, Union, cast
+from io import BytesIO, StringIO
+from typing import Any, Dict, List, Optional, Union
 from uuid import UUID, uuid4
 
 import httpx
-from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import FileResponse, JSONResponse
 from linkml_runtime.utils.schemaview import SchemaView
 from nmdc_api_utilities.biosample_search import BiosampleSearch
 from nmdc_api_utilities.study_search import StudySearch
@@ -21,7 +19,17 @@ from sqlalchemy.orm import Session
 from starlette.background import BackgroundTask
 from starlette.responses import StreamingResponse
 
-from nmdc_server import crud, github, models, query, schemas, schemas_submission
+from nmdc_server import (
+    crud,
+    github,
+    http_cache,
+    metadata_export,
+    models,
+    query,
+    response_cache,
+    schemas,
+    schemas_submission,
+)
 from nmdc_server.auth import admin_required, get_current_user, login_required_responses
 from nmdc_server.bulk_download_schema import BulkDownload, BulkDownloadCreate
 from nmdc_server.config import settings
@@ -34,8 +42,8 @@ from nmdc_server.crud import (
     read_roles,
     replace_nersc_data_url_prefix,
 )
-from nmdc_server.data_object_filters import WorkflowActivityTypeEnum
 from nmdc_server.database import SessionLocal, get_db
+from nmdc_server.ingest import biosample_card, summary
 from nmdc_server.ingest.envo import nested_envo_trees
 from nmdc_server.logger import get_logger
 from nmdc_server.metadata import SampleMetadataSuggester, get_sample_metadata_suggester
@@ -47,6 +55,7 @@ from nmdc_server.models import (
     User,
 )
 from nmdc_server.pagination import Pagination
+from nmdc_server.query import BiosampleQuerySchema
 from nmdc_server.storage import BucketName, sanitize_filename, storage
 from nmdc_server.table import Table
 
@@ -55,6 +64,17 @@ router = APIRouter()
 logger = get_logger(__name__)
 
 
+async def select_query_planner(
+    planner: Optional[query.QueryPlanner] = Query(
+        None,
+        description="Strategy used to combine the search conditions (defaults to the server setting).",
+    ),
+):
+    r"""Use the query planner requested by the client for the rest of the request."""
+    if planner is not None:
+        query.query_planner.set(planner)
+
+
 # Get system health.
 @router.get("/health", name="Get system health", response_model=schemas.HealthResponse)
 def get_health(
@@ -185,20 +205,28 @@ def text_search(terms: str, limit=6, db: Session = Depends(get_db)):
 # database summary
 @router.get(
     "/summary",
+    dependencies=[Depends(http_cache.generation_etag)],
     response_model=schemas.DatabaseSummary,
     tags=["aggregation"],
     response_model_exclude_unset=True,
 )
-async def get_database_summary(db: Session = Depends(get_db)):
+def get_database_summary(db: Session = Depends(get_db)):
+    payload = summary.get_payload(db, "summary")
+    if payload is not None:
+        return JSONResponse(payload)
     return crud.get_database_summary(db)
 
 
 @router.get(
     "/stats",
+    dependencies=[Depends(http_cache.generation_etag)],
     response_model=schemas.AggregationSummary,
     tags=["aggregation"],
 )
-async def get_aggregated_stats(db: Session = Depends(get_db)):
+def get_aggregated_stats(db: Session = Depends(get_db)):
+    payload = summary.get_payload(db, "stats")
+    if payload is not None:
+        return JSONResponse(payload)
     return crud.get_aggregated_stats(db)
 
 
@@ -207,7 +235,7 @@ async def get_aggregated_stats(db: Session = Depends(get_db)):
     response_model=schemas.AdminStats,
     tags=["administration"],
 )
-async def get_admin_stats(
+def get_admin_stats(
     db: Session = Depends(get_db),
     user: models.User = Depends(admin_required),
 ):
@@ -219,7 +247,7 @@ async def get_admin_stats(
 
 
 @router.get("/admin/data_object_report", name="Get a data object report")
-async def get_data_object_report(
+def get_data_object_report(
     db: Session = Depends(get_db),
     user: models.User = Depends(admin_required),
     variant: DataObjectReportVariant = Query(
@@ -258,93 +286,177 @@ async def get_data_object_report(
 
 @router.post(
     "/environment/sankey",
+    dependencies=[Depends(http_cache.generation_etag)],
     response_model=List[schemas.EnvironmentSankeyAggregation],
     tags=["aggregation"],
 )
-async def get_environmental_sankey(
+def get_environmental_sankey(
+    request: Request,
+    response: Response,
     query: query.BiosampleQuerySchema = query.BiosampleQuerySchema(),
     db: Session = Depends(get_db),
 ):
-    return crud.get_environmental_sankey(db, query)
+    return response_cache.cached(
+        request, response, db, query, lambda: crud.get_environmental_sankey(db, query)
+    )
 
 
 @router.post(
     "/environment/geospatial",
+    dependencies=[Depends(http_cache.generation_etag)],
     response_model=List[schemas.EnvironmentGeospatialAggregation],
     tags=["aggregation"],
 )
-async def get_environmental_geospatial(
-    query: query.BiosampleQuerySchema = query.BiosampleQuerySchema(), db: Session = Depends(get_db)
+def get_environmental_geospatial(
+    request: Request,
+    response: Response,
+    query: query.BiosampleQuerySchema = query.BiosampleQuerySchema(),
+    db: Session = Depends(get_db),
+    zoom: Optional[int] = Query(
+        None,
+        ge=0,
+        le=20,
+        description="Cluster the locations on a grid of 2^zoom cells around the globe.",
+    ),
 ):
-    return crud.get_environmental_geospatial(db, query)
+    return response_cache.cached(
+        request, response, db, query, lambda: crud.get_environmental_geospatial(db, query, zoom)
+    )
 
 
-def inject_download_counts(db: Session, results, data_object_ids: set[str]):
+def inject_download_counts(
+    db: Session, results, data_object_ids: set[str], selected_ids: Optional[set[str]] = None
+):
     """
     Hydrate paginated biosample results with data object download counts.
 
     This consolidates counting downloads into a single database query, rather than
     two queries for each data object included in the results (one for file_downloads, and
     another for bulk_downloads).
+
+    Results serialized from biosample cards also get their data object selection from
+    `selected_ids`.
     """
     counts = crud.get_data_object_counts(db, list(data_object_ids))
     for b in results["results"]:
         for op in b.omics_processing:
             for da in op.outputs:
-                da._download_count = counts[da.id]
+                _hydrate_data_object(da, counts[da.id], selected_ids)
             for od in op.omics_data:
                 for da in od.outputs:
-                    da._download_count = counts[da.id]
+                    _hydrate_data_object(da, counts[da.id], selected_ids)
     return results
 
 
+def download_counts_context(db: Session):
+    """
+    Return the `live_context` of cached search results with data objects, which serializes
+    them with the current download counts of their data objects.
+    """
+
+    def context(content: query.Paginated) -> Dict[str, Any]:
+        omics_processings = [
+            op
+            for result in content.results
+            for op in (
+                result.omics_processing if isinstance(result, schemas.Biosample) else [result]
+            )
+        ]
+        data_object_ids = {
+            da.id
+            for op in omics_processings
+            for outputs in [op.outputs, *(od.outputs for od in op.omics_data)]
+            for da in outputs
+        }
+        return {"download_counts": crud.get_data_object_counts(db, list(data_object_ids))}
+
+    return context
+
+
+def _hydrate_data_object(
+    data_object: Union[models.DataObject, schemas.DataObject],
+    count: int,
+    selected_ids: Optional[set[str]],
+):
+    if isinstance(data_object, schemas.DataObject):
+        # Results serialized from biosample cards
+        data_object.downloads = count
+        if selected_ids is not None:
+            data_object.selected = data_object.id in selected_ids
+    else:
+        data_object._download_count = count
+
+
 # biosample
 @router.post(
     "/biosample/search",
+    dependencies=[Depends(select_query_planner)],
     response_model=query.Paginated[schemas.Biosample],
     tags=["biosample"],
     name="Search for biosamples",
     description="Faceted search of biosample data.",
 )
-async def search_biosample(
+def search_biosample(
+    request: Request,
+    response: Response,
     query: query.BiosampleSearchQuery = query.BiosampleSearchQuery(),
     db: Session = Depends(get_db),
     pagination: Pagination = Depends(),
 ):
+    return response_cache.cached(
+        request,
+        response,
+        db,
+        query,
+        lambda: _search_biosample(db, query, pagination),
+        download_counts_context(db),
+    )
+
+
+def _search_biosample(db: Session, query: query.BiosampleSearchQuery, pagination: Pagination):
     data_object_filter = query.data_object_filter
 
-    data_object_ids = set()
+    data_object_ids: set[str] = set()
 
-    # Inject file object selection information before serialization.
-    # This could potentially be more efficient to do in the database query,
-    # but the code to generate the query would be much more complicated.
-    # As a side effect, track all relevant data object IDs for this query.
-    # They will be used to get download counts for all data objects in one
-    # query.
-    def insert_selected(biosample: models.Biosample) -> models.Biosample:
+    # Track all relevant data object IDs for this query. They will be used to get
+    # download counts for all data objects in one query. Whether the data objects
+    # match the data object filter is computed by the search query itself.
+    def collect_data_objects(
+        biosample: Union[models.Biosample, schemas.Biosample],
+    ) -> Union[models.Biosample, schemas.Biosample]:
         for op in biosample.omics_processing:
             # If the query parameter `include_superseded_workflow_executions` is False (the default),
             # then filter out any workflow executions that have been superseded by another.
             if not query.include_superseded_workflow_executions:
-                op._exclude_superseded = True
-            for da in op.outputs:
-                data_object_ids.add(da.id)
-                da.selected = schemas.DataObject.is_selected(
-                    WorkflowActivityTypeEnum.raw_data, da, data_object_filter
-                )
+                if isinstance(op, schemas.OmicsProcessing):
+                    op.omics_data = [od for od in op.omics_data if not od.superseded_by]
+                else:
+                    op._exclude_superseded = True
+            data_object_ids.update(da.id for da in op.outputs)
             for od in op.omics_data:
-                workflow = WorkflowActivityTypeEnum(od.type)
-                for da in od.outputs:
-                    da.selected = schemas.DataObject.is_selected(workflow, da, data_object_filter)
-                    data_object_ids.add(da.id)
+                data_object_ids.update(da.id for da in od.outputs)
         return biosample
 
-    results = pagination.response(
-        crud.search_biosample(
-            db, query.conditions, data_object_filter, prefetch_omics_processing_data=True
-        ),
-        insert_selected,
-    )
+    # Serialize the results from the precomputed biosample cards when they are available.
+    selected_ids = None
+    if biosample_card.is_loaded(db):
+        results = pagination.response(
+            crud.search_biosample_cards(db, query.conditions, data_object_filter),
+            lambda row: collect_data_objects(schemas.Biosample.model_validate(row.card)),
+            sort_key=BiosampleQuerySchema.sort_key,
+            cache_count=True,
+        )
+        # The cards are shared by every filter, so select their data objects in one query.
+        selected_ids = crud.get_selected_data_object_ids(db, data_object_ids, data_object_filter)
+    else:
+        results = pagination.response(
+            crud.search_biosample(
+                db, query.conditions, data_object_filter, prefetch_omics_processing_data=True
+            ),
+            collect_data_objects,
+            sort_key=BiosampleQuerySchema.sort_key,
+            cache_count=True,
+        )
     # Filter out irrelevant workflow types based on the initial search conditions.
     # This might be possible with SQLAlchemy options, but we need to figure out how
     # to apply filters to the select related options.
@@ -363,35 +475,75 @@ async def search_biosample(
             biosample.omics_processing = [  # type: ignore
                 op for op in biosample.omics_processing if op.id in omics_ids  # type: ignore
             ]
-    return inject_download_counts(db, results, data_object_ids)
+    return inject_download_counts(db, results, data_object_ids, selected_ids)
 
 
 @router.post(
     "/biosample/facet",
+    dependencies=[Depends(select_query_planner), Depends(http_cache.generation_etag)],
     response_model=query.FacetResponse,
     tags=["biosample"],
     name="Get all values of an attribute",
 )
-async def facet_biosample(query: query.FacetQuery, db: Session = Depends(get_db)):
-    return crud.facet_biosample(db, query.attribute, query.conditions)
+def facet_biosample(
+    request: Request, response: Response, query: query.FacetQuery, db: Session = Depends(get_db)
+):
+    return response_cache.cached(
+        request,
+        response,
+        db,
+        query,
+        lambda: crud.facet_biosample(db, query.attribute, query.conditions),
+    )
+
+
+@router.post(
+    "/biosample/facets",
+    dependencies=[Depends(select_query_planner), Depends(http_cache.generation_etag)],
+    response_model=query.BatchFacetResponse,
+    tags=["biosample"],
+    name="Get all values of several attributes",
+)
+def batch_facet_biosample(
+    request: Request,
+    response: Response,
+    query: query.BatchFacetQuery,
+    db: Session = Depends(get_db),
+):
+    return response_cache.cached(
+        request,
+        response,
+        db,
+        query,
+        lambda: crud.batch_facet_biosample(db, query.attributes, query.conditions),
+    )
 
 
 @router.post(
     "/biosample/binned_facet",
+    dependencies=[Depends(select_query_planner), Depends(http_cache.generation_etag)],
     response_model=query.BinnedFacetResponse,
     tags=["biosample"],
     name="Get all values of a non-string attribute with binning",
 )
-async def binned_facet_biosample(query: query.BinnedFacetQuery, db: Session = Depends(get_db)):
-    return crud.binned_facet_biosample(db, **query.dict())
+def binned_facet_biosample(
+    request: Request,
+    response: Response,
+    query: query.BinnedFacetQuery,
+    db: Session = Depends(get_db),
+):
+    return response_cache.cached(
+        request, response, db, query, lambda: crud.binned_facet_biosample(db, **query.dict())
+    )
 
 
 @router.get(
     "/biosample/{biosample_id}",
+    dependencies=[Depends(http_cache.generation_etag)],
     response_model=schemas.Biosample,
     tags=["biosample"],
 )
-async def get_biosample(biosample_id: str, db: Session = Depends(get_db)):
+def get_biosample(biosample_id: str, db: Session = Depends(get_db)):
     db_biosample = crud.get_biosample(db, biosample_id)
     if db_biosample is None:
         raise HTTPException(status_code=404, detail="Biosample not found")
@@ -402,7 +554,7 @@ async def get_biosample(biosample_id: str, db: Session = Depends(get_db)):
     "/biosample/{biosample_id}/source_metadata",
     tags=["biosample"],
 )
-async def get_biosample_source_metadata(biosample_id: str):
+def get_biosample_source_metadata(biosample_id: str):
     """
     Get a single record of biosample source metadata via the Runtime API
     (i.e. the source of truth) based on the supplied biosample ID.
@@ -414,50 +566,8 @@ async def get_biosample_source_metadata(biosample_id: str):
     return source_biosample
 
 
-class _StreamingBuffer(RawIOBase):
-    """
-    A non-seekable, write-only buffer used to stream a ZIP archive incrementally.
-
-    By being non-seekable, Python's `zipfile` module operates in "streaming mode":
-    it sets the data-descriptor flag (bit 3) on each entry so that the CRC and
-    compressed/uncompressed sizes are written *after* the compressed data instead
-    of seeking back to rewrite the local file header.  The resulting archive is
-    fully valid — all modern tools (unzip, 7-zip, macOS Archive Utility, Windows
-    Explorer) understand data descriptors.
-
-    The `drain()` method returns and clears all bytes written since the last call,
-    allowing an async generator to yield those bytes to the HTTP client without
-    ever holding the full archive in memory.
-    """
-
-    def __init__(self) -> None:
-        super().__init__()
-        self._buf: bytearray = bytearray()
-
-    # file-like interface expected by zipfile
-    def write(self, b: bytes | bytearray | memoryview) -> int:  # type: ignore[override]
-        self._buf.extend(b)
-        return len(b)
-
-    def seekable(self) -> bool:
-        return False
-
-    def readable(self) -> bool:
-        return False
-
-    def writable(self) -> bool:
-        return True
-
-    # drain interface for the async generator
-    def drain(self) -> bytes:
-        """Return and clear all bytes accumulated since the last drain."""
-        data = bytes(self._buf)
-        self._buf.clear()
-        return data
-
-
 @router.post("/download_metadata", tags=["bulk_download"])
-async def download_metadata(q: query.MultiSearchQuery, db: Session = Depends(get_db)):
+def download_metadata(q: query.MultiSearchQuery):
     """
     Download multiple metadata lists as a zip file given a list of requested
     document types.
@@ -471,92 +581,77 @@ async def download_metadata(q: query.MultiSearchQuery, db: Session = Depends(get
     from timing out or closing the connection while waiting for response headers
     during a slow build of a large archive.
 
-    The archive is built using a non-seekable `_StreamingBuffer` so that compressed
-    bytes are yielded to the client continuously as each document is serialised,
-    rather than accumulating the entire archive in a `BytesIO` buffer first.  Peak
-    memory is therefore proportional to one zlib compression window (~32 KB) plus
-    one DB batch (~1 000 rows) rather than the full uncompressed dataset.
+    The document types are fetched and compressed concurrently, each on its own database
+    connection, and each file is added to the archive as soon as it is complete (see
+    `metadata_export`).  Files are therefore not necessarily in the requested order.
     """
-    # The set of document types the client is allowed to request.  Each value is used
-    # directly as the high_level_type filter in BiosampleRelatedDocument.
-    # The value is used as the JSON file name.
-    allowed_document_types = {
-        "nmdc:Biosample": "biosamples",
-        "nmdc:Study": "studies",
-        "nmdc:DataObject": "data_objects",
-        "nmdc:DataGeneration": "data_generations",
-        "nmdc:WorkflowExecution": "workflow_executions",
-    }
-
     if not q.endpoints or len(q.endpoints) == 0:
         raise HTTPException(
             status_code=400,
             detail="No endpoints specified for metadata download.",
         )
 
-    async def generate_zip():
-        biosample_ids = crud.get_biosample_ids(db, q.conditions)
-        buf = _StreamingBuffer()
-
-        with zipfile.ZipFile(cast(IO[bytes], buf), "w", zipfile.ZIP_DEFLATED) as zf:
-            for high_level_type in q.endpoints:
-                filename = allowed_document_types.get(high_level_type)
-                if filename is None:
-                    continue
-
-                zinfo = zipfile.ZipInfo(
-                    filename=f"{filename}.json",
-                    date_time=datetime.datetime.now().timetuple()[:6],  # default is 1980-01-01
-                )
-                zinfo.compress_type = zipfile.ZIP_DEFLATED
-                with zf.open(zinfo, "w") as jf:
-                    if not biosample_ids:
-                        # Write an empty list if there are no biosamples matching the query
-                        jf.write(b"[]")
-                    else:
-                        # Stream each document as a JSON object on a separate line, wrapped in a list.
-                        jf.write(b"[\n")
-                        first = True
-                        for doc in crud.get_documents_by_biosample_ids(
-                            db,
-                            biosample_ids,
-                            high_level_type,
-                            include_superseded_workflow_executions=q.include_superseded_workflow_executions,
-                        ):
-                            if not first:
-                                # Write a comma before all but the first document to maintain valid JSON list syntax.
-                                jf.write(b",\n")
-                            jf.write(json.dumps(doc, ensure_ascii=False).encode("utf-8"))
-                            first = False
-                            # Drain whatever the zlib compressor has emitted so far.
-                            # Most calls return a small chunk or nothing; the important
-                            # thing is that buf never accumulates the full dataset.
-                            chunk = buf.drain()
-                            if chunk:
-                                yield chunk
-                        # End the JSON list.
-                        jf.write(b"\n]")
-
-                # The entry's compressor is finalised and the data descriptor is
-                # written when the `with zf.open()` block exits.  Drain those bytes.
-                chunk = buf.drain()
-                if chunk:
-                    yield chunk
-
-        # The ZIP central directory is written when the ZipFile context exits.
-        chunk = buf.drain()
-        if chunk:
-            yield chunk
-
+    # `generate_metadata_zip` is a synchronous generator, so that Starlette iterates it in a
+    # worker thread instead of on the event loop.
     return StreamingResponse(
-        generate_zip(),
+        metadata_export.generate_metadata_zip(q),
         media_type="application/zip",
         headers={"Content-Disposition": "attachment; filename=metadata.zip"},
     )
 
 
+@router.post(
+    "/metadata_export",
+    response_model=schemas.MetadataExport,
+    status_code=status.HTTP_202_ACCEPTED,
+    tags=["bulk_download"],
+)
+def create_metadata_export(q: query.MultiSearchQuery, db: Session = Depends(get_db)):
+    """
+    Start building the archive of `POST /download_metadata` in the background.
+
+    Poll `GET /metadata_export/{export_id}` until its status is `complete`, then download
+    the archive from `GET /metadata_export/{export_id}/download`, which supports `Range`
+    requests to resume an interrupted download.  The archive of an identical query is reused
+    until the next ingest.
+    """
+    if not q.endpoints:
+        raise HTTPException(
+            status_code=400,
+            detail="No endpoints specified for metadata download.",
+        )
+    return metadata_export.submit_export(db, q)
+
+
+@router.get(
+    "/metadata_export/{export_id}",
+    response_model=schemas.MetadataExport,
+    tags=["bulk_download"],
+)
+def get_metadata_export(export_id: UUID, db: Session = Depends(get_db)):
+    export = metadata_export.get_export(db, export_id)
+    if export is None:
+        raise HTTPException(status_code=404, detail="Metadata export not found")
+    return export
+
+
+@router.get("/metadata_export/{export_id}/download", tags=["bulk_download"])
+def download_metadata_export(export_id: UUID, db: Session = Depends(get_db)):
+    export = metadata_export.get_export(db, export_id)
+    if export is None:
+        raise HTTPException(status_code=404, detail="Metadata export not found")
+    if export.status != models.MetadataExportStatus.complete:
+        export_status = models.MetadataExportStatus(export.status)
+        raise HTTPException(status_code=409, detail=f"Metadata export is {export_status.value}")
+    path = metadata_export.get_archive_path(export)
+    if not path.exists():
+        raise HTTPException(status_code=410, detail="Metadata export has expired")
+    return FileResponse(path, media_type="application/zip", filename="metadata.zip")
+
+
 @router.get(
     "/envo/tree",
+    dependencies=[Depends(http_cache.generation_etag)],
     response_model=schemas.EnvoTreeResponse,
     tags=["envo"],
 )
@@ -569,7 +664,7 @@ async def get_envo_tree():
     response_model=schemas.KeggTermListResponse,
     tags=["kegg"],
 )
-async def get_kegg_terms_for_module(module: str, db: Session = Depends(get_db)):
+def get_kegg_terms_for_module(module: str, db: Session = Depends(get_db)):
     terms = crud.list_ko_terms_for_module(db, module)
     return schemas.KeggTermListResponse(terms=terms)
 
@@ -579,7 +674,7 @@ async def get_kegg_terms_for_module(module: str, db: Session = Depends(get_db)):
     response_model=schemas.KeggTermListResponse,
     tags=["kegg"],
 )
-async def get_kegg_terms_for_pathway(pathway: str, db: Session = Depends(get_db)):
+def get_kegg_terms_for_pathway(pathway: str, db: Session = Depends(get_db)):
     terms = crud.list_ko_terms_for_pathway(db, pathway)
     return schemas.KeggTermListResponse(terms=terms)
 
@@ -589,7 +684,7 @@ async def get_kegg_terms_for_pathway(pathway: str, db: Session = Depends(get_db)
     response_model=schemas.KeggTermTextListResponse,
     tags=["kegg"],
 )
-async def kegg_text_search(query: str, limit=20, db: Session = Depends(get_db)):
+def kegg_text_search(query: str, limit=20, db: Session = Depends(get_db)):
     terms = crud.kegg_text_search(db, query, limit)
     return schemas.KeggTermTextListResponse(terms=terms)
 
@@ -599,7 +694,7 @@ async def kegg_text_search(query: str, limit=20, db: Session = Depends(get_db)):
     response_model=schemas.KeggTermTextListResponse,
     tags=["gene_function"],
 )
-async def cog_text_search(query: str, limit=20, db: Session = Depends(get_db)):
+def cog_text_search(query: str, limit=20, db: Session = Depends(get_db)):
     terms = crud.cog_text_search(db, query, limit)
     return schemas.KeggTermTextListResponse(terms=terms)
 
@@ -609,7 +704,7 @@ async def cog_text_search(query: str, limit=20, db: Session = Depends(get_db)):
     response_model=schemas.KeggTermTextListResponse,
     tags=["gene_function"],
 )
-async def pfam_text_search(query: str, limit=20, db: Session = Depends(get_db)):
+def pfam_text_search(query: str, limit=20, db: Session = Depends(get_db)):
     terms = crud.pfam_text_search(db, query, limit)
     return schemas.KeggTermTextListResponse(terms=terms)
 
@@ -619,7 +714,7 @@ async def pfam_text_search(query: str, limit=20, db: Session = Depends(get_db)):
     response_model=schemas.KeggTermTextListResponse,
     tags=["gene_function"],
 )
-async def go_text_search(query: str, limit=20, db: Session = Depends(get_db)):
+def go_text_search(query: str, limit=20, db: Session = Depends(get_db)):
     terms = crud.go_text_search(db, query, limit)
     return schemas.KeggTermTextListResponse(terms=terms)
 
@@ -627,69 +722,45 @@ async def go_text_search(query: str, limit=20, db: Session = Depends(get_db)):
 # study
 @router.post(
     "/study/search",
+    dependencies=[Depends(select_query_planner), Depends(http_cache.generation_etag)],
     response_model=query.StudySearchResponse,
     tags=["study"],
     name="Search for studies",
     description="Faceted search of study data.",
 )
-async def search_study(
+def search_study(
+    request: Request,
+    response: Response,
     q: query.SearchQuery = query.SearchQuery(),
     db: Session = Depends(get_db),
     pagination: Pagination = Depends(),
 ):
-    top_level_condition: List[query.ConditionSchema] = [
-        query.SimpleConditionSchema(
-            **{
-                "field": "part_of",
-                "op": "==",
-                "value": "null",
-                "table": "study",
-            }
-        )
-    ]
-    children_condition: List[query.ConditionSchema] = [
-        query.SimpleConditionSchema(
-            **{
-                "field": "part_of",
-                "op": "!=",
-                "value": "null",
-                "table": "study",
-            }
-        )
-    ]
-
-    top_level_condition.extend(q.conditions)
-    children_condition.extend(q.conditions)
+    return response_cache.cached(request, response, db, q, lambda: _search_study(db, q, pagination))
 
-    children_studies = crud.search_study(db, children_condition).all()
-    top_level_studies = crud.search_study(db, top_level_condition).all()
-
-    for parent in top_level_studies:
-        parent.children = []
-        for child in children_studies:
-            if child.part_of is not None and parent.id in child.part_of:
-                parent.children.append(child)
-
-    # If there are children studies that match the query, but their top level studies do not,
-    # and they are not already listed as children of another top level study,
-    # add the child to the top level studies
-    for child in children_studies:
-        for parent_id in child.part_of:
-            if (
-                parent_id not in [parent.id for parent in top_level_studies]
-                and child.id not in [parent.id for parent in top_level_studies]
-                and child.id
-                not in [child.id for parent in top_level_studies for child in parent.children]
-            ):
-                top_level_studies.append(child)
-
-    count = len(top_level_studies)
 
+def _search_study(
+    db: Session, q: query.SearchQuery, pagination: Pagination
+) -> query.StudySearchResponse:
+    # Studies that are part of a study listed at the top level are nested under it.  The
+    # top level is paged in the database, so only the children of one page are loaded.
+    top_level = crud.search_top_level_study(db, q.conditions)
+    count = top_level.count()
+    top_level_studies = pagination.paginate(top_level, count).all()
     total = crud.search_study(db, q.conditions).count()
 
+    parent_ids = [study.id for study in top_level_studies if not study.part_of]
+    children: Dict[str, List[models.Study]] = {parent_id: [] for parent_id in parent_ids}
+    if parent_ids:
+        for child in crud.search_child_study(db, q.conditions, parent_ids):
+            for parent_id in child.part_of:
+                if parent_id in children:
+                    children[parent_id].append(child)
+    for study in top_level_studies:
+        study.children = children.get(study.id, [])
+
     structured_results: query.StudySearchResponse = query.StudySearchResponse(
         count=count,
-        results=top_level_studies[pagination.offset : pagination.limit + pagination.offset],
+        results=top_level_studies,
         total=total,
     )
     return structured_results
@@ -697,30 +768,48 @@ async def search_study(
 
 @router.post(
     "/study/facet",
+    dependencies=[Depends(select_query_planner), Depends(http_cache.generation_etag)],
     response_model=query.FacetResponse,
     tags=["study"],
     name="Get all values of an attribute",
 )
-async def facet_study(query: query.FacetQuery, db: Session = Depends(get_db)):
-    return crud.facet_study(db, query.attribute, query.conditions)
+def facet_study(
+    request: Request, response: Response, query: query.FacetQuery, db: Session = Depends(get_db)
+):
+    return response_cache.cached(
+        request,
+        response,
+        db,
+        query,
+        lambda: crud.facet_study(db, query.attribute, query.conditions),
+    )
 
 
 @router.post(
     "/study/binned_facet",
+    dependencies=[Depends(select_query_planner), Depends(http_cache.generation_etag)],
     response_model=query.BinnedFacetResponse,
     tags=["study"],
     name="Get all values of a non-string attribute with binning",
 )
-async def binned_facet_study(query: query.BinnedFacetQuery, db: Session = Depends(get_db)):
-    return crud.binned_facet_study(db, **query.dict())
+def binned_facet_study(
+    request: Request,
+    response: Response,
+    query: query.BinnedFacetQuery,
+    db: Session = Depends(get_db),
+):
+    return response_cache.cached(
+        request, response, db, query, lambda: crud.binned_facet_study(db, **query.dict())
+    )
 
 
 @router.get(
     "/study/{study_id}",
+    dependencies=[Depends(http_cache.generation_etag)],
     response_model=schemas.Study,
     tags=["study"],
 )
-async def get_study(study_id: str, db: Session = Depends(get_db)):
+def get_study(study_id: str, db: Session = Depends(get_db)):
     db_study = crud.get_study(db, study_id)
 
     children_condition: List[query.ConditionSchema] = [
@@ -742,7 +831,7 @@ async def get_study(study_id: str, db: Session = Depends(get_db)):
 
 
 @router.get("/study/{study_id}/image", tags=["study"])
-async def get_study_image(study_id: str, db: Session = Depends(get_db)):
+def get_study_image(study_id: str, db: Session = Depends(get_db)):
     image = crud.get_study_image(db, study_id)
     if image is None:
         raise HTTPException(status_code=404, detail="No image exists for this study")
@@ -753,7 +842,7 @@ async def get_study_image(study_id: str, db: Session = Depends(get_db)):
     "/study/{study_id}/source_metadata",
     tags=["study"],
 )
-async def get_study_source_metadata(study_id: str):
+def get_study_source_metadata(study_id: str):
     """
     Get a single record of study source metadata via the Runtime API
     based on the supplied study ID.
@@ -773,47 +862,79 @@ async def get_study_source_metadata(study_id: str):
 # Future work should go in to a more thorough conversion of omics process to data generation.
 @router.post(
     "/data_generation/search",
+    dependencies=[Depends(select_query_planner)],
     response_model=query.Paginated[schemas.OmicsProcessing],
     tags=["data_generation"],
     name="Search for data generations",
     description="Faceted search of data_generation data.",
 )
-async def search_omics_processing(
+def search_omics_processing(
+    request: Request,
+    response: Response,
     query: query.SearchQuery = query.SearchQuery(),
     db: Session = Depends(get_db),
     pagination: Pagination = Depends(),
 ):
-    return pagination.response(crud.search_omics_processing(db, query.conditions))
+    return response_cache.cached(
+        request,
+        response,
+        db,
+        query,
+        lambda: pagination.response(
+            crud.search_omics_processing(db, query.conditions), cache_count=True
+        ),
+        download_counts_context(db),
+    )
 
 
 @router.post(
     "/data_generation/facet",
+    dependencies=[Depends(select_query_planner), Depends(http_cache.generation_etag)],
     response_model=query.FacetResponse,
     tags=["data_generation"],
     name="Get all values of an attribute",
 )
-async def facet_omics_processing(query: query.FacetQuery, db: Session = Depends(get_db)):
-    return crud.facet_omics_processing(db, query.attribute, query.conditions)
+def facet_omics_processing(
+    request: Request, response: Response, query: query.FacetQuery, db: Session = Depends(get_db)
+):
+    return response_cache.cached(
+        request,
+        response,
+        db,
+        query,
+        lambda: crud.facet_omics_processing(db, query.attribute, query.conditions),
+    )
 
 
 @router.post(
     "/data_generation/binned_facet",
+    dependencies=[Depends(select_query_planner), Depends(http_cache.generation_etag)],
     response_model=query.BinnedFacetResponse,
     tags=["data_generation"],
     name="Get all values of a non-string attribute with binning",
 )
-async def binned_facet_omics_processing(
-    query: query.BinnedFacetQuery, db: Session = Depends(get_db)
+def binned_facet_omics_processing(
+    request: Request,
+    response: Response,
+    query: query.BinnedFacetQuery,
+    db: Session = Depends(get_db),
 ):
-    return crud.binned_facet_omics_processing(db, **query.dict())
+    return response_cache.cached(
+        request,
+        response,
+        db,
+        query,
+        lambda: crud.binned_facet_omics_processing(db, **query.dict()),
+    )
 
 
 @router.get(
     "/data_generation/{data_generation_id}",
+    dependencies=[Depends(http_cache.generation_etag)],
     response_model=schemas.OmicsProcessing,
     tags=["data_generation"],
 )
-async def get_omics_processing(data_generation_id: str, db: Session = Depends(get_db)):
+def get_omics_processing(data_generation_id: str, db: Session = Depends(get_db)):
     db_omics_processing = crud.get_omics_processing(db, data_generation_id)
     if db_omics_processing is None:
         raise HTTPException(status_code=404, detail="OmicsProcessing not found")
@@ -825,9 +946,7 @@ async def get_omics_processing(data_generation_id: str, db: Session = Depends(ge
     response_model=List[schemas.DataObject],
     tags=["data_generation"],
 )
-async def list_omics_processing_data_objects(
-    data_generation_id: str, db: Session = Depends(get_db)
-):
+def list_omics_processing_data_objects(data_generation_id: str, db: Session = Depends(get_db)):
     return crud.list_omics_processing_data_objects(db, data_generation_id).all()
 
 
@@ -837,7 +956,7 @@ async def list_omics_processing_data_objects(
     response_model=schemas.DataObject,
     tags=["data_object"],
 )
-async def get_data_object(data_object_id: str, db: Session = Depends(get_db)):
+def get_data_object(data_object_id: str, db: Session = Depends(get_db)):
     db_data_object = crud.get_data_object(db, data_object_id)
     if db_data_object is None:
         raise HTTPException(status_code=404, detail="DataObject not found")
@@ -849,7 +968,7 @@ async def get_data_object(data_object_id: str, db: Session = Depends(get_db)):
     tags=["data_object"],
     responses=login_required_responses,
 )
-async def download_data_object(
+def download_data_object(
     data_object_id: str,
     user_agent: Optional[str] = Header(None),
     x_forwarded_for: Optional[str] = Header(None),
@@ -882,7 +1001,7 @@ async def download_data_object(
 
 
 @router.get("/data_object/{data_object_id}/get_html_content_url")
-async def get_data_object_html_content(data_object_id: str, db: Session = Depends(get_db)):
+def get_data_object_html_content(data_object_id: str, db: Session = Depends(get_db)):
     data_object = crud.get_data_object(db, data_object_id)
     if data_object is None:
         raise HTTPException(status_code=404, detail="DataObject not found")
@@ -909,21 +1028,30 @@ async def get_data_object_html_content(data_object_id: str, db: Session = Depend
 
 @router.post(
     "/data_object/workflow_summary",
+    dependencies=[Depends(select_query_planner), Depends(http_cache.generation_etag)],
     response_model=schemas.DataObjectAggregation,
     tags=["data_object"],
     name="Aggregate data objects by workflow",
 )
 def data_object_aggregation(
+    request: Request,
+    response: Response,
     query: query.DataObjectQuerySchema = query.DataObjectQuerySchema(),
     db: Session = Depends(get_db),
 ):
-    return crud.aggregate_data_object_by_workflow(
-        db, query.conditions, query.include_superseded_workflow_executions
+    return response_cache.cached(
+        request,
+        response,
+        db,
+        query,
+        lambda: crud.aggregate_data_object_by_workflow(
+            db, query.conditions, query.include_superseded_workflow_executions
+        ),
     )
 
 
 @router.get("/principal_investigator/{principal_investigator_id}", tags=["principal_investigator"])
-async def get_pi_image(principal_investigator_id: UUID, db: Session = Depends(get_db)):
+def get_pi_image(principal_investigator_id: UUID, db: Session = Depends(get_db)):
     image = crud.get_pi_image(db, principal_investigator_id)
     if image is None:
         raise HTTPException(status_code=404, detail="Principal investigator  not found")
@@ -938,7 +1066,7 @@ async def get_pi_image(principal_investigator_id: UUID, db: Session = Depends(ge
     responses=login_required_responses,
     status_code=201,
 )
-async def create_bulk_download(
+def create_bulk_download(
     user_agent: Optional[str] = Header(None),
     x_forwarded_for: Optional[str] = Header(None),
     query: query.BiosampleQuerySchema = query.BiosampleQuerySchema(),
@@ -967,11 +1095,13 @@ async def create_bulk_download(
     tags=["download"],
     response_model=query.DataObjectAggregation,
 )
-async def get_data_object_aggregation(
+def get_data_object_aggregation(
+    request: Request,
+    response: Response,
     query: query.DataObjectQuerySchema = query.DataObjectQuerySchema(),
     db: Session = Depends(get_db),
 ):
-    return query.aggregate(db)
+    return response_cache.cached(request, response, db, query, lambda: query.aggregate(db))
 
 
 async def stream_zip_archive(zip_file_descriptor: Dict[str, Any]):
@@ -1006,7 +1136,7 @@ async def stream_zip_archive(zip_file_descriptor: Dict[str, Any]):
     "/bulk_download/{bulk_download_id}/metadata/data_objects.json",
     tags=["download"],
 )
-async def get_bulk_download_data_object_metadata(
+def get_bulk_download_data_object_metadata(
     bulk_download_id: UUID,
     db: Session = Depends(get_db),
 ):
@@ -1046,7 +1176,7 @@ async def get_bulk_download_data_object_metadata(
     "/bulk_download/{bulk_download_id}/README.md",
     tags=["download"],
 )
-async def get_bulk_download_readme(
+def get_bulk_download_readme(
     bulk_download_id: UUID,
     db: Session = Depends(get_db),
 ):
@@ -1071,7 +1201,7 @@ async def get_bulk_download_readme(
     "/bulk_download/{bulk_download_id}/ro-crate-metadata.json",
     tags=["download"],
 )
-async def get_bulk_download_rocrate(
+def get_bulk_download_rocrate(
     bulk_download_id: UUID,
     db: Session = Depends(get_db),
 ):
@@ -1119,7 +1249,7 @@ async def get_bulk_download_rocrate(
     "/bulk_download/{bulk_download_id}",
     tags=["download"],
 )
-async def download_zip_file(
+def download_zip_file(
     bulk_download_id: UUID,
     db: Session = Depends(get_db),
 ):
@@ -1140,7 +1270,7 @@ async def download_zip_file(
     "/metadata_submission/mixs_report",
     tags=["metadata_submission"],
 )
-async def get_metadata_submissions_mixs(
+def get_metadata_submissions_mixs(
     db: Session = Depends(get_db), user: models.User = Depends(get_current_user)
 ):
     r"""
@@ -1267,13 +1397,15 @@ async def get_metadata_submissions_mixs(
     return response
 
 
+@lru_cache(maxsize=1)
 def fetch_nmdc_submission_schema():
     r"""
     Helper function to get a copy of the current NMDC
     Submission Schema.
 
     This function specifically returns the enums from
-    the NMDC Submission Schema.
+    the NMDC Submission Schema. The result is cached since the
+    schema is a package resource; callers must not modify it.
     """
 
     submission_schema_files = resources.files("nmdc_submission_schema")
@@ -1349,7 +1481,7 @@ def check_permissible_val(
     "/metadata_submission/report",
     tags=["metadata_submission"],
 )
-async def get_metadata_submissions_report(
+def get_metadata_submissions_report(
     db: Session = Depends(get_db),
     user: models.User = Depends(get_current_user),
 ):
@@ -1449,7 +1581,7 @@ async def get_metadata_submissions_report(
     return response
 
 
-async def get_paginated_submission_list(
+def get_paginated_submission_list(
     db: Session = Depends(get_db),
     user: models.User = Depends(get_current_user),
     pagination: Pagination = Depends(),
@@ -1476,7 +1608,7 @@ async def get_paginated_submission_list(
     responses=login_required_responses,
     response_model=query.Paginated[schemas_submission.SubmissionMetadataSchema],
 )
-async def list_submissions(submissions=Depends(get_paginated_submission_list)):
+def list_submissions(submissions=Depends(get_paginated_submission_list)):
     """Return a paginated list of submissions in full detail."""
     return submissions
 
@@ -1487,7 +1619,7 @@ async def list_submissions(submissions=Depends(get_paginated_submission_list)):
     responses=login_required_responses,
     response_model=query.Paginated[schemas_submission.SubmissionMetadataSchemaSlim],
 )
-async def list_submissions_slim(submissions=Depends(get_paginated_submission_list)):
+def list_submissions_slim(submissions=Depends(get_paginated_submission_list)):
     """Return a paginated list of submissions in slim format."""
     return submissions
 
@@ -1498,7 +1630,7 @@ async def list_submissions_slim(submissions=Depends(get_paginated_submission_lis
     responses=login_required_responses,
     response_model=schemas_submission.SubmissionMetadataSchema,
 )
-async def get_submission(
+def get_submission(
     id: str,
     db: Session = Depends(get_db),
     user: models.User = Depends(get_current_user),
@@ -1574,7 +1706,7 @@ def can_save_submission(role: models.SubmissionRole, data: dict, status: str):
     responses=login_required_responses,
     response_model=schemas_submission.SubmissionMetadataSchema,
 )
-async def update_submission(
+def update_submission(
     id: str,
     body: schemas_submission.SubmissionMetadataSchemaPatch,
     db: Session = Depends(get_db),
@@ -1620,7 +1752,7 @@ async def get_transitions():
     responses=login_required_responses,
     response_model=schemas_submission.SubmissionMetadataSchema,
 )
-async def add_submission_role(
+def add_submission_role(
     id: str,
     body: schemas_submission.SubmissionMetadataRoleAdd,
     db: Session = Depends(get_db),
@@ -1651,7 +1783,7 @@ async def add_submission_role(
     responses=login_required_responses,
     response_model=schemas_submission.SubmissionMetadataSchema,
 )
-async def remove_submission_role(
+def remove_submission_role(
     id: str,
     orcid: str,
     db: Session = Depends(get_db),
@@ -1675,7 +1807,7 @@ async def remove_submission_role(
     tags=["metadata_submission"],
     responses=login_required_responses,
 )
-async def delete_submission(
+def delete_submission(
     id: str,
     db: Session = Depends(get_db),
     user: models.User = Depends(get_current_user),
@@ -1702,7 +1834,7 @@ async def delete_submission(
 
 
 @router.put("/metadata_submission/{id}/lock")
-async def lock_submission(
+def lock_submission(
     response: Response,
     id: str,
     db: Session = Depends(get_db),
@@ -1732,7 +1864,7 @@ async def lock_submission(
 
 
 @router.put("/metadata_submission/{id}/unlock")
-async def unlock_submission(
+def unlock_submission(
     response: Response,
     id: str,
     db: Session = Depends(get_db),
@@ -1767,7 +1899,7 @@ async def unlock_submission(
     response_model=schemas_submission.SubmissionMetadataSchema,
     status_code=201,
 )
-async def submit_metadata(
+def submit_metadata(
     body: schemas_submission.SubmissionMetadataSchemaCreate,
     db: Session = Depends(get_db),
     user: models.User = Depends(get_current_user),
@@ -1817,7 +1949,7 @@ async def suggest_metadata(
 
 
 @router.post("/metadata_submission/{id}/image/signed_upload_url", response_model=schemas.SignedUrl)
-async def generate_signed_upload_url(
+def generate_signed_upload_url(
     id: str,
     body: schemas.SignedUploadUrlRequest,
     user: models.User = Depends(get_current_user),
@@ -1852,7 +1984,7 @@ async def generate_signed_upload_url(
     "/metadata_submission/{submission_id}/finalize",
     response_model=schemas.SubmissionFinalizeResponse,
 )
-async def finalize_submission(
+def finalize_submission(
     submission_id: str,
     body: schemas.SubmissionFinalizeRequest,
     user: models.User = Depends(get_current_user),
@@ -1913,7 +2045,7 @@ class ImageType(StrEnum):
     "/metadata_submission/{id}/image/{image_type}",
     response_model=schemas_submission.SubmissionMetadataSchema,
 )
-async def set_submission_image(
+def set_submission_image(
     id: str,
     image_type: ImageType,
     body: schemas.UploadCompleteRequest,
@@ -1950,7 +2082,7 @@ async def set_submission_image(
     "/metadata_submission/{id}/image/{image_type}",
     response_model=schemas_submission.SubmissionMetadataSchema,
 )
-async def delete_submission_image(
+def delete_submission_image(
     id: str,
     image_type: ImageType,
     user: models.User = Depends(get_current_user),
@@ -2267,7 +2399,7 @@ def suggest_meta_from_study(
     response_model=query.Paginated[schemas.User],
     tags=["user"],
 )
-async def get_users(
+def get_users(
     db: Session = Depends(get_db),
     user: models.User = Depends(admin_required),
     pagination: Pagination = Depends(),
@@ -2288,7 +2420,7 @@ async def get_users(
 @router.post(
     "/users/{id}", responses=login_required_responses, response_model=schemas.User, tags=["user"]
 )
-async def update_user(
+def update_user(
     id: UUID,
     body: schemas.User,
     db: Session = Depends(get_db),
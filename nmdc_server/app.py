@@ -3,6 +3,7 @@ import typing
 from contextlib import asynccontextmanager
 
 import sentry_sdk
+from anyio import to_thread
 from debug_toolbar.middleware import DebugToolbarMiddleware
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -12,9 +13,16 @@ from sentry_sdk.integrations.logging import LoggingIntegration
 from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
 from starlette.middleware.sessions import SessionMiddleware
 
-from nmdc_server import __version__, api, auth, errors
+from nmdc_server import __version__, api, auth, errors, http_cache
 from nmdc_server.config import get_database_name_safely_for_logging, settings
-from nmdc_server.database import after_cursor_execute, before_cursor_execute, listen
+from nmdc_server.database import (
+    SessionLocal,
+    after_cursor_execute,
+    before_cursor_execute,
+    listen,
+)
+from nmdc_server.facet_bitmap import get_biosample_bitmap_index
+from nmdc_server.gene_function_index import get_gene_function_index
 from nmdc_server.static_files import static_path
 from nmdc_server.swagger_ui.helpers import load_template
 
@@ -38,6 +46,22 @@ async def lifespan(app: FastAPI):
     portal_database_name = get_database_name_safely_for_logging(settings.database_uri)
     logger.info(f"Portal database: {portal_database_name}")
 
+    # Synchronous request handlers run in a bounded pool of threads, so that their database
+    # queries don't block the event loop (and every other request) while they run.
+    to_thread.current_default_thread_limiter().total_tokens = (
+        settings.request_thread_limit or settings.db_pool_size + settings.db_pool_max_overflow
+    )
+
+    # Load the gene function index (and facet bitmaps, if enabled) before serving requests,
+    # so the first search using a pathway/module/clan/GO term condition doesn't have to
+    # wait for it.
+    try:
+        with SessionLocal() as db:
+            get_gene_function_index(db)
+            get_biosample_bitmap_index(db)
+    except Exception:
+        logger.exception("Failed to preload the gene function and facet indices")
+
     yield
 
 
@@ -109,6 +133,7 @@ def create_app(env: typing.Mapping[str, str]) -> FastAPI:
     errors.attach_error_handlers(app)
     app.include_router(api.router, prefix="/api")
     app.include_router(auth.router, prefix="/auth")
+    app.add_middleware(http_cache.CacheHeadersMiddleware)
     app.add_middleware(SessionMiddleware, secret_key=settings.session_secret_key)
 
     if settings.cors_allow_origins:
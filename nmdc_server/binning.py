@@ -1,9 +1,11 @@
 from datetime import datetime
 from enum import Enum
 from math import floor
-from typing import List, TypeVar
+from typing import Any, List, TypeVar
 
 from dateutil.relativedelta import SU, relativedelta
+from sqlalchemy import Date, DateTime, Float, Integer, cast, func
+from sqlalchemy.dialects.postgresql import INTERVAL, aggregate_order_by
 
 BinnableValue = TypeVar("BinnableValue", float, int, datetime)
 
@@ -62,3 +64,47 @@ def datetime_bins(min_: datetime, max_: datetime, resolution: DateBinResolution)
         dates.append(datetime.combine(d, min_time))
         d += delta
     return dates
+
+
+# The following functions build SQL expressions of the bins computed above from bounds that
+# are only known inside of a query.
+# WARNING: These must be kept in sync with `range_bins` and `datetime_bins`.
+
+
+def range_bins_expression(min_: Any, max_: Any, num_bins: int, integer: bool = False) -> Any:
+    """Get an array aggregate of the bins returned by `range_bins`."""
+    if integer:
+        step = cast(func.floor(cast(max_ - min_, Float) / max(num_bins, 1)), Integer)
+    else:
+        step = (max_ - min_) / max(num_bins, 1)
+    i = func.generate_series(0, num_bins - 1).column_valued("i")
+    return func.array_append(func.array_agg(aggregate_order_by(min_ + step * i, i)), max_)
+
+
+def datetime_bins_expression(min_: Any, max_: Any, resolution: DateBinResolution) -> Any:
+    """Get an array aggregate of the bins returned by `datetime_bins`."""
+    min_date = cast(min_, Date)
+    max_date = cast(max_, Date) + 1
+
+    if resolution == DateBinResolution.day:
+        start, stop, delta = min_date, max_date, "1 day"
+    elif resolution == DateBinResolution.week:
+        # Weeks start on sundays (day 0 of the week).
+        start = min_date - cast(func.extract("dow", min_date), Integer)
+        stop = max_date + (7 - cast(func.extract("dow", max_date), Integer)) % 7
+        delta = "1 week"
+    elif resolution == DateBinResolution.month:
+        start = func.date_trunc("month", cast(min_date, DateTime))
+        stop = func.date_trunc("month", cast(max_date, DateTime)) + cast("1 month", INTERVAL)
+        delta = "1 month"
+    elif resolution == DateBinResolution.year:
+        start = func.date_trunc("year", cast(min_date, DateTime))
+        stop = func.date_trunc("year", cast(max_date, DateTime)) + cast("1 year", INTERVAL)
+        delta = "1 year"
+    else:
+        raise ValueError("Invalid date bin category")
+
+    bin_ = func.generate_series(
+        cast(start, DateTime), cast(stop, DateTime), cast(delta, INTERVAL)
+    ).column_valued("bin")
+    return func.array_agg(aggregate_order_by(bin_, bin_))
@@ -0,0 +1,170 @@
+"""
+This module contains small in-process caches used to avoid repeating expensive work
+(e.g. building sqlalchemy constructs) within a single API worker.
+
+The caches are intentionally simple: they are bounded, thread-safe and keep hit/miss
+counters so that we can tell from the admin stats endpoint whether they pay off.
+"""
+
+import time
+from collections import OrderedDict
+from threading import Event, Lock
+from typing import Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+_clear_callbacks: List[Callable[[], None]] = []
+
+
+def on_clear(callback: Callable[[], None]) -> Callable[[], None]:
+    """Register a function that resets an in-process cache when `clear_all` is called."""
+    _clear_callbacks.append(callback)
+    return callback
+
+
+def clear_all() -> None:
+    """Reset every in-process cache (e.g. between tests using different databases)."""
+    for callback in _clear_callbacks:
+        callback()
+
+
+class LRUCache(Generic[V]):
+    """A bounded, thread-safe least-recently-used cache with hit/miss counters."""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, V]" = OrderedDict()
+        self._lock = Lock()
+        on_clear(self.clear)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: Hashable, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], V]) -> V:
+        """Return the cached value for key, calling factory to create it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+class _Flight(Generic[V]):
+    """A computation in progress that other callers can wait for."""
+
+    def __init__(self) -> None:
+        self.done = Event()
+        self.value: Optional[V] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlightCache(Generic[V]):
+    """A bounded, thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Concurrent callers asking for a key that is being computed wait for that computation
+    instead of repeating it.  Errors are raised to every waiting caller and aren't cached.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self._flights: Dict[Hashable, _Flight[V]] = {}
+        self._lock = Lock()
+        on_clear(self.clear)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], V]) -> V:
+        """Return the cached value for key, calling factory to create it on a miss."""
+        if self.maxsize <= 0:
+            return factory()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                self._data.move_to_end(key)
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if flight is None:
+                self.misses += 1
+                flight = self._flights[key] = _Flight()
+            else:
+                self.waits += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value  # type: ignore
+
+        try:
+            flight.value = factory()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                if flight.error is None:
+                    self._data[key] = (time.monotonic() + self.ttl, flight.value)  # type: ignore
+                    self._data.move_to_end(key)
+                    while len(self._data) > self.maxsize:
+                        self._data.popitem(last=False)
+            flight.done.set()
+        return flight.value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.waits = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
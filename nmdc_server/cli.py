@@ -490,6 +490,23 @@ def load_db(key_file, user, host, list_backups, backup_file):
     click.secho(f"\nSuccessfully loaded {settings.current_db_uri}", fg="green")
 
 
+@cli.command()
+@click.option("--host", default="127.0.0.1")
+@click.option("--port", type=click.INT, default=8000)
+@click.option(
+    "--workers",
+    type=click.INT,
+    default=None,
+    help="Number of worker processes (defaults to the web_workers setting).",
+)
+@click.option("--log-config", type=click.Path(exists=True, dir_okay=False), default=None)
+def serve(host: str, port: int, workers: Optional[int], log_config: Optional[str]):
+    """Serve the API with uvicorn, forking workers that share the preloaded reference data."""
+    from nmdc_server import server
+
+    server.serve(host, port, workers, log_config)
+
+
 @cli.command()
 @click.option("--remove-existing", is_flag=True, default=False)
 def generate_static_files(remove_existing):
@@ -50,6 +50,75 @@ class Settings(BaseSettings):
     # after the session closes.
     db_pool_max_overflow: int = 3
 
+    web_workers: int = 1
+    """The number of API worker processes started by `nmdc-server serve`. Each worker has its
+    own connection pool, so the server uses up to `web_workers` times the pool size plus
+    overflow connections."""
+
+    request_thread_limit: Optional[int] = None
+    """The number of threads each worker uses to run request handlers (and their database
+    queries) off of the event loop. Requests beyond the connection pool size wait for a
+    connection while holding a thread, so this defaults to the pool size plus overflow."""
+
+    metadata_export_threads: int = 3
+    """The number of document types of a metadata export that are fetched and compressed at
+    once. Each uses its own database connection from the pool."""
+
+    metadata_export_connections: int = 3
+    """The number of database connections that all the metadata exports of a worker use at
+    once. Keep this below `db_pool_size`, so that request handlers can still get connections
+    while large exports run."""
+
+    metadata_export_jobs: int = 1
+    """The number of asynchronous metadata exports (`POST /api/metadata_export`) each worker
+    builds at once. They share the `metadata_export_connections` database connections with
+    the streamed exports. A worker that submitted an export also keeps one pooled connection
+    open, which tells the other workers that its exports are still alive."""
+
+    metadata_export_dir: str = "/tmp/nmdc-metadata-exports"
+    """The directory storing the archives of asynchronous metadata exports. Mount a volume
+    shared by all the API processes here, so that any of them can serve an archive."""
+
+    metadata_export_timeout: int = 60 * 60
+    """A metadata export still running after this many seconds is assumed to have been
+    interrupted (e.g. by a restart), and is started again the next time it is requested."""
+
+    query_plan_cache_size: int = 512
+    """The number of search query plans (one per distinct condition shape) kept in memory by
+    each worker. Set to 0 to disable the cache."""
+
+    count_cache_size: int = 1024
+    """The number of search result counts kept in memory by each worker. Counts are reused
+    until the database is re-ingested. Set to 0 to disable the cache."""
+
+    response_cache_size: int = 256
+    """The number of search, facet and aggregation responses kept in memory by each worker.
+    Set to 0 to disable the cache."""
+
+    response_cache_ttl: float = 60
+    """How long (in seconds) a cached response is reused.  Responses are also invalidated when
+    the database is re-ingested."""
+
+    count_estimate_threshold: int = 100000
+    """When a client asks for estimated counts, the planner's estimate is reported only if it
+    is at least this large; smaller result sets are counted exactly."""
+
+    ingest_generation_check_interval: float = 30
+    """How often (in seconds) each worker checks whether the database has been re-ingested, in
+    order to rebuild caches derived from the ingested data."""
+
+    http_cache_max_age: int = 300
+    """How long (in seconds) clients and CDNs may reuse responses of the read endpoints without
+    revalidating them.  Revalidation is answered with 304 until the next ingest."""
+
+    query_planner: str = "intersect"
+    """The default strategy used to combine search conditions ("intersect" or "merged").
+    Individual requests can override it with the `planner` query parameter."""
+
+    bitmap_facets: bool = False
+    """If true, answer biosample facet requests from in-memory bitmaps of the biosamples having
+    each value of the globally searchable attributes."""
+
     # These values control the JWTs issued by nmdc-server as access and refresh tokens
     api_jwt_secret: str = "generate me"
     api_jwt_expiration: int = 24 * 60 * 60  # 24 hours
@@ -1,17 +1,35 @@
 import re
-from collections import defaultdict
+from collections import Counter, defaultdict
 from datetime import UTC, datetime
 from enum import Enum
-from typing import Any, Dict, Iterator, List, Optional, Tuple, Type, TypeVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Type, TypeVar
 from uuid import UUID
 
 from fastapi import HTTPException, status
 from nmdc_schema.nmdc import SubmissionStatusEnum
-from sqlalchemy import and_, or_, select
+from sqlalchemy import (
+    Text,
+    and_,
+    cast,
+    literal,
+    or_,
+    select,
+    text,
+)
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Query, Session, selectinload
 from sqlalchemy.sql import func
 
-from nmdc_server import aggregations, bulk_download_schema, models, query, schemas
+from nmdc_server import (
+    aggregations,
+    bulk_download_schema,
+    facet_bitmap,
+    models,
+    pagination,
+    query,
+    response_cache,
+    schemas,
+)
 from nmdc_server.config import settings
 from nmdc_server.logger import get_logger
 from nmdc_server.rocrate import generate_rocrate_for_bulk_download
@@ -111,6 +129,9 @@ def get_admin_stats(db: Session) -> schemas.AdminStats:
 
     return schemas.AdminStats(
         num_user_accounts=num_distinct_orcids,
+        query_plan_cache=schemas.CacheStats(**query.query_plan_cache.stats()),
+        count_cache=schemas.CacheStats(**pagination.count_cache.stats()),
+        response_cache=schemas.ResponseCacheStats(**response_cache.response_cache.stats()),
     )
 
 
@@ -173,9 +194,9 @@ def get_environmental_sankey(
 
 
 def get_environmental_geospatial(
-    db: Session, query: query.BiosampleQuerySchema
+    db: Session, query: query.BiosampleQuerySchema, zoom: Optional[int] = None
 ) -> List[schemas.EnvironmentGeospatialAggregation]:
-    return aggregations.get_geospatial_aggregation(db, query)
+    return aggregations.get_geospatial_aggregation(db, query, zoom)
 
 
 # study
@@ -225,6 +246,16 @@ def search_study(db: Session, conditions: List[query.ConditionSchema]) -> Query:
     return query.StudyQuerySchema(conditions=conditions).execute(db)
 
 
+def search_top_level_study(db: Session, conditions: List[query.ConditionSchema]) -> Query:
+    return query.StudyQuerySchema(conditions=conditions).execute_top_level(db)
+
+
+def search_child_study(
+    db: Session, conditions: List[query.ConditionSchema], parent_ids: List[str]
+) -> Query:
+    return query.StudyQuerySchema(conditions=conditions).execute_children(db, parent_ids)
+
+
 def facet_study(
     db: Session, attribute: str, conditions: List[query.ConditionSchema]
 ) -> query.FacetResponse:
@@ -404,30 +435,61 @@ def delete_biosample(db: Session, biosample: models.Biosample) -> None:
     db.commit()
 
 
-def get_data_object_counts(db: Session, data_object_ids: list[str]) -> defaultdict[str, int]:
-    labels = ("data_object_id", "count")
-    file_downloads = (
-        db.query(models.FileDownload.data_object_id.label(labels[0]), func.count().label(labels[1]))
-        .filter(models.FileDownload.data_object_id.in_(data_object_ids))
-        .group_by(models.FileDownload.data_object_id)
-        .order_by(models.FileDownload.data_object_id)
-    )
-    bulk_downloads = (
-        db.query(
-            models.BulkDownloadDataObject.data_object_id.label(labels[0]),
-            func.count().label(labels[1]),
-        )
-        .filter(models.BulkDownloadDataObject.data_object_id.in_(data_object_ids))
-        .group_by(models.BulkDownloadDataObject.data_object_id)
-        .order_by(models.BulkDownloadDataObject.data_object_id)
+def get_selected_data_object_ids(
+    db: Session, data_object_ids: Iterable[str], data_object_filter: List[query.DataObjectFilter]
+) -> Set[str]:
+    """Return the ids of the given data objects matching the data object filter."""
+    rows = db.query(models.DataObject.id).filter(
+        models.DataObject.id.in_(list(data_object_ids)),
+        query.data_object_selected(data_object_filter),
     )
-    all_counts = file_downloads.union(bulk_downloads)
+    return {id for (id,) in rows}
+
+
+def get_data_object_counts(db: Session, data_object_ids: list[str]) -> defaultdict[str, int]:
+    rows = db.query(
+        models.DataObjectDownloadCount.data_object_id, models.DataObjectDownloadCount.count
+    ).filter(models.DataObjectDownloadCount.data_object_id.in_(data_object_ids))
     counts: defaultdict[str, int] = defaultdict(int)
-    for row in all_counts:
-        counts[row[0]] += row[1]
+    for data_object_id, count in rows:
+        counts[data_object_id] = count
     return counts
 
 
+def increment_data_object_download_counts(db: Session, data_object_ids: Iterable[str]) -> None:
+    """Count a download of each of the given data objects (ids may be repeated).
+
+    This doesn't commit, so that the counts are updated with the downloads themselves.
+    """
+    increments = Counter(data_object_ids)
+    if not increments:
+        return
+    table = models.DataObjectDownloadCount.__table__
+    # Rows are locked in the order they are listed, so concurrent downloads of overlapping
+    # data objects lock them in the same order instead of deadlocking.
+    statement = insert(table).values(
+        [{"data_object_id": id, "count": count} for id, count in sorted(increments.items())]
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.data_object_id],
+        set_={"count": table.c.count + statement.excluded["count"]},
+    )
+    db.execute(statement)
+
+
+def rebuild_data_object_download_counts(db: Session) -> None:
+    """Recount the downloads of every data object from the download history."""
+    table = models.DataObjectDownloadCount.__table__
+    db.execute(text(f"TRUNCATE TABLE {table.name}"))
+    downloads = (
+        db.query(models.FileDownload.data_object_id.label("data_object_id"))
+        .union_all(db.query(models.BulkDownloadDataObject.data_object_id))
+        .subquery()
+    )
+    rows = db.query(downloads.c.data_object_id, func.count()).group_by(downloads.c.data_object_id)
+    db.execute(insert(table).from_select(["data_object_id", "count"], rows.statement))
+
+
 def search_biosample(
     db: Session,
     conditions: List[query.ConditionSchema],
@@ -439,24 +501,72 @@ def search_biosample(
     ).execute(db, prefetch_omics_processing_data)
 
 
-def get_biosample_ids(
+def search_biosample_cards(
     db: Session,
     conditions: List[query.ConditionSchema],
-):
+    data_object_filter: List[query.DataObjectFilter],
+) -> Query:
+    """Search for biosamples, selecting their precomputed search cards instead of the models."""
+    return (
+        search_biosample(db, conditions, data_object_filter)
+        .join(models.BiosampleCard, models.BiosampleCard.biosample_id == models.Biosample.id)
+        .with_entities(models.Biosample.id, models.Biosample.multiomics, models.BiosampleCard.card)
+    )
+
+
+def store_export_biosample_ids(
+    db: Session, export_id: UUID, conditions: List[query.ConditionSchema]
+) -> None:
     """
-    Get the list of `Biosample` `id`s specified via the search query.
+    Store the `id`s of the `Biosample`s specified via the search query in the
+    `metadata_export_biosample` table, under `export_id`.
+
+    The search runs once, and the `id`s stay on the database server, where the queries of
+    each exported document type (on their own connections) can join against them.
     """
-    biosample_ids = search_biosample(db, conditions, []).with_entities(models.Biosample.id).all()
-    return [id for (id,) in biosample_ids]
+    biosample_ids = (
+        search_biosample(db, conditions, [])
+        .with_entities(literal(export_id), models.Biosample.id)
+        .order_by(None)
+    )
+    db.execute(
+        insert(models.MetadataExportBiosample)
+        .from_select(["export_id", "biosample_id"], biosample_ids.statement)
+        .on_conflict_do_nothing()
+    )
+
+
+def delete_export_biosample_ids(db: Session, export_id: UUID) -> None:
+    db.query(models.MetadataExportBiosample).filter(
+        models.MetadataExportBiosample.export_id == export_id
+    ).delete()
 
 
 def facet_biosample(
     db: Session, attribute: str, conditions: List[query.ConditionSchema], **kwargs
 ) -> query.FacetResponse:
-    facets = query.BiosampleQuerySchema(conditions=conditions).facet(db, attribute)
+    query_schema = query.BiosampleQuerySchema(conditions=conditions)
+    facets = None
+    bitmap_index = facet_bitmap.get_biosample_bitmap_index(db)
+    if bitmap_index is not None:
+        facets = bitmap_index.facet(db, query_schema, attribute)
+    if facets is None:
+        facets = query_schema.facet(db, attribute)
     return query.FacetResponse(facets=facets)
 
 
+def batch_facet_biosample(
+    db: Session, attributes: List[str], conditions: List[query.ConditionSchema]
+) -> query.BatchFacetResponse:
+    query_schema = query.BiosampleQuerySchema(conditions=conditions)
+    facets: Dict[str, Dict[schemas.AnnotationValue, int]] = {}
+    bitmap_index = facet_bitmap.get_biosample_bitmap_index(db)
+    if bitmap_index is not None:
+        facets = bitmap_index.facets(db, query_schema, attributes)
+    facets.update(query_schema.facets(db, [a for a in attributes if a not in facets]))
+    return query.BatchFacetResponse(facets=facets)
+
+
 def binned_facet_biosample(
     db: Session,
     attribute: str,
@@ -510,8 +620,16 @@ def get_data_object_documents_by_ids(db: Session, ids_list: list[str]) -> list[d
     Get all `DataObject` documents whose `id` exists in the specified list of IDs.
     This is used to get all the DataObjects for files in a bulk download.
     """
+    biosample_ids = (
+        select(models.DocumentBiosample.biosample_id)  # type: ignore[arg-type]
+        .where(models.DocumentBiosample.document_id == models.BiosampleRelatedDocument.id)
+        .order_by(models.DocumentBiosample.biosample_id)
+    )
     statement = (
-        select(models.BiosampleRelatedDocument.document, models.BiosampleRelatedDocument.biosample_ids)  # type: ignore[arg-type]
+        select(
+            models.BiosampleRelatedDocument.document,  # type: ignore[arg-type]
+            func.array(biosample_ids.scalar_subquery()),  # type: ignore[attr-defined]
+        )
         .where(models.BiosampleRelatedDocument.id.in_(ids_list))
         .where(models.BiosampleRelatedDocument.high_level_type == "nmdc:DataObject")
     )
@@ -522,32 +640,47 @@ def get_data_object_documents_by_ids(db: Session, ids_list: list[str]) -> list[d
 
 def get_documents_by_biosample_ids(
     db: Session,
-    biosample_ids_list: list[str],
+    export_id: UUID,
     high_level_type: str,
     batch_size: int = 1000,
     include_superseded_workflow_executions: bool = True,
-) -> Iterator[dict]:
+) -> Iterator[bytes]:
     """
-    Yield documents of type, `high_level_type`, related to any of the specified `Biosample`s.
+    Yield documents of type, `high_level_type`, related to any of the `Biosample`s stored
+    for the export, `export_id` (see `store_export_biosample_ids`).
+
+    Each document is yielded as its UTF-8 encoded JSON text, serialized by the database
+    (`convert_to(document::text, 'UTF8')`), so that it can be written to an export as is,
+    without decoding the JSONB value into Python objects and encoding it again.
 
     Results are streamed from the database in batches of `batch_size` rows using a server-side
     cursor (`stream_results=True` / `yield_per`), so the full result set is never held in memory
     at once.  This is important for high-volume types such as `nmdc:WorkflowExecution` whose
     result sets can exceed 1 GB.
 
-    Note: We don't bother using `DISTINCT`, since `overlap` is only evaluated _once_ per row of the
-    table (even if multiple specified `Biosample` `id`s overlap the `biosample_ids` on that
-    row), so a given row of the table will only appear at most once in the result.
-    We include the `type: ignore[attr-defined]` comment because we're using old SQLAlchemy
-    stubs that do not account for the existence of an `overlap` method on array columns.
-    Similarly, we use `type: ignore[arg-type]` since the old stubs do not account for
+    The documents are found through the `document_biosample` table, whose b-tree index on
+    (`biosample_id`, `high_level_type`) includes the `document_id`, so the lookup is an
+    index-only scan driven by the stored `id`s.
+
+    Note: We use `IN` rather than a join, so that a document related to several of the
+    specified `Biosample`s appears only once in the result.
+    We use `type: ignore[arg-type]` since the old SQLAlchemy stubs do not account for
     the fact that `select` now expects columns directly, not an iterable of columns.
 
     Note: We order them by `id` to facilitate testing and manual review.
     """
+    biosample_ids = select(models.MetadataExportBiosample.biosample_id).where(  # type: ignore[arg-type]
+        models.MetadataExportBiosample.export_id == export_id
+    )
+    document_ids = (
+        select(models.DocumentBiosample.document_id)  # type: ignore[arg-type]
+        .where(models.DocumentBiosample.biosample_id.in_(biosample_ids))
+        .where(models.DocumentBiosample.high_level_type == high_level_type)
+    )
+    document_text = cast(models.BiosampleRelatedDocument.document, Text)
     statement = (
-        select(models.BiosampleRelatedDocument.document)  # type: ignore[arg-type]
-        .where(models.BiosampleRelatedDocument.biosample_ids.overlap(biosample_ids_list))  # type: ignore[attr-defined]
+        select(func.convert_to(document_text, "UTF8"))
+        .where(models.BiosampleRelatedDocument.id.in_(document_ids))
         .where(models.BiosampleRelatedDocument.high_level_type == high_level_type)
     )
 
@@ -583,6 +716,7 @@ def create_file_download(
 ) -> models.FileDownload:
     db_file_download = models.FileDownload(**file_download.dict())
     db.add(db_file_download)
+    increment_data_object_download_counts(db, [db_file_download.data_object_id])
     db.commit()
     db.refresh(db_file_download)
     return db_file_download
@@ -662,6 +796,7 @@ def create_bulk_download(
             return None
 
         db.flush()
+        increment_data_object_download_counts(db, data_object_ids)
         bulk_download_model.rocrate_metadata_cache = generate_rocrate_for_bulk_download(
             db, bulk_download_model, data_object_ids
         )
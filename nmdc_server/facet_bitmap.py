@@ -0,0 +1,162 @@
+"""
+This module contains an optional in-memory engine answering biosample facet requests.
+
+For every value of the biosample attributes indexed for the global search, the engine
+holds the set of biosamples having that value as a bitmap of biosample ordinals (stored
+as a python int).  Equality conditions on those attributes are resolved by combining
+bitmaps; any other conditions (ranges, full text search, annotations, other tables) are
+resolved by a single SQL query whose results are intersected with the bitmap.
+
+The engine is enabled with the `bitmap_facets` setting and rebuilt once per ingest
+generation.
+"""
+
+from threading import Lock
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from nmdc_server import models, query, schemas
+from nmdc_server.cache import on_clear
+from nmdc_server.config import settings
+from nmdc_server.ingest.generation import current_generation
+
+
+def _indexed_attributes() -> List[str]:
+    # Imported here because the search index module depends on crud, which uses this one.
+    from nmdc_server.ingest.search_index import search_fields
+
+    return [field for table, field in search_fields if table == "biosample"]
+
+
+def _condition_key(attribute: str) -> str:
+    """Return the key of the conditions filtering on a biosample attribute."""
+    table, field = query._envo_keys.get(attribute, (query.Table.biosample, attribute))
+    return f"{table}:{field}"
+
+
+class BiosampleBitmapIndex:
+    """Bitmaps of the biosamples having each value of the indexed attributes."""
+
+    def __init__(
+        self,
+        generation: Optional[str],
+        ordinals: Dict[str, int],
+        bitmaps: Dict[str, Dict[schemas.AnnotationValue, int]],
+    ):
+        self.generation = generation
+        self.ordinals = ordinals
+        self.bitmaps = bitmaps
+        self.all = (1 << len(ordinals)) - 1
+        self.attributes = {_condition_key(attribute): attribute for attribute in bitmaps}
+
+    @classmethod
+    def load(cls, db: Session, generation: Optional[str]) -> "BiosampleBitmapIndex":
+        ids = db.query(models.Biosample.id).order_by(models.Biosample.id)
+        ordinals = {id: ordinal for ordinal, (id,) in enumerate(ids)}
+        bitmaps: Dict[str, Dict[schemas.AnnotationValue, int]] = {}
+        for attribute in _indexed_attributes():
+            members: Dict[schemas.AnnotationValue, List[int]] = {}
+            rows = query.BiosampleQuerySchema().facet_members(db, attribute)
+            for value, id in rows:
+                members.setdefault(value, []).append(ordinals[id])
+            bitmaps[attribute] = {
+                value: _bitmap(value_ordinals, len(ordinals))
+                for value, value_ordinals in members.items()
+            }
+        return cls(generation, ordinals, bitmaps)
+
+    def facet(
+        self, db: Session, query_schema: query.BiosampleQuerySchema, attribute: str
+    ) -> Optional[Dict[schemas.AnnotationValue, int]]:
+        """Count the matching biosamples for each value of an attribute.
+
+        Returns None if the attribute isn't indexed.
+        """
+        if attribute not in self.bitmaps:
+            return None
+        return self.facets(db, query_schema, [attribute])[attribute]
+
+    def facets(
+        self, db: Session, query_schema: query.BiosampleQuerySchema, attributes: List[str]
+    ) -> Dict[str, Dict[schemas.AnnotationValue, int]]:
+        """Count the matching biosamples for each value of the indexed attributes given."""
+        attributes = [attribute for attribute in attributes if attribute in self.bitmaps]
+        if not attributes:
+            return {}
+        matches = self._matches(db, query_schema)
+        facets: Dict[str, Dict[schemas.AnnotationValue, int]] = {}
+        for attribute in attributes:
+            counts = {
+                value: (bitmap & matches).bit_count()
+                for value, bitmap in self.bitmaps[attribute].items()
+            }
+            facets[attribute] = {value: count for value, count in counts.items() if count}
+        return facets
+
+    def _matches(self, db: Session, query_schema: query.BiosampleQuerySchema) -> int:
+        """Return the bitmap of the biosamples matching the conditions of a query."""
+        matches = self.all
+        indexed_keys = set()
+        for key, group in query_schema.groups:
+            conditions = list(group)
+            indexed_attribute = self.attributes.get(key)
+            if indexed_attribute is None or not all(
+                isinstance(c, query.SimpleConditionSchema) and c.op == query.Operation.equal
+                for c in conditions
+            ):
+                continue
+            bitmap = 0
+            for c in conditions:
+                bitmap |= self.bitmaps[indexed_attribute].get(c.value, 0)
+            matches &= bitmap
+            indexed_keys.add(key)
+
+        # Resolve everything else with SQL.
+        remaining = [
+            c
+            for c in query_schema.conditions
+            if isinstance(c, query.FullTextSearchConditionSchema)
+            or c.__class__.from_schema(c, query_schema.table).key not in indexed_keys
+        ]
+        if remaining:
+            remaining_query = query_schema.model_copy(update={"conditions": remaining})
+            ids = remaining_query.query(db)
+            matches &= _bitmap(
+                (self.ordinals[id] for (id,) in ids if id in self.ordinals), len(self.ordinals)
+            )
+        return matches
+
+
+def _bitmap(ordinals: Iterable[int], size: int) -> int:
+    """Build a bitmap with the bits of the given ordinals set."""
+    data = bytearray((size + 7) // 8)
+    for ordinal in ordinals:
+        data[ordinal >> 3] |= 1 << (ordinal & 7)
+    return int.from_bytes(data, "little")
+
+
+_lock = Lock()
+_index: Optional[BiosampleBitmapIndex] = None
+
+
+def get_biosample_bitmap_index(db: Session) -> Optional[BiosampleBitmapIndex]:
+    """Return the index for the current ingest generation, or None if it is disabled."""
+    global _index
+    if not settings.bitmap_facets:
+        return None
+    generation = current_generation(db)
+    index = _index
+    if index is None or index.generation != generation:
+        with _lock:
+            if _index is None or _index.generation != generation:
+                _index = BiosampleBitmapIndex.load(db, generation)
+            index = _index
+    return index
+
+
+@on_clear
+def _reset() -> None:
+    global _index
+    with _lock:
+        _index = None
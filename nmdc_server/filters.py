@@ -331,6 +331,18 @@ class GeneFunctionFilter(OmicsProcessingFilter):
     def join_self(self, query: Query, parent: Table) -> Query:
         return query
 
+    def biosample_matches(self, db: Session) -> Query:
+        """Get a query of biosample id's with a gene function matching the conditions.
+
+        This uses the denormalized biosample_gene_function table, which covers the
+        metagenome, metaproteome and metatranscriptome annotations at once.
+        """
+        query = db.query(func.distinct(models.BiosampleGeneFunction.biosample_id).label("id")).join(
+            models.GeneFunction,
+            models.GeneFunction.id == models.BiosampleGeneFunction.gene_function_id,
+        )
+        return query.filter(or_(*[c.compare() for c in self.conditions]))
+
 
 class KeggFunctionFilter(GeneFunctionFilter):
     table = Table.kegg_function
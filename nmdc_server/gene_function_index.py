@@ -0,0 +1,110 @@
+"""
+This module contains an in-memory index of the mappings from KEGG pathways/modules, COG
+functions/pathways, PFAM clans and GO terms to the gene function terms they contain.
+
+The mapping tables only change during ingest, so the index is loaded once per ingest
+generation and search conditions can be expanded without querying the database.
+"""
+
+import sys
+from collections import defaultdict
+from enum import Enum
+from threading import Lock
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session
+
+from nmdc_server import models
+from nmdc_server.cache import on_clear
+from nmdc_server.ingest.generation import current_generation
+
+
+class GeneFunctionMapping(Enum):
+    kegg_pathway = "kegg_pathway"
+    kegg_module = "kegg_module"
+    cog_function = "cog_function"
+    cog_pathway = "cog_pathway"
+    pfam_clan = "pfam_clan"
+    go = "go"
+
+
+# (name column, term column) pairs of the tables backing each mapping.
+_mapping_columns: Dict[GeneFunctionMapping, List[Tuple[Any, Any]]] = {
+    GeneFunctionMapping.kegg_pathway: [
+        (models.KoTermToPathway.pathway, models.KoTermToPathway.term)
+    ],
+    GeneFunctionMapping.kegg_module: [(models.KoTermToModule.module, models.KoTermToModule.term)],
+    GeneFunctionMapping.cog_function: [
+        (models.CogTermToFunction.function, models.CogTermToFunction.term)
+    ],
+    GeneFunctionMapping.cog_pathway: [
+        (models.CogTermToPathway.pathway, models.CogTermToPathway.term)
+    ],
+    GeneFunctionMapping.pfam_clan: [(models.PfamEntryToClan.clan, models.PfamEntryToClan.entry)],
+    GeneFunctionMapping.go: [
+        (models.GoTermToPfamEntry.term, models.GoTermToPfamEntry.entry),
+        (models.GoTermToKegg.term, models.GoTermToKegg.kegg_term),
+    ],
+}
+
+# Characters with a special meaning in (i)like patterns.
+_LIKE_WILDCARDS = ("%", "_", "\\")
+
+
+class GeneFunctionIndex:
+    """Case-insensitive lookup of the gene function terms contained in a named group."""
+
+    def __init__(
+        self,
+        generation: Optional[str],
+        mappings: Dict[GeneFunctionMapping, Dict[str, Tuple[str, ...]]],
+    ):
+        self.generation = generation
+        self.mappings = mappings
+
+    @classmethod
+    def load(cls, db: Session, generation: Optional[str]) -> "GeneFunctionIndex":
+        mappings: Dict[GeneFunctionMapping, Dict[str, Tuple[str, ...]]] = {}
+        for mapping, columns in _mapping_columns.items():
+            terms: Dict[str, Set[str]] = defaultdict(set)
+            for name_column, term_column in columns:
+                for name, term in db.query(name_column, term_column):
+                    terms[sys.intern(name.lower())].add(sys.intern(term))
+            mappings[mapping] = {name: tuple(sorted(t)) for name, t in terms.items()}
+        return cls(generation, mappings)
+
+    def expand(self, db: Session, mapping: GeneFunctionMapping, name: str) -> Tuple[str, ...]:
+        """Return the terms of the group matching `name` (compared with `ilike`)."""
+        if any(c in name for c in _LIKE_WILDCARDS):
+            # Patterns can match several groups, so defer to the database.
+            queries = [
+                select(term_column.label("term")).where(name_column.ilike(name))
+                for name_column, term_column in _mapping_columns[mapping]
+            ]
+            return tuple(sorted(term for (term,) in db.execute(union(*queries))))
+        return self.mappings[mapping].get(name.lower(), ())
+
+
+_lock = Lock()
+_index: Optional[GeneFunctionIndex] = None
+
+
+def get_gene_function_index(db: Session) -> GeneFunctionIndex:
+    """Return the index for the current ingest generation, loading it if necessary."""
+    global _index
+    generation = current_generation(db)
+    index = _index
+    if index is None or index.generation != generation:
+        with _lock:
+            if _index is None or _index.generation != generation:
+                _index = GeneFunctionIndex.load(db, generation)
+            index = _index
+    return index
+
+
+@on_clear
+def _reset() -> None:
+    global _index
+    with _lock:
+        _index = None
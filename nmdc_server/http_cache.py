@@ -0,0 +1,103 @@
+"""
+The data portal read endpoints only return data that changes when a new ingest is
+promoted, so their responses are validated with an ETag derived from the ingest
+generation and the request (path, query parameters and normalized JSON body).
+
+Conditional requests matching the current ETag are answered with 304 before the endpoint
+runs, and successful responses are marked cacheable so that a CDN can absorb repeated
+requests.  Endpoints returning data object download counts, which change between ingests,
+don't use these ETags.
+"""
+
+import hashlib
+import json
+from typing import Dict, Optional
+
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from nmdc_server.config import settings
+from nmdc_server.database import get_db
+from nmdc_server.ingest.generation import current_generation
+
+
+async def _normalized_body(request: Request) -> bytes:
+    body = await request.body()
+    if not body:
+        return b""
+    try:
+        return json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+    except ValueError:
+        return body
+
+
+async def compute_etag(request: Request, generation: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(generation.encode())
+    digest.update(b"\0" + request.method.encode())
+    digest.update(b"\0" + request.url.path.encode())
+    for key, value in sorted(request.query_params.multi_items()):
+        digest.update(b"\0" + key.encode() + b"=" + value.encode())
+    digest.update(b"\0" + await _normalized_body(request))
+    # Responses are equivalent but not necessarily byte for byte identical.
+    return f'W/"{digest.hexdigest()[:32]}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(
+        candidate.removeprefix("W/") == etag.removeprefix("W/") for candidate in candidates
+    )
+
+
+def _cache_headers(etag: str, generation: str) -> Dict[str, str]:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.http_cache_max_age}",
+        "Ingest-Generation": generation,
+    }
+
+
+async def generation_etag(request: Request, db: Session = Depends(get_db)):
+    """Answer conditional requests for data that only changes at ingest.
+
+    Databases ingested before generations were recorded are not cached.
+    """
+    generation = await run_in_threadpool(current_generation, db)
+    if generation is None:
+        return
+    etag = await compute_etag(request, generation)
+    headers = _cache_headers(etag, generation)
+    if _etag_matches(request.headers.get("If-None-Match"), etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # Added to the response by CacheHeadersMiddleware.
+    request.state.cache_headers = headers
+
+
+class CacheHeadersMiddleware:
+    """Add the headers computed by `generation_etag` to successful responses.
+
+    This is done in a middleware because some endpoints return their own responses.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cache_headers(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                cache_headers = scope.get("state", {}).get("cache_headers")
+                if cache_headers:
+                    MutableHeaders(scope=message).update(cache_headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cache_headers)
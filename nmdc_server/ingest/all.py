@@ -11,17 +11,23 @@ from nmdc_server import models
 from nmdc_server.config import Settings
 from nmdc_server.data_object_filters import WorkflowActivityTypeEnum
 from nmdc_server.ingest import (
+    attribute_range,
     biosample,
+    biosample_card,
+    biosample_gene_function,
     biosample_related_document,
     common,
     data_object,
+    environment_rollup,
     envo,
+    generation,
     kegg,
     omics_processing,
     ontology,
     pipeline,
     search_index,
     study,
+    summary,
 )
 from nmdc_server.ingest.common import duration_logger
 from nmdc_server.logger import get_logger
@@ -295,6 +301,18 @@ def load(db: Session, function_limit=None, skip_annotation=False) -> Dict[str, c
         models.Biosample.populate_multiomics(db)
         db.commit()
 
+    with duration_logger(logger, "Loading biosample gene functions"):
+        biosample_gene_function.load(db)
+        db.commit()
+
+    with duration_logger(logger, "Rolling up biosample environments"):
+        environment_rollup.load(db)
+        db.commit()
+
+    with duration_logger(logger, "Computing attribute ranges"):
+        attribute_range.load(db)
+        db.commit()
+
     with duration_logger(logger, "Preprocessing ENVO term data"):
         envo.build_envo_trees(db)
 
@@ -302,6 +320,18 @@ def load(db: Session, function_limit=None, skip_annotation=False) -> Dict[str, c
         search_index.load(db)
         db.commit()
 
+    with duration_logger(logger, "Generating biosample search cards"):
+        biosample_card.load(db)
+        db.commit()
+
+    with duration_logger(logger, "Computing database summaries"):
+        summary.load(db)
+        db.commit()
+
+    # Record the generation last, so that caches are only rebuilt from a complete ingest.
+    generation.load(db)
+    db.commit()
+
     return dict(
         study_etl_report=study_etl_report,
         biosample_etl_report=biosample_etl_report,
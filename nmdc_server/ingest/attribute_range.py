@@ -0,0 +1,105 @@
+"""
+The range of every numeric and date attribute is computed once at the end of ingest, so
+that binned facets without search conditions know their bounds without scanning the
+table.  The ranges are loaded in memory once per ingest generation.
+"""
+
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import BigInteger, DateTime, Float, Integer, func, inspect, text
+from sqlalchemy.orm import Session
+
+from nmdc_server import models
+from nmdc_server.cache import on_clear
+from nmdc_server.ingest.generation import current_generation
+from nmdc_server.table import Table
+
+RangeValue = Union[float, int, datetime]
+
+# The tables with a binned facet endpoint.
+_tables = [Table.biosample, Table.study, Table.omics_processing]
+
+
+def _binnable_columns(model: Any) -> List[Tuple[str, Any]]:
+    return [
+        (attribute, column)
+        for attribute, column in inspect(model).columns.items()
+        if isinstance(column.type, (BigInteger, DateTime, Float, Integer))
+    ]
+
+
+def _encode(value: Optional[RangeValue]) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _decode(column: Any, value: Any) -> Optional[RangeValue]:
+    if value is not None and isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def load(db: Session) -> None:
+    """Compute the range of the binnable attributes.
+
+    This must run after all of the tables listed above have been ingested.
+    """
+    db.execute(text(f"TRUNCATE TABLE {models.AttributeRange.__tablename__}"))
+    for table in _tables:
+        columns = _binnable_columns(table.model)
+        aggregates = [f(column) for _, column in columns for f in (func.min, func.max)]
+        row = db.query(*aggregates).one()
+        for index, (attribute, _) in enumerate(columns):
+            db.add(
+                models.AttributeRange(
+                    table=table.value,
+                    attribute=attribute,
+                    minimum=_encode(row[2 * index]),
+                    maximum=_encode(row[2 * index + 1]),
+                )
+            )
+
+
+_lock = Lock()
+_ranges: Optional[
+    Tuple[Optional[str], Dict[Tuple[str, str], Tuple[Optional[RangeValue], Optional[RangeValue]]]]
+] = None
+
+
+def _load_ranges(
+    db: Session,
+) -> Dict[Tuple[str, str], Tuple[Optional[RangeValue], Optional[RangeValue]]]:
+    ranges = {}
+    for row in db.query(models.AttributeRange):
+        column = getattr(Table(row.table).model, row.attribute)
+        ranges[(row.table, row.attribute)] = (
+            _decode(column, row.minimum),
+            _decode(column, row.maximum),
+        )
+    return ranges
+
+
+def get_range(
+    db: Session, table: Table, attribute: str
+) -> Optional[Tuple[Optional[RangeValue], Optional[RangeValue]]]:
+    """Return the (minimum, maximum) of an attribute over its whole table.
+
+    Returns None if the range wasn't computed by the ingest of the current generation.
+    """
+    global _ranges
+    generation = current_generation(db)
+    ranges = _ranges
+    if ranges is None or ranges[0] != generation:
+        with _lock:
+            if _ranges is None or _ranges[0] != generation:
+                _ranges = (generation, _load_ranges(db))
+            ranges = _ranges
+    return ranges[1].get((table.value, attribute))
+
+
+@on_clear
+def _reset() -> None:
+    global _ranges
+    with _lock:
+        _ranges = None
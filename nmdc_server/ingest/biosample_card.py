@@ -0,0 +1,54 @@
+"""
+The search result of every biosample is serialized once at the end of ingest, so that search
+pages can be returned from a single JSONB column instead of loading and serializing the
+omics processing, workflow execution and data object relationships of each biosample.
+
+Data object selection and download counts depend on the request, so they are applied on
+top of the cards by the search endpoint.
+"""
+
+from typing import Any, Dict, List
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from nmdc_server import models, query, schemas
+from nmdc_server.ingest.generation import is_table_loaded
+
+_BATCH_SIZE = 500
+
+
+def serialize(biosample: models.Biosample) -> Dict[str, Any]:
+    """Serialize a biosample the way the search endpoint does, without download counts."""
+    for op in biosample.omics_processing:
+        data_objects = [*op.outputs, *(da for od in op.omics_data for da in od.outputs)]
+        for data_object in data_objects:
+            data_object._download_count = 0
+    return schemas.Biosample.model_validate(biosample).model_dump(mode="json")
+
+
+def load(db: Session) -> None:
+    """Generate the card of every biosample.
+
+    This must run after everything included in the search results has been ingested.
+    """
+    db.execute(text(f"TRUNCATE TABLE {models.BiosampleCard.__tablename__}"))
+    ids = [id for (id,) in db.query(models.Biosample.id).order_by(models.Biosample.id)]
+    for start in range(0, len(ids), _BATCH_SIZE):
+        batch = ids[start : start + _BATCH_SIZE]
+        biosamples = (
+            query.BiosampleQuerySchema()
+            .execute(db, prefetch_omics_processing_data=True)
+            .filter(models.Biosample.id.in_(batch))
+        )
+        rows: List[Dict[str, Any]] = [
+            {"biosample_id": biosample.id, "card": serialize(biosample)} for biosample in biosamples
+        ]
+        db.execute(insert(models.BiosampleCard.__table__), rows)
+        # Don't keep the serialized objects around for the rest of the batches.
+        db.expunge_all()
+
+
+def is_loaded(db: Session) -> bool:
+    """Return whether the cards have been generated by the ingest of the current generation."""
+    return is_table_loaded(db, models.BiosampleCard)
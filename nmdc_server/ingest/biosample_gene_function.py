@@ -0,0 +1,69 @@
+from typing import Any, List, Tuple
+
+from sqlalchemy import insert, join, literal, select, text
+from sqlalchemy.orm import Session
+
+from nmdc_server import models
+from nmdc_server.ingest.generation import is_table_loaded
+
+# (omics source, gene function aggregation, workflow execution id column of the aggregation,
+#  association table between the workflow execution and its data generation)
+_sources: List[Tuple[str, Any, Any, Any]] = [
+    (
+        "metagenome",
+        models.MGAGeneFunctionAggregation,
+        models.MGAGeneFunctionAggregation.metagenome_annotation_id,
+        models.metagenome_annotation_data_generation_association,
+    ),
+    (
+        "metaproteome",
+        models.MetaPGeneFunctionAggregation,
+        models.MetaPGeneFunctionAggregation.metaproteomic_analysis_id,
+        models.metaproteomic_analysis_data_generation_association,
+    ),
+    (
+        "metatranscriptome",
+        models.MetaTGeneFunctionAggregation,
+        models.MetaTGeneFunctionAggregation.metatranscriptome_annotation_id,
+        models.metatranscriptome_annotation_data_generation_association,
+    ),
+]
+
+
+def load(db: Session) -> None:
+    """Denormalize the gene function aggregations into the biosample_gene_function table.
+
+    This must run after all of the annotation stages of the ingest.
+    """
+    db.execute(text(f"TRUNCATE TABLE {models.BiosampleGeneFunction.__tablename__}"))
+    biosample_input = models.biosample_input_association
+    for omics_source, aggregation, workflow_id_column, association_table in _sources:
+        # The association tables name their workflow execution columns like the aggregations.
+        association_column = association_table.c[workflow_id_column.key]
+        source = join(
+            aggregation,
+            association_table,
+            association_column == workflow_id_column,
+        ).join(
+            biosample_input,
+            biosample_input.c.omics_processing_id == association_table.c.data_generation_id,
+        )
+        rows = (
+            select(
+                aggregation.gene_function_id,
+                biosample_input.c.biosample_id,
+                literal(omics_source),
+            )
+            .select_from(source)
+            .distinct()
+        )
+        db.execute(
+            insert(models.BiosampleGeneFunction.__table__).from_select(
+                ["gene_function_id", "biosample_id", "omics_source"], rows
+            )
+        )
+
+
+def is_loaded(db: Session) -> bool:
+    """Return whether the table has been populated by the ingest of the current generation."""
+    return is_table_loaded(db, models.BiosampleGeneFunction)
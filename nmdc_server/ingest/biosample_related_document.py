@@ -579,84 +579,81 @@ def backfill_downstream_neighbor_lists_of_data_emitter_processes(
         )
 
 
-def populate_biosample_ids_column(db: Session, biosample_ids: List[str]) -> None:
+def populate_document_biosample_table(db: Session) -> None:
     """
-    Identifies the IDs of all relevant documents that are downstream from each biosample (whose ID
-    is passed in), and then updates the `biosample_ids` column (in the Postgres session) of each
-    downstream document's row so that it contains the ID of that [upstream] biosample.
+    Identifies the IDs of all relevant documents that are downstream from each biosample, and then
+    stores each (document, biosample) pair in the `document_biosample` table, along with the
+    documents' existing `biosample_ids` (i.e. the biosamples themselves and those of studies).
 
-    This involves a recursive Postgres query. We included extensive commentary within the query in
-    an attempt to facilitate maintaining the query over time.
+    The `biosample_ids` column of each document's row is then rewritten, once, from that table.
+
+    This involves a recursive Postgres query, which traverses the downstream neighbors of all
+    biosamples at once. We included extensive commentary within the query in an attempt to
+    facilitate maintaining the query over time.
     """
 
-    # For each biosample ID, identify each document that is _anywhere_ downstream from that biosample.
-    for biosample_id in biosample_ids:
-        query = """--sql
-            -- Note: This "WITH RECURSIVE" statement creates a temporary so-called "working table"
-            --       (which happens to have a single column, named `downstream_neighbor_id`)
-            --       that we can reference from within the "recursive term" of the same query.
-            --       We use this query to recursively traverse downstream neighbors, relative to
-            --       one specific biosample (whose ID is referenced by `:biosample_id` below).
-            --
-            -- Docs: https://www.postgresql.org/docs/current/queries-with.html#QUERIES-WITH-RECURSIVE
-            --
-            WITH RECURSIVE working_table(downstream_neighbor_id) AS (
-                    -- 1️⃣ Non-recursive term: Get the IDs of the (immediate) downstream neighbors
-                    --                        of the specified biosample. We could have gotten
-                    --                        those IDs outside of this query, but doing it here
-                    --                        keeps this "non-recursive term" more conceptually
-                    --                        symmetrical with the "recursive term" below.
-                    --
-                    -- Note: `unnest()` expands an array into a set of rows, where each array
-                    --       element is on its own row. We use it here to expand the
-                    --       `downstream_neighbor_ids` array elements into individual rows so
-                    --       that we can then "join" on each of them.
-                    --
-                    -- Docs: https://www.postgresql.org/docs/current/functions-array.html
-                    --
-                    SELECT unnest(brd.downstream_neighbor_ids) AS downstream_neighbor_id
-                    FROM biosample_related_document AS brd
-                    WHERE brd.id = :biosample_id
-                UNION
-                    -- 🔁 Recursive term: Get the IDs of the (immediate) downstream neighbors of
-                    --                    the documents identified in the previous iteration.
-                    --                    Once there are no such IDs, this will return no rows,
-                    --                    causing recursion [down that specific path] to end.
-                    --
-                    SELECT unnest(brd_2.downstream_neighbor_ids) AS downstream_neighbor_id
-                    FROM biosample_related_document AS brd_2,
-                         working_table
-                    WHERE brd_2.id = working_table.downstream_neighbor_id
-            )
+    db.execute(text("""--sql
+        INSERT INTO document_biosample (document_id, biosample_id, high_level_type)
+        SELECT DISTINCT brd.id, unnest(brd.biosample_ids), brd.high_level_type
+        FROM biosample_related_document AS brd;
+    """))
+
+    query = """--sql
+        -- Note: This "WITH RECURSIVE" statement creates a temporary so-called "working table"
+        --       (which has two columns, named `biosample_id` and `downstream_neighbor_id`)
+        --       that we can reference from within the "recursive term" of the same query.
+        --       We use this query to recursively traverse downstream neighbors, relative to
+        --       every biosample, keeping track of the biosample each path started from.
+        --
+        -- Docs: https://www.postgresql.org/docs/current/queries-with.html#QUERIES-WITH-RECURSIVE
+        --
+        WITH RECURSIVE working_table(biosample_id, downstream_neighbor_id) AS (
+                -- 1️⃣ Non-recursive term: Get the IDs of the (immediate) downstream neighbors
+                --                        of each biosample.
+                --
+                -- Note: `unnest()` expands an array into a set of rows, where each array
+                --       element is on its own row. We use it here to expand the
+                --       `downstream_neighbor_ids` array elements into individual rows so
+                --       that we can then "join" on each of them.
+                --
+                -- Docs: https://www.postgresql.org/docs/current/functions-array.html
+                --
+                SELECT brd.id, unnest(brd.downstream_neighbor_ids)
+                FROM biosample_related_document AS brd
+                WHERE brd.high_level_type = 'nmdc:Biosample'
+            UNION
+                -- 🔁 Recursive term: Get the IDs of the (immediate) downstream neighbors of
+                --                    the documents identified in the previous iteration.
+                --                    Once there are no such IDs, this will return no rows,
+                --                    causing recursion [down that specific path] to end.
+                --                    `UNION` discards (biosample, document) pairs that were
+                --                    already found, so cycles end the recursion too.
+                --
+                SELECT working_table.biosample_id, unnest(brd_2.downstream_neighbor_ids)
+                FROM biosample_related_document AS brd_2,
+                     working_table
+                WHERE brd_2.id = working_table.downstream_neighbor_id
+        )
 
-            -- Return the distinct IDs of all the documents that are downstream from the biosample.
-            SELECT DISTINCT downstream_neighbor_id FROM working_table;
-        """
-        rows = db.execute(text(query), {"biosample_id": biosample_id}).fetchall()
-        downstream_document_ids: List[str] = [row[0] for row in rows]
+        -- Store each pair whose downstream document exists.
+        INSERT INTO document_biosample (document_id, biosample_id, high_level_type)
+        SELECT working_table.downstream_neighbor_id, working_table.biosample_id, brd.high_level_type
+        FROM working_table
+        JOIN biosample_related_document AS brd ON brd.id = working_table.downstream_neighbor_id
+        ON CONFLICT DO NOTHING;
+    """
+    db.execute(text(query))
 
-        # Update all of those downstream documents so their `biosample_ids` array contains the `id`
-        # of the current biosample.
-        #
-        # Note: We use Postgres's `array_append()` function to update the array. We use the `WHERE`
-        #       clause to avoid adding the biosample's `id` to arrays that already contain it.
-        #
-        # Docs: https://www.postgresql.org/docs/current/functions-array.html
-        #
-        if len(downstream_document_ids) > 0:
-            update_query = """--sql
-                UPDATE biosample_related_document
-                SET biosample_ids = array_append(biosample_ids, :biosample_id)
-                WHERE id = ANY(:downstream_document_ids)
-                  AND NOT (:biosample_id = ANY(biosample_ids));
-            """
-            db.execute(
-                text(update_query),
-                {
-                    "biosample_id": biosample_id,
-                    "downstream_document_ids": downstream_document_ids,
-                },
-            )
+    db.execute(text("""--sql
+        UPDATE biosample_related_document AS brd
+        SET biosample_ids = related.biosample_ids
+        FROM (
+            SELECT document_id, array_agg(biosample_id ORDER BY biosample_id) AS biosample_ids
+            FROM document_biosample
+            GROUP BY document_id
+        ) AS related
+        WHERE brd.id = related.document_id;
+    """))
 
 
 def delete_documents_having_no_associated_biosamples(db: Session) -> int:
@@ -740,7 +737,7 @@ def load(db: Session, mongodb: Database) -> None:
         db.commit()
 
     with duration_logger(logger, "🧪 Loading biosamples"):
-        biosample_ids, biosample_associated_studies_values = load_biosamples(
+        _, biosample_associated_studies_values = load_biosamples(
             db,
             biosample_set,
             data_generation_ids_by_input_id,
@@ -789,9 +786,10 @@ def load(db: Session, mongodb: Database) -> None:
         db.commit()
 
     # Use the downstream neighbor identities we gathered above to determine which biosample(s)
-    # each document is associated with; and then update its `biosample_ids` column.
-    with duration_logger(logger, "🕵️ Populating `biosample_ids` column"):
-        populate_biosample_ids_column(db, biosample_ids)
+    # each document is associated with; and then store them in the `document_biosample` table
+    # (and the `biosample_ids` column).
+    with duration_logger(logger, "🕵️ Populating `document_biosample` table"):
+        populate_document_biosample_table(db)
         db.commit()
 
     # Clean up: Delete rows that have no associated biosample.
@@ -0,0 +1,37 @@
+from typing import Any, List
+
+from sqlalchemy import func, insert, text
+from sqlalchemy.orm import Session
+
+from nmdc_server import models
+from nmdc_server.ingest.generation import is_table_loaded
+
+# The biosample columns the rollup is grouped by (named like the rollup columns).
+dimensions: List[Any] = [
+    models.Biosample.ecosystem,
+    models.Biosample.ecosystem_category,
+    models.Biosample.ecosystem_type,
+    models.Biosample.ecosystem_subtype,
+    models.Biosample.specific_ecosystem,
+    models.Biosample.latitude,
+    models.Biosample.longitude,
+]
+
+
+def load(db: Session) -> None:
+    """Count the biosamples of every environment and location.
+
+    This must run after the biosamples have been ingested.
+    """
+    db.execute(text(f"TRUNCATE TABLE {models.EnvironmentRollup.__tablename__}"))
+    rows = db.query(*dimensions, func.count()).group_by(*dimensions)
+    db.execute(
+        insert(models.EnvironmentRollup.__table__).from_select(
+            [column.key for column in dimensions] + ["count"], rows.statement
+        )
+    )
+
+
+def is_loaded(db: Session) -> bool:
+    """Return whether the table has been populated by the ingest of the current generation."""
+    return is_table_loaded(db, models.EnvironmentRollup)
@@ -0,0 +1,73 @@
+"""
+Every ingest records a new generation identifier in the database it populates.  Since
+ingested data does not change between ingests, in-process caches built from it only need
+to be rebuilt when the generation of the database changes.
+"""
+
+import time
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from nmdc_server import models
+from nmdc_server.cache import on_clear
+from nmdc_server.config import settings
+
+_lock = Lock()
+_generation: Optional[str] = None
+_checked_at: Optional[float] = None
+
+
+def load(db: Session) -> models.IngestGeneration:
+    """Record a new generation for the data that was just ingested."""
+    db.query(models.IngestGeneration).delete()
+    generation = models.IngestGeneration()
+    db.add(generation)
+    return generation
+
+
+def current_generation(db: Session) -> Optional[str]:
+    """Return the generation of the ingested data.
+
+    The database is checked at most once every `ingest_generation_check_interval` seconds.
+    Returns None for databases that were ingested before generations were recorded.
+    """
+    global _generation, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _checked_at is None or now - _checked_at >= settings.ingest_generation_check_interval:
+            _generation = db.query(models.IngestGeneration.generation).scalar()
+            _checked_at = now
+        return _generation
+
+
+_loaded_tables: Dict[Tuple[Optional[str], str], bool] = {}
+
+
+def is_table_loaded(db: Session, model: Any) -> bool:
+    """Return whether a table derived at the end of ingest has been populated.
+
+    Databases ingested before the table existed have it empty, in which case the data
+    it is derived from should be used instead.  The result is cached per generation.
+    """
+    global _loaded_tables
+    generation = current_generation(db)
+    key = (generation, model.__tablename__)
+    with _lock:
+        loaded = _loaded_tables.get(key)
+    if loaded is None:
+        loaded = bool(db.query(db.query(model).exists()).scalar())
+        with _lock:
+            _loaded_tables = {k: v for k, v in _loaded_tables.items() if k[0] == generation}
+            _loaded_tables[key] = loaded
+    return loaded
+
+
+@on_clear
+def _reset() -> None:
+    global _generation, _checked_at, _loaded_tables
+    with _lock:
+        _generation = None
+        _checked_at = None
+        _loaded_tables = {}
@@ -0,0 +1,28 @@
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from nmdc_server import crud, models
+
+# The payload of each summary endpoint, serialized like the endpoint does.
+_payloads: Dict[str, Callable[[Session], Any]] = {
+    "summary": lambda db: crud.get_database_summary(db).model_dump(mode="json", exclude_unset=True),
+    "stats": lambda db: crud.get_aggregated_stats(db).model_dump(mode="json"),
+}
+
+
+def load(db: Session) -> None:
+    """Compute the payloads of the summary endpoints.
+
+    This must run after everything else has been ingested.
+    """
+    db.execute(text(f"TRUNCATE TABLE {models.SummaryPayload.__tablename__}"))
+    for name, compute in _payloads.items():
+        db.add(models.SummaryPayload(name=name, payload=compute(db)))
+
+
+def get_payload(db: Session, name: str) -> Optional[Any]:
+    """Return the stored payload of a summary endpoint, if it was computed at ingest."""
+    row = db.get(models.SummaryPayload, name)  # type: ignore
+    return row.payload if row is not None else None
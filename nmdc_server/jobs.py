@@ -6,7 +6,7 @@ from alembic.config import Config
 from sqlalchemy import text
 from sqlalchemy.orm import lazyload
 
-from nmdc_server import database, models
+from nmdc_server import crud, database, models
 from nmdc_server.config import settings
 from nmdc_server.ingest.all import load
 from nmdc_server.ingest.common import (
@@ -117,6 +117,8 @@ def do_ingest(function_limit, skip_annotation) -> Dict[str, ETLReport]:
                         lazyload(models.BulkDownloadDataObject.data_object)
                     ),
                 )
+                crud.rebuild_data_object_download_counts(ingest_db)
+                ingest_db.commit()
 
             # Copy "independent" data from the "portal" database into the "ingest" database.
             #
@@ -0,0 +1,450 @@
+"""
+Build the metadata export archives of `POST /api/download_metadata` and of the asynchronous
+exports of `POST /api/metadata_export`.
+
+Each requested document type is fetched on its own pooled database connection and
+compressed in its own thread (zlib releases the GIL while it compresses), into a temporary
+file.  The compressed entries are copied into the outgoing ZIP stream in the order they
+finish, so a multi-type export takes about as long as its largest document type.
+
+The entries' sizes and CRCs are known before they are written, so the archive is written
+without data descriptors.  ZIP64 records are added when an entry or the archive exceeds the
+limits of the original format.
+
+Asynchronous exports are built by a thread pool of each API process, and their archives are
+stored in `settings.metadata_export_dir`, in a directory per ingest generation.  An export of
+a query that was already exported from the current generation reuses its archive.  Exports
+left pending or running by a process that exited are marked as failed when they are looked
+up.
+"""
+
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import suppress
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from nmdc_server import crud, models, query
+from nmdc_server.config import settings
+from nmdc_server.database import SessionLocal, engine
+from nmdc_server.logger import get_logger
+
+logger = get_logger(__name__)
+
+# The document types that can be exported, and the names of their files in the archive.
+# Each key is used directly as the high_level_type filter in BiosampleRelatedDocument.
+DOCUMENT_TYPE_FILENAMES = {
+    "nmdc:Biosample": "biosamples",
+    "nmdc:Study": "studies",
+    "nmdc:DataObject": "data_objects",
+    "nmdc:DataGeneration": "data_generations",
+    "nmdc:WorkflowExecution": "workflow_executions",
+}
+
+# Limits the database connections used by the metadata exports of this process, so that
+# request handlers can still get connections from the pool (see `metadata_export_connections`).
+_connections = threading.BoundedSemaphore(settings.metadata_export_connections)
+
+# The amount of uncompressed data passed to zlib at once, and of compressed data copied to
+# the response at once.
+CHUNK_SIZE = 1024 * 1024
+
+# Compressed entries up to this size are kept in memory rather than in a file.
+SPOOL_SIZE = 16 * 1024 * 1024
+
+# See section 4.3 of https://pkware.cachefly.net/webdocs/casestudies/APPNOTE.TXT
+_CENTRAL_DIRECTORY = struct.Struct("<4s4B4HL2L5H2L")
+_END_OF_CENTRAL_DIRECTORY = struct.Struct("<4s4H2LH")
+_ZIP64_END_OF_CENTRAL_DIRECTORY = struct.Struct("<4sQ2H2L4Q")
+_ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR = struct.Struct("<4sLQL")
+_ZIP64_VERSION = 45
+_ZIP64_EXTRA_ID = 0x0001
+_ZIP_FILECOUNT_LIMIT = 0xFFFF
+
+
+@dataclass
+class CompressedEntry:
+    """A deflated ZIP entry, kept in a temporary file until it is written to the archive."""
+
+    info: zipfile.ZipInfo
+    data: IO[bytes]
+
+
+def compress_entry(filename: str, chunks: Iterable[bytes]) -> CompressedEntry:
+    """Deflate the concatenated `chunks` into a ZIP entry named `filename`."""
+    info = zipfile.ZipInfo(filename, date_time=datetime.now().timetuple()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o600 << 16
+    data = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+    crc = size = 0
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= CHUNK_SIZE:
+            crc = zlib.crc32(buffer, crc)
+            size += len(buffer)
+            data.write(compressor.compress(buffer))
+            buffer.clear()
+    crc = zlib.crc32(buffer, crc)
+    size += len(buffer)
+    data.write(compressor.compress(buffer))
+    data.write(compressor.flush())
+
+    info.CRC = crc
+    info.file_size = size
+    info.compress_size = data.tell()
+    data.seek(0)
+    return CompressedEntry(info=info, data=data)
+
+
+class ZipStream:
+    """Write `CompressedEntry`s to a ZIP archive, returning the archive's bytes as they go."""
+
+    def __init__(self) -> None:
+        self._offset = 0
+        self._infos: List[zipfile.ZipInfo] = []
+
+    def write(self, entry: CompressedEntry) -> Iterator[bytes]:
+        info = entry.info
+        info.header_offset = self._offset
+        header = info.FileHeader()
+        self._offset += len(header) + info.compress_size
+        self._infos.append(info)
+        yield header
+        while chunk := entry.data.read(CHUNK_SIZE):
+            yield chunk
+
+    def close(self) -> bytes:
+        """Return the central directory, which ends the archive."""
+        central_directory = b"".join(self._central_directory_header(info) for info in self._infos)
+        count, size, offset = len(self._infos), len(central_directory), self._offset
+        end = b""
+        if (
+            count > _ZIP_FILECOUNT_LIMIT
+            or size > zipfile.ZIP64_LIMIT
+            or offset > zipfile.ZIP64_LIMIT
+        ):
+            end += _ZIP64_END_OF_CENTRAL_DIRECTORY.pack(
+                b"PK\x06\x06",
+                _ZIP64_END_OF_CENTRAL_DIRECTORY.size - 12,
+                _ZIP64_VERSION,
+                _ZIP64_VERSION,
+                0,
+                0,
+                count,
+                count,
+                size,
+                offset,
+            )
+            end += _ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR.pack(b"PK\x06\x07", 0, offset + size, 1)
+            count = min(count, _ZIP_FILECOUNT_LIMIT)
+            size = min(size, 0xFFFFFFFF)
+            offset = min(offset, 0xFFFFFFFF)
+        end += _END_OF_CENTRAL_DIRECTORY.pack(b"PK\x05\x06", 0, 0, count, count, size, offset, 0)
+        return central_directory + end
+
+    @staticmethod
+    def _central_directory_header(info: zipfile.ZipInfo) -> bytes:
+        file_size, compress_size, header_offset = (
+            info.file_size,
+            info.compress_size,
+            info.header_offset,
+        )
+        zip64_values = []
+        if file_size > zipfile.ZIP64_LIMIT or compress_size > zipfile.ZIP64_LIMIT:
+            zip64_values += [file_size, compress_size]
+            file_size = compress_size = 0xFFFFFFFF
+        if header_offset > zipfile.ZIP64_LIMIT:
+            zip64_values.append(header_offset)
+            header_offset = 0xFFFFFFFF
+        extra = b""
+        create_version, extract_version = info.create_version, info.extract_version
+        if zip64_values:
+            extra = struct.pack(
+                f"<HH{len(zip64_values)}Q", _ZIP64_EXTRA_ID, 8 * len(zip64_values), *zip64_values
+            )
+            create_version = max(create_version, _ZIP64_VERSION)
+            extract_version = max(extract_version, _ZIP64_VERSION)
+
+        year, month, day, hour, minute, second = info.date_time
+        filename = info.filename.encode("ascii")
+        return (
+            _CENTRAL_DIRECTORY.pack(
+                b"PK\x01\x02",
+                create_version,
+                info.create_system,
+                extract_version,
+                0,
+                info.flag_bits,
+                info.compress_type,
+                hour << 11 | minute << 5 | second // 2,
+                (year - 1980) << 9 | month << 5 | day,
+                info.CRC,
+                compress_size,
+                file_size,
+                len(filename),
+                len(extra),
+                0,
+                0,
+                info.internal_attr,
+                info.external_attr,
+                header_offset,
+            )
+            + filename
+            + extra
+        )
+
+
+def _json_list(documents: Iterable[bytes], stop: threading.Event) -> Iterator[bytes]:
+    # Each document is on a separate line, wrapped in a list.  An empty list is written if
+    # there are no documents matching the query.
+    separator = b"\n"
+    yield b"["
+    for document in documents:
+        if stop.is_set():
+            # The export was abandoned, so the (incomplete) entry is never written.
+            return
+        yield separator
+        yield document
+        separator = b",\n"
+    yield b"]" if separator == b"\n" else b"\n]"
+
+
+def _export_documents(
+    q: query.MultiSearchQuery,
+    export_id: UUID,
+    high_level_type: str,
+    filename: str,
+    stop: threading.Event,
+) -> CompressedEntry:
+    with _connections, SessionLocal() as db:
+        documents = crud.get_documents_by_biosample_ids(
+            db,
+            export_id,
+            high_level_type,
+            include_superseded_workflow_executions=q.include_superseded_workflow_executions,
+        )
+        return compress_entry(f"{filename}.json", _json_list(documents, stop))
+
+
+def generate_metadata_zip(q: query.MultiSearchQuery) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive with a JSON list of the documents of each requested type.
+
+    Requested types missing from `DOCUMENT_TYPE_FILENAMES` are ignored.
+    """
+    high_level_types = [
+        type_ for type_ in dict.fromkeys(q.endpoints) if type_ in DOCUMENT_TYPE_FILENAMES
+    ]
+    # The biosamples are searched once, and their ids stay on the database server.
+    export_id = uuid4()
+    with _connections, SessionLocal() as db:
+        crud.store_export_biosample_ids(db, export_id, q.conditions)
+        db.commit()
+    try:
+        yield from _generate_entries(q, export_id, high_level_types)
+    finally:
+        with SessionLocal() as db:
+            crud.delete_export_biosample_ids(db, export_id)
+            db.commit()
+
+
+def _generate_entries(
+    q: query.MultiSearchQuery, export_id: UUID, high_level_types: List[str]
+) -> Iterator[bytes]:
+    stream = ZipStream()
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=settings.metadata_export_threads)
+    futures = [
+        executor.submit(
+            _export_documents,
+            q,
+            export_id,
+            high_level_type,
+            DOCUMENT_TYPE_FILENAMES[high_level_type],
+            stop,
+        )
+        for high_level_type in high_level_types
+    ]
+    try:
+        for future in as_completed(futures):
+            entry = future.result()
+            with entry.data:
+                yield from stream.write(entry)
+    finally:
+        # If the client went away, don't start the remaining types, and stop the running ones
+        # without waiting for them.
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+    yield stream.close()
+
+
+# The thread pool building the asynchronous exports.  Its threads are started by the first
+# export, so it is safe to import this module before the server forks its workers.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.metadata_export_jobs, thread_name_prefix="metadata-export"
+)
+
+
+# Each process that submits exports holds a session-level advisory lock on its own owner id,
+# on a connection kept open for the life of the process.  The lock is released when the
+# process exits (or loses its connection), which tells the other processes that the pending
+# and running exports it owned will never finish.
+_owner_lock = threading.Lock()
+_owner: Optional[Tuple[int, Connection]] = None
+
+
+def _get_owner() -> int:
+    global _owner
+    with _owner_lock:
+        if _owner is None:
+            owner = int.from_bytes(os.urandom(8), "big", signed=True)
+            connection = engine.connect()
+            connection.execute(select(func.pg_advisory_lock(owner)))
+            connection.commit()  # type: ignore[attr-defined]
+            _owner = owner, connection
+        return _owner[0]
+
+
+def _is_orphaned(db: Session, export: models.MetadataExport) -> bool:
+    """Return whether the process building a pending or running export is gone."""
+    if export.owner is None:
+        return True
+    # The lock is only free if its owner released it, and is released again when the
+    # transaction ends.
+    return db.execute(select(func.pg_try_advisory_xact_lock(export.owner))).scalar()
+
+
+def get_export(db: Session, export_id: UUID) -> Optional[models.MetadataExport]:
+    """Look up an export, marking it as failed if the process building it has exited."""
+    export = db.get(models.MetadataExport, export_id)  # type: ignore[attr-defined]
+    if (
+        export is not None
+        and export.status
+        in [models.MetadataExportStatus.pending, models.MetadataExportStatus.running]
+        and _is_orphaned(db, export)
+    ):
+        export.status = models.MetadataExportStatus.failed
+        db.commit()
+    return export
+
+
+def normalize_query(q: query.MultiSearchQuery) -> query.MultiSearchQuery:
+    """Return an equivalent query, with its conditions and document types in a fixed order."""
+    return query.MultiSearchQuery(
+        conditions=sorted(q.conditions, key=lambda condition: condition.model_dump_json()),
+        endpoints=sorted(set(q.endpoints) & DOCUMENT_TYPE_FILENAMES.keys()),
+        include_superseded_workflow_executions=q.include_superseded_workflow_executions,
+    )
+
+
+def get_archive_path(export: models.MetadataExport) -> Path:
+    return Path(settings.metadata_export_dir) / export.generation / f"{export.key}.zip"
+
+
+def submit_export(db: Session, q: query.MultiSearchQuery) -> models.MetadataExport:
+    """
+    Return an export of the query from the current ingest generation.
+
+    An export that is complete, or still in progress, is returned as is; otherwise a new
+    export is started in the background.
+    """
+    q = normalize_query(q)
+    key = hashlib.sha256(q.model_dump_json().encode()).hexdigest()
+    # Serialize the submissions of the same export (from any process) until this transaction
+    # ends, so that only one of them starts building the archive.
+    lock_id = hashlib.sha256(key.encode()).digest()[:8]
+    db.execute(select(func.pg_advisory_xact_lock(int.from_bytes(lock_id, signed=True))))
+    generation = _get_generation(db)
+    export = (
+        db.query(models.MetadataExport)
+        .filter(
+            models.MetadataExport.key == key,
+            models.MetadataExport.generation == generation,
+            models.MetadataExport.status != models.MetadataExportStatus.failed,
+        )
+        .order_by(models.MetadataExport.created.desc())
+        .first()
+    )
+    if export is not None:
+        if export.status == models.MetadataExportStatus.complete:
+            if get_archive_path(export).exists():
+                return export
+        elif _is_orphaned(db, export):
+            export.status = models.MetadataExportStatus.failed
+        elif export.created > datetime.now(UTC) - timedelta(
+            seconds=settings.metadata_export_timeout
+        ):
+            return export
+
+    export = models.MetadataExport(
+        key=key, generation=generation, search=q.model_dump(mode="json"), owner=_get_owner()
+    )
+    db.add(export)
+    db.commit()
+    _executor.submit(_run_export, export.id)  # type: ignore[arg-type]
+    return export
+
+
+def _get_generation(db: Session) -> str:
+    # Unlike `current_generation`, this isn't cached, so a re-ingest is noticed right away.
+    return db.query(models.IngestGeneration.generation).scalar() or "none"
+
+
+def _remove_previous_archives(generation: str) -> None:
+    """Remove the archives of generations other than `generation`, which are never served
+    again.  Partial archives are left to the exports writing them."""
+    for directory in Path(settings.metadata_export_dir).iterdir():
+        if directory.is_dir() and directory.name != generation:
+            for archive in directory.glob("*.zip"):
+                archive.unlink(missing_ok=True)
+            with suppress(OSError):
+                directory.rmdir()
+
+
+def _run_export(export_id: UUID) -> None:
+    with SessionLocal() as db:
+        export = db.get(models.MetadataExport, export_id)
+        if export is None:
+            return
+        export.status = models.MetadataExportStatus.running
+        db.commit()
+
+        path = get_archive_path(export)
+        partial_path = path.with_name(f"{export.id}.partial")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(partial_path, "wb") as archive:
+                for chunk in generate_metadata_zip(query.MultiSearchQuery(**export.search)):
+                    archive.write(chunk)
+            # The documents were read from the live database, which may have been re-ingested
+            # since the export was submitted.
+            if _get_generation(db) != export.generation:
+                raise RuntimeError("The database was re-ingested during the export")
+            os.replace(partial_path, path)
+        except Exception:
+            logger.exception(f"Metadata export {export.id} failed")
+            partial_path.unlink(missing_ok=True)
+            export.status = models.MetadataExportStatus.failed
+            db.commit()
+            return
+
+        export.status = models.MetadataExportStatus.complete
+        export.completed = datetime.now(UTC)
+        export.size = path.stat().st_size
+        db.commit()
+        _remove_previous_archives(_get_generation(db))
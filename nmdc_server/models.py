@@ -598,6 +598,9 @@ Biosample.__ts_vector__ = func.nmdc_biosample_fts(
     Biosample.alternate_identifiers,
 )
 
+# The order of biosample search results, which cursor pagination seeks into.
+Index("ix_biosample_multiomics_id", Biosample.multiomics.desc(), Biosample.id)
+
 
 class BiosampleRelatedDocument(Base):
     """
@@ -632,11 +635,6 @@ class BiosampleRelatedDocument(Base):
     )
 
 
-Index(
-    "ix_biosample_related_document_biosample_ids",
-    BiosampleRelatedDocument.biosample_ids,
-    postgresql_using="gin",
-)
 Index(
     "ix_biosample_related_document_high_level_type",
     BiosampleRelatedDocument.high_level_type,
@@ -652,6 +650,34 @@ Index(
 )
 
 
+class DocumentBiosample(Base):
+    """
+    The biosamples that each `BiosampleRelatedDocument` is related to, one row per pair.
+
+    This is the normalized form of `BiosampleRelatedDocument.biosample_ids`, built at ingest.
+    It is used to find the documents related to a set of biosamples (and vice versa) with
+    b-tree index lookups and joins.
+    """
+
+    __tablename__ = "document_biosample"
+
+    document_id = Column(
+        String, ForeignKey(BiosampleRelatedDocument.id, ondelete="CASCADE"), primary_key=True
+    )
+    biosample_id = Column(String, primary_key=True)
+    high_level_type = Column(
+        String, nullable=False, comment="Copy of the document's `high_level_type`"
+    )
+
+
+Index(
+    "ix_document_biosample_biosample_id",
+    DocumentBiosample.biosample_id,
+    DocumentBiosample.high_level_type,
+    postgresql_include=["document_id"],
+)
+
+
 omics_processing_output_association = output_association("omics_processing")
 
 
@@ -1096,6 +1122,10 @@ class DataObject(Base):
         back_populates="outputs",
     )  # type: ignore
 
+    # Whether the data object matches the data object filter of a biosample search.
+    # See `data_object_selected` in `query.py`.
+    selected = query_expression()
+
     @property
     def was_generated_by(self) -> Optional["PipelineStep"]:
         """
@@ -1122,9 +1152,8 @@ class DataObject(Base):
 
     @hybrid_property
     def downloads(self) -> int:
-        # TODO: This can probably be done with a more efficient aggregation
         if self._download_count is None:
-            return len(self.download_entities) + len(self.bulk_download_entities)
+            return self.download_count.count if self.download_count else 0
         return self._download_count
 
 
@@ -1175,6 +1204,17 @@ class IngestLock(Base):
     started = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC))
 
 
+# Identifies the ingest that populated the database.  A new generation is recorded at the end
+# of every ingest, so in-process caches built from ingested data can tell when they are stale.
+class IngestGeneration(Base):
+    __tablename__ = "ingest_generation"
+    __table_args__ = (CheckConstraint("id", name="singleton"),)
+
+    id = Column(Boolean, primary_key=True, default=True)
+    generation = Column(String, nullable=False, default=lambda: uuid4().hex)
+    created = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC))
+
+
 ModelType = Union[
     Type[Study],
     Type[OmicsProcessing],
@@ -1255,6 +1295,67 @@ class MetaTGeneFunctionAggregation(Base):
     count = Column(BigInteger, nullable=False)
 
 
+# The gene functions found in each biosample by any metagenome, metaproteome or metatranscriptome
+# annotation.  This is denormalized from the gene function aggregation tables at the end of
+# ingest, so that gene function searches on biosamples are a single index lookup instead of a
+# union of joins through omics processing and workflow executions.
+class BiosampleGeneFunction(Base):
+    __tablename__ = "biosample_gene_function"
+
+    gene_function_id = Column(String, ForeignKey(GeneFunction.id), primary_key=True)
+    biosample_id = Column(String, ForeignKey("biosample.id"), primary_key=True, index=True)
+    omics_source = Column(String, primary_key=True)
+
+
+# The serialized search result of each biosample, including its omics processing, workflow
+# executions and data objects.  This is generated at the end of ingest so that search pages
+# can be returned without loading all of those relationships.
+class BiosampleCard(Base):
+    __tablename__ = "biosample_card"
+
+    biosample_id = Column(String, ForeignKey("biosample.id"), primary_key=True)
+    card = Column(JSONB, nullable=False)
+
+
+# The responses of the database summary endpoints.  These only change at ingest, so they
+# are computed once at the end of ingest and served as they are.
+class SummaryPayload(Base):
+    __tablename__ = "summary_payload"
+
+    name = Column(String, primary_key=True)
+    payload = Column(JSONB, nullable=False)
+
+
+# The number of biosamples having each combination of GOLD ecosystem classification and
+# coordinates.  This is computed at the end of ingest so that the unfiltered Sankey and
+# geospatial aggregations don't need to group every biosample.
+class EnvironmentRollup(Base):
+    __tablename__ = "environment_rollup"
+
+    id = Column(Integer, primary_key=True)
+    ecosystem = Column(String, nullable=True)
+    ecosystem_category = Column(String, nullable=True)
+    ecosystem_type = Column(String, nullable=True)
+    ecosystem_subtype = Column(String, nullable=True)
+    specific_ecosystem = Column(String, nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    count = Column(Integer, nullable=False)
+
+
+# The unfiltered range of each numeric and date attribute of the tables supporting binned
+# facets.  This is computed at the end of ingest so that histograms without search
+# conditions don't need to scan the table for their bounds.  Values are stored as JSON
+# (dates as ISO strings) because the attributes have different types.
+class AttributeRange(Base):
+    __tablename__ = "attribute_range"
+
+    table = Column(String, primary_key=True)
+    attribute = Column(String, primary_key=True)
+    minimum = Column(JSONB, nullable=True)
+    maximum = Column(JSONB, nullable=True)
+
+
 # Used to store a reference to a user requested zip download.  This is stored
 # in a table primarily to avoid a large query string in the zip download GET
 # endpoint. Since the GET endpoint cannot be protected by Bearer token auth,
@@ -1316,6 +1417,66 @@ class BulkDownloadDataObject(Base):
 Index("bulk_download_data_object_id_idx", BulkDownloadDataObject.data_object_id)
 
 
+# The number of file and bulk downloads of each data object.  This is incremented in the
+# same transaction as the downloads are recorded, and rebuilt after the download history
+# is merged during ingest.
+class DataObjectDownloadCount(Base):
+    __tablename__ = "data_object_download_count"
+
+    data_object_id = Column(String, ForeignKey(DataObject.id), primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+
+    data_object = relationship(
+        DataObject, backref=backref("download_count", uselist=False, cascade_backrefs=False)
+    )
+
+
+class MetadataExportStatus(str, enum.Enum):
+    pending = "pending"
+    running = "running"
+    complete = "complete"
+    failed = "failed"
+
+
+# An asynchronous metadata export (see `nmdc_server.metadata_export`).  Its archive is reused
+# by later exports of the same (normalized) query, identified by `key`, until the next ingest.
+class MetadataExport(Base):
+    __tablename__ = "metadata_export"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    created = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(UTC))
+    completed = Column(DateTime(timezone=True), nullable=True)
+
+    # a hash of the normalized query, and the ingest generation it was exported from
+    key = Column(String, nullable=False)
+    generation = Column(String, nullable=False)
+
+    # the normalized `MultiSearchQuery`
+    search = Column(JSONB, nullable=False)
+
+    status = Column(
+        Enum(MetadataExportStatus), nullable=False, default=MetadataExportStatus.pending
+    )
+    # the size of the archive in bytes
+    size = Column(BigInteger, nullable=True)
+    # the advisory lock held by the process building the export while it is alive
+    owner = Column(BigInteger, nullable=True)
+
+
+Index("ix_metadata_export_key", MetadataExport.key, MetadataExport.generation)
+
+
+# The biosamples selected by the search of a metadata export in progress (see
+# `nmdc_server.metadata_export`).  The search runs once per export, and the query of each
+# exported document type joins against its rows, which are deleted when the export ends.
+class MetadataExportBiosample(Base):
+    __tablename__ = "metadata_export_biosample"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    export_id = Column(UUID(as_uuid=True), primary_key=True)
+    biosample_id = Column(String, primary_key=True)
+
+
 class EnvoTree(Base):
     __tablename__ = "envo_tree"
 
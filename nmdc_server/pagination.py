@@ -1,14 +1,116 @@
-from typing import Any, Dict, List, TypedDict
+import base64
+import json
+from enum import Enum
+from typing import Any, Dict, Hashable, List, Optional, Tuple, TypedDict
 
-from fastapi import Query, Request, Response
-from sqlalchemy import orm
+from fastapi import HTTPException, Query, Request, Response, status
+from sqlalchemy import and_, or_, orm
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from nmdc_server.cache import LRUCache
+from nmdc_server.config import settings
+from nmdc_server.ingest.generation import current_generation
+
+# Counts of search queries over ingested data, keyed by the generation of the data and the
+# compiled query.
+count_cache: LRUCache[int] = LRUCache(settings.count_cache_size)
+
+
+class CountMode(Enum):
+    exact = "exact"
+    estimate = "estimate"
+
+
+# The columns a query is ordered by, as (column, descending) pairs.  The columns must
+# identify a row uniquely for cursor pagination to be stable.
+SortKey = List[Tuple[Any, bool]]
+
+
+def sort_order(sort_key: SortKey) -> List[Any]:
+    """Return the order by clauses of a sort key."""
+    return [column.desc() if descending else column for column, descending in sort_key]
+
+
+def keyset_filter(sort_key: SortKey, values: List[Any]) -> ClauseElement:
+    """Generate a clause matching the rows after the given sort key values.
+
+    The first column is bounded by a plain range, which an index on the sort key can seek
+    to, and the remaining columns break the ties within it.  (A row comparison can't be used
+    because the columns may be sorted in different directions.)
+    """
+    first, descending = sort_key[0]
+    bound = first <= values[0] if descending else first >= values[0]
+    clauses = []
+    for index, (column, descending) in enumerate(sort_key):
+        previous = [c == v for (c, _), v in zip(sort_key[:index], values)]
+        after = column < values[index] if descending else column > values[index]
+        clauses.append(and_(*previous, after))
+    return and_(bound, or_(*clauses))
+
+
+def encode_cursor(values: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _is_valid_cursor_value(column: Any, value: Any) -> bool:
+    python_type = column.type.python_type
+    # JSON booleans decode to `bool`, which is a subclass of `int`.
+    return isinstance(value, python_type) and not (
+        isinstance(value, bool) and python_type is not bool
+    )
+
+
+def decode_cursor(cursor: str, sort_key: SortKey) -> List[Any]:
+    """Decode a cursor, checking that it holds one value of the right type per sort column."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        values = None
+    if (
+        not isinstance(values, list)
+        or len(values) != len(sort_key)
+        or not all(
+            _is_valid_cursor_value(column, value) for (column, _), value in zip(sort_key, values)
+        )
+    ):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
 
 
 class PaginatedResponse(TypedDict):
     count: int
+    count_exact: bool
     results: List[Dict[str, Any]]
 
 
+def _count_key(query: orm.Query) -> Hashable:
+    compiled = query.statement.compile(dialect=query.session.get_bind().dialect)
+    return str(compiled), repr(sorted(compiled.params.items()))
+
+
+class _Explain(Executable, ClauseElement):
+    """An `EXPLAIN (FORMAT JSON)` of a statement, whose parameters are bound as usual."""
+
+    inherit_cache = False
+
+    def __init__(self, statement: ClauseElement):
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element: _Explain, compiler, **kwargs) -> str:
+    return f"EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kwargs)}"
+
+
+def estimate_count(query: orm.Query) -> int:
+    """Return the planner's estimate of the number of rows returned by a query."""
+    plan = query.session.execute(_Explain(query.statement)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
 class Pagination:
     """
     This class is responsible for generating paged responses from sqlalchemy queries.
@@ -23,20 +125,54 @@ class Pagination:
         response: Response,
         offset: int = Query(default=DEFAULT_OFFSET, ge=0),
         limit: int = Query(default=DEFAULT_LIMIT, ge=1),
+        after: Optional[str] = Query(
+            default=None,
+            description=(
+                "Return the page following a cursor, as given by the `next` link of the "
+                "previous page.  An empty value starts from the first page.  Only supported "
+                "by some endpoints; `offset` is ignored when given."
+            ),
+        ),
+        count: CountMode = Query(
+            default=CountMode.exact,
+            description=(
+                "Use `estimate` to report the query planner's estimate of the number of "
+                "results when it is large, instead of counting them exactly."
+            ),
+        ),
     ):
         self._request = request
         self._response = response
         self.offset = offset
         self.limit = limit
+        self.after = after
+        self.count_mode = count
 
-    def paginate(self, query: orm.Query, count: int) -> orm.Query:
+    def paginate(
+        self, query: orm.Query, count: int, sort_key: Optional[SortKey] = None
+    ) -> orm.Query:
+        if sort_key is not None and self.after is not None:
+            # Seek past the last row of the previous page instead of counting rows up to it.
+            if self.after:
+                query = query.filter(keyset_filter(sort_key, decode_cursor(self.after, sort_key)))
+            return query.limit(self.limit)
         return query.limit(self.limit).offset(self.offset)
 
-    def headers(self, query: orm.Query, count: int) -> Dict[str, str]:
+    def headers(
+        self,
+        query: orm.Query,
+        count: int,
+        sort_key: Optional[SortKey] = None,
+        next_cursor: Optional[str] = None,
+    ) -> Dict[str, str]:
         """Generate pagination link headers.
 
+        In cursor mode, only the `first` and `next` links are generated.
+
         https://datatracker.ietf.org/doc/html/rfc5988
         """
+        if sort_key is not None and self.after is not None:
+            return self._cursor_headers(count, next_cursor)
 
         def url(name: str, offset: int) -> str:
             return (
@@ -63,15 +199,76 @@ class Pagination:
             "Resource-Count": str(count),
         }
 
-    def response(self, query: orm.Query, processor=lambda x: x) -> PaginatedResponse:
+    def _cursor_headers(self, count: int, next_cursor: Optional[str]) -> Dict[str, str]:
+        url = self._request.url.remove_query_params(["offset", "after"])
+        links = [f'<{url.include_query_params(limit=self.limit, after="")}>; rel="first"']
+        if next_cursor is not None:
+            next = url.include_query_params(limit=self.limit, after=next_cursor)
+            links.append(f'<{next}>; rel="next"')
+        return {
+            "Links": ", ".join(links),
+            "Resource-Count": str(count),
+        }
+
+    def count(self, query: orm.Query, cache: bool = False) -> Tuple[int, bool]:
+        """Count the results of a query, returning the count and whether it is exact.
+
+        Counts can be cached for queries of ingested data, which only change when the
+        database is re-ingested.
+        """
+        if self.count_mode == CountMode.estimate:
+            estimate = estimate_count(query)
+            if estimate >= settings.count_estimate_threshold:
+                return estimate, False
+
+        generation = current_generation(query.session) if cache else None
+        if generation is None:
+            return query.count(), True
+        key = (generation, _count_key(query))
+        return count_cache.get_or_create(key, query.count), True
+
+    def _cursor_count(self, query: orm.Query, cache: bool) -> Tuple[int, bool]:
+        """Return the count of a query for the pages following the first cursor page.
+
+        These pages don't count the results again: they report the count cached by the first
+        page, or else the query planner's estimate.
+        """
+        generation = current_generation(query.session) if cache else None
+        if generation is not None:
+            count = count_cache.get((generation, _count_key(query)))
+            if count is not None:
+                return count, True
+        return estimate_count(query), False
+
+    def response(
+        self,
+        query: orm.Query,
+        processor=lambda x: x,
+        sort_key: Optional[SortKey] = None,
+        cache_count: bool = False,
+    ) -> PaginatedResponse:
         """Serialize a paged response from a query.
 
         Optionally, pass in a function to perform extra processing on each item
-        prior to serialization.
+        prior to serialization.  Queries ordered by a `sort_key` also support cursor
+        pagination with the `after` parameter, whose pages after the first one
+        don't count the results again.  Pass `cache_count` for queries of ingested data to
+        reuse their counts across pages.
         """
-        count = query.count()
-        self._response.headers.update(self.headers(query, count))
+        if sort_key is not None and self.after:
+            count, count_exact = self._cursor_count(query, cache_count)
+        else:
+            count, count_exact = self.count(query, cache_count)
+        results = self.paginate(query, count, sort_key).all()
+        next_cursor = None
+        if sort_key is not None and self.after is not None and len(results) == self.limit:
+            last = results[-1]
+            next_cursor = encode_cursor([getattr(last, column.key) for column, _ in sort_key])
+        self._response.headers.update(self.headers(query, count, sort_key, next_cursor))
+        if not count_exact:
+            self._response.headers["Resource-Count-Estimated"] = "true"
         return {
-            "results": [processor(x) for x in self.paginate(query, count)],
+            "results": [processor(x) for x in results],
             "count": count,
+            "count_exact": count_exact,
         }
@@ -3,15 +3,21 @@ This module contains schemas that turn the query DSL into sqlalchemy query objec
 for both search and faceting aggregations.
 """
 
+import operator
 import re
+from contextvars import ContextVar
 from datetime import datetime
 from enum import Enum
+from functools import partial
 from itertools import groupby
 from typing import (
     Annotated,
     Any,
+    Callable,
+    ClassVar,
     Dict,
     Generic,
+    Hashable,
     Iterator,
     List,
     Literal,
@@ -22,18 +28,40 @@ from typing import (
     Union,
 )
 
-from pydantic import BaseModel, ConfigDict, Field, PositiveInt
-from sqlalchemy import ARRAY, Column, and_, cast, func, inspect, or_, select
+from pydantic import BaseModel, ConfigDict, Field, PositiveInt, PrivateAttr
+from sqlalchemy import (
+    ARRAY,
+    String,
+    and_,
+    any_,
+    bindparam,
+    case,
+    cast,
+    false,
+    func,
+    inspect,
+    literal,
+    null,
+    or_,
+    select,
+    true,
+)
 from sqlalchemy.orm import Query, Session, aliased, selectinload, with_expression
 from sqlalchemy.orm.util import AliasedClass
+from sqlalchemy.sql import operators
 from sqlalchemy.sql.expression import ClauseElement, intersect, union, union_all
-from sqlalchemy.sql.selectable import CTE
+from sqlalchemy.sql.selectable import CTE, FromClause
 
 from nmdc_server import binning, models, schemas
 from nmdc_server.binning import DateBinResolution
+from nmdc_server.cache import LRUCache
+from nmdc_server.config import settings
 from nmdc_server.data_object_filters import DataObjectFilter
-from nmdc_server.filters import create_filter_class
+from nmdc_server.filters import GeneFunctionFilter, create_filter_class
+from nmdc_server.gene_function_index import GeneFunctionMapping, get_gene_function_index
+from nmdc_server.ingest import attribute_range, biosample_gene_function
 from nmdc_server.multiomics import MultiomicsValue
+from nmdc_server.pagination import SortKey, sort_order
 from nmdc_server.table import (
     CogTerms,
     EnvBroadScaleAncestor,
@@ -62,6 +90,10 @@ class InvalidFacetException(Exception):
     pass
 
 
+def _join_nothing(query: Query) -> Query:
+    return query
+
+
 def _join_envo_facet(query: Query, attribute: str) -> Query:
     if attribute == "env_broad_scale":
         return query.join(
@@ -93,6 +125,17 @@ class Operation(Enum):
     like = "like"
 
 
+_column_operators = {
+    Operation.equal: operator.eq,
+    Operation.greater: operator.gt,
+    Operation.greater_equal: operator.ge,
+    Operation.less: operator.lt,
+    Operation.less_equal: operator.le,
+    Operation.not_equal: operator.ne,
+    Operation.like: operators.ilike_op,
+}
+
+
 # These dicts serve to provide special logic when filter conditions
 # reference them.  They are not simple queries on attributes of the
 # provided table.
@@ -202,6 +245,11 @@ class BaseConditionSchema(BaseModel):
     value: ConditionValue
     table: Table
 
+    # When a condition is compiled as part of a cached query plan, its values are
+    # rendered as named bind parameters using this prefix so that the plan can be
+    # reused with different values.
+    _param_prefix: Optional[str] = PrivateAttr(default=None)
+
     # Determines whether the field of this query condition is a column
     # on the table or not.  For fields that are not, the query is generally
     # passed on to the "annotations" jsonb field for models that have it.
@@ -221,6 +269,31 @@ class BaseConditionSchema(BaseModel):
         """Provide a unique key for grouping conditions on one field together."""
         return f"{self.table}:{self.field}"
 
+    @property
+    def shape(self) -> Hashable:
+        """Provide a key describing the structure of the condition, but not its value."""
+        return (self.__class__.__name__, self.key, str(self.op), type(self.value).__name__)
+
+    def bind_values(self) -> Dict[str, Any]:
+        """Return the values of the named bind parameters rendered by `compare`."""
+        return {}
+
+    def _bind(self, name: str, value: Any, column: Any = None, op: Any = None) -> Any:
+        """Render a value as a named bind parameter if this condition is part of a plan.
+
+        When a column and operator are given, the bind parameter is typed the same way
+        sqlalchemy would type a literal value compared against the column.
+        """
+        if self._param_prefix is None or value is None:
+            return value
+        type_ = None
+        if column is not None and hasattr(column, "type"):
+            type_ = column.type.coerce_compared_value(op, value)
+        return bindparam(self._param_name(name), value, type_=type_)
+
+    def _param_name(self, name: str) -> str:
+        return f"{self._param_prefix}_{name}"
+
     # This method originally existed because the "table" attribute was optional.  It
     # now serves to replace the table attribute for "special" fields.  For example,
     # the API uses the `biosample` table for `env_medium`, where the property actually
@@ -229,12 +302,13 @@ class BaseConditionSchema(BaseModel):
     def from_schema(
         cls, condition: "BaseConditionSchema", default_table: Table
     ) -> "BaseConditionSchema":
-        kwargs = condition.dict()
+        # The condition has already been validated, so avoid validating it a second time.
+        update: Dict[str, Any] = {}
         if condition.field in _special_keys:
-            kwargs["table"], kwargs["field"] = _special_keys[condition.field]
+            update["table"], update["field"] = _special_keys[condition.field]
         elif not condition.table:
-            kwargs["table"] = default_table
-        return cls(**kwargs)
+            update["table"] = default_table
+        return condition.model_copy(update=update)
 
 
 # This condition type represents the original DSL for comparisons.  It
@@ -246,33 +320,43 @@ class SimpleConditionSchema(BaseConditionSchema):
     value: schemas.AnnotationValue
     table: Table
 
+    @property
+    def compared_value(self) -> schemas.AnnotationValue:
+        if self.op == Operation.like:
+            return f"%{self.value}%"
+        return self.value
+
+    def bind_values(self) -> Dict[str, Any]:
+        if self._param_prefix is None or self.value is None:
+            return {}
+        return {self._param_name("value"): self.compared_value}
+
     def compare(self) -> ClauseElement:
         model = self.table.model
         if self.is_column():
             column = getattr(model, self.field)
+            value = self._bind("value", self.compared_value, column, _column_operators[self.op])
             if self.op == Operation.equal:
-                return column == self.value
+                return column == value
             elif self.op == Operation.greater:
-                return column > self.value
+                return column > value
             elif self.op == Operation.greater_equal:
-                return column >= self.value
+                return column >= value
             elif self.op == Operation.less:
-                return column < self.value
+                return column < value
             elif self.op == Operation.less_equal:
-                return column <= self.value
+                return column <= value
             elif self.op == Operation.not_equal:
-                return column != self.value
+                return column != value
             elif self.op == Operation.like:
-                return column.ilike(f"%{self.value}%")
+                return column.ilike(value)
         if hasattr(model, "annotations"):
             json_field = model.annotations
         else:
             raise InvalidAttributeException(self.table.value, self.field)
-        if self.op == Operation.like:
-            return func.nmdc_compare(
-                json_field[self.field].astext, self.op.value, f"%{self.value}%"
-            )
-        return func.nmdc_compare(json_field[self.field].astext, self.op.value, self.value)
+        return func.nmdc_compare(
+            json_field[self.field].astext, self.op.value, self._bind("value", self.compared_value)
+        )
 
 
 # A range query that can't be achieved with simple conditions (because they are "or"-ed together).
@@ -282,15 +366,40 @@ class RangeConditionSchema(BaseConditionSchema):
     value: RangeValue
     table: Table
 
+    @property
+    def shape(self) -> Hashable:
+        return (
+            self.__class__.__name__,
+            self.key,
+            self.op,
+            tuple(type(v).__name__ for v in self.value),
+        )
+
+    def bind_values(self) -> Dict[str, Any]:
+        if self._param_prefix is None:
+            return {}
+        return {
+            self._param_name(name): value
+            for name, value in zip(["min", "max"], self.value)
+            if value is not None
+        }
+
     def compare(self) -> ClauseElement:
         model = self.table.model
         if self.is_column():
             column = getattr(model, self.field)
-            return and_(column >= self.value[0], column <= self.value[1])
+            return and_(
+                column >= self._bind("min", self.value[0], column, operator.ge),
+                column <= self._bind("max", self.value[1], column, operator.le),
+            )
         if hasattr(model, "annotations"):
             return and_(
-                func.nmdc_compare(model.annotations[self.field].astext, ">=", self.value[0]),
-                func.nmdc_compare(model.annotations[self.field].astext, "<=", self.value[1]),
+                func.nmdc_compare(
+                    model.annotations[self.field].astext, ">=", self._bind("min", self.value[0])
+                ),
+                func.nmdc_compare(
+                    model.annotations[self.field].astext, "<=", self._bind("max", self.value[1])
+                ),
             )
         else:
             raise InvalidAttributeException(self.table.value, self.field)
@@ -303,6 +412,16 @@ class GoldConditionSchema(BaseConditionSchema):
     field: Literal["gold_tree"]
     op: Literal["tree"]
 
+    # Gold trees change the structure of the generated clause, so the values are part
+    # of the shape.
+    @property
+    def shape(self) -> Hashable:
+        return (
+            self.__class__.__name__,
+            self.key,
+            tuple(tuple(sorted(v.model_dump().items())) for v in self.value),
+        )
+
     def compare(self) -> ClauseElement:
         or_args = []
         for gold_tree in self.value:
@@ -323,6 +442,10 @@ class MultiomicsConditionSchema(BaseConditionSchema):
     field: Literal["multiomics"]
     op: Literal["has"]
 
+    @property
+    def shape(self) -> Hashable:
+        return (self.__class__.__name__, self.key, self.value)
+
     def compare(self) -> ClauseElement:
         and_args = [True]
         for omics in MultiomicsValue:
@@ -331,6 +454,65 @@ class MultiomicsConditionSchema(BaseConditionSchema):
         return and_(*and_args)
 
 
+# An internal condition type matching any of a list of values.  Groups of many equality
+# conditions on the same column (e.g. the KO terms of a KEGG pathway) are collapsed into
+# one of these, so that they are compared against a single array parameter instead of
+# generating a long chain of OR-ed comparisons.
+class ArrayConditionSchema(BaseConditionSchema):
+    table: Table
+    value: List[Any]
+    field: str
+    op: Literal["any"] = "any"
+
+    # The number of values doesn't change the generated clause.
+    @property
+    def shape(self) -> Hashable:
+        return (self.__class__.__name__, self.key, type(self.value[0]).__name__)
+
+    def bind_values(self) -> Dict[str, Any]:
+        if self._param_prefix is None:
+            return {}
+        return {self._param_name("values"): self.value}
+
+    def compare(self) -> ClauseElement:
+        column = getattr(self.table.model, self.field)
+        if self._param_prefix is None:
+            values = bindparam("values", self.value, type_=ARRAY(column.type), unique=True)
+        else:
+            values = bindparam(self._param_name("values"), self.value, type_=ARRAY(column.type))
+        return column == any_(values)
+
+
+# The minimum number of equality conditions on a column collapsed into an ArrayConditionSchema.
+_ARRAY_CONDITION_MIN_SIZE = 4
+
+
+def _collapse_equality_conditions(
+    conditions: List[BaseConditionSchema],
+) -> List[BaseConditionSchema]:
+    """Replace equality conditions on a column with a single ArrayConditionSchema."""
+    equality_conditions = [
+        c
+        for c in conditions
+        if isinstance(c, SimpleConditionSchema)
+        and c.op == Operation.equal
+        and isinstance(c.value, (str, int))
+        and c.is_column()
+        and hasattr(getattr(c.table.model, c.field), "type")
+    ]
+    value_types = {type(c.value) for c in equality_conditions}
+    if len(equality_conditions) < _ARRAY_CONDITION_MIN_SIZE or len(value_types) != 1:
+        return conditions
+    condition = equality_conditions[0]
+    array_condition = ArrayConditionSchema(
+        table=condition.table,
+        field=condition.field,
+        value=list(dict.fromkeys(c.value for c in equality_conditions)),
+    )
+    collapsed = {id(c) for c in equality_conditions}
+    return [array_condition, *[c for c in conditions if id(c) not in collapsed]]
+
+
 # A special condition type for full-text search.  Unlike other conditions, this does not
 # map to a specific column or table — it triggers a tsvector search across a pre-defined
 # set of fields in BaseQuerySchema subclasses that override _fts_subquery.
@@ -350,14 +532,90 @@ ConditionSchema = Union[
 ]
 
 
-def _transform_gene_term(term: tuple[str, Any]) -> str:
-    if term[0].startswith("KO:K"):
-        return term[0].replace("KO:K", KeggTerms.ORTHOLOGY[0])
-    if term[0].startswith("COG"):
-        return term[0].replace("COG", "COG:COG")
-    if term[0].startswith("PF"):
-        return term[0].replace("PF", "PFAM:PF")
-    return term[0]
+def _transform_gene_term(term: str) -> str:
+    if term.startswith("KO:K"):
+        return term.replace("KO:K", KeggTerms.ORTHOLOGY[0])
+    if term.startswith("COG"):
+        return term.replace("COG", "COG:COG")
+    if term.startswith("PF"):
+        return term.replace("PF", "PFAM:PF")
+    return term
+
+
+class QueryPlanner(Enum):
+    """Strategies for combining the condition groups of a search into a single query.
+
+    `intersect` generates one subquery per condition group and intersects them.  `merged`
+    applies every group whose filter table joins to the target table through many-to-one
+    relationships in a single WHERE clause, and only intersects the remaining groups.
+    """
+
+    intersect = "intersect"
+    merged = "merged"
+
+
+# The planner used for the current request.  This is a context variable so that it can
+# be selected per request without passing it through every nested query schema.
+query_planner: ContextVar[QueryPlanner] = ContextVar(
+    "query_planner", default=QueryPlanner(settings.query_planner)
+)
+
+# Filter tables that join to a target table only through many-to-one relationships.  Each
+# list is ordered so that the join path of a table extends the join path of the previous one.
+_many_to_one_filter_tables: Dict[Table, List[Table]] = {
+    Table.biosample: [Table.study, Table.principal_investigator],
+    Table.omics_processing: [Table.study, Table.principal_investigator],
+    Table.study: [Table.principal_investigator],
+}
+
+_gene_function_tables = {
+    Table.gene_function,
+    Table.kegg_function,
+    Table.go_function,
+    Table.pfam_function,
+    Table.cog_function,
+}
+
+_related_gene_function_tables = [Table.metap_gene_function, Table.metat_gene_function]
+
+# Operations on gene function id's that can be resolved from the biosample_gene_function table.
+_gene_function_presence_ops = {Operation.equal, "any"}
+
+
+def _related_gene_function_conditions(
+    table: Table, conditions: List[BaseConditionSchema]
+) -> List[BaseConditionSchema]:
+    """Copy gene function conditions onto the metaP or metaT gene function table."""
+    related_conditions: List[BaseConditionSchema] = []
+    for c in conditions:
+        related: BaseConditionSchema
+        if isinstance(c, ArrayConditionSchema):
+            related = ArrayConditionSchema(table=table, field=c.field, value=c.value)
+        else:
+            related = SimpleConditionSchema(table=table, field=c.field, value=c.value)
+        if c._param_prefix is not None:
+            related._param_prefix = f"{c._param_prefix}_{table.value}"
+        related_conditions.append(related)
+    return related_conditions
+
+
+def _bind_values(groups: List[Tuple[Table, List[BaseConditionSchema]]]) -> Dict[str, Any]:
+    """Collect the bind parameter values of all conditions in a query plan."""
+    values: Dict[str, Any] = {}
+    for table, conditions in groups:
+        related_conditions: List[BaseConditionSchema] = []
+        if table in _gene_function_tables:
+            for related_table in _related_gene_function_tables:
+                related_conditions += _related_gene_function_conditions(related_table, conditions)
+        for condition in [*conditions, *related_conditions]:
+            values.update(condition.bind_values())
+    return values
+
+
+# Query plans (the intersection of the per-field subqueries generated by BaseQuerySchema.query)
+# keyed on the target table and the shape of the conditions.  The values of the conditions are
+# rendered as named bind parameters, so a plan can be reused for any query with the same shape.
+query_plan_cache: LRUCache[FromClause] = LRUCache(settings.query_plan_cache_size)
 
 
 # This is the base class for all table specific queries.  It is responsible for performing
@@ -393,7 +651,6 @@ class BaseQuerySchema(BaseModel):
 
     def transform_condition(self, db, condition: BaseConditionSchema) -> List[BaseConditionSchema]:
         # Transform KEGG.(PATH|MODULE) queries into their respective ORTHOLOGY terms
-        gene_terms = []
         gene_search_keys = [
             "Table.kegg_function:id",
             "Table.cog_function:id",
@@ -421,136 +678,192 @@ class BaseQuerySchema(BaseModel):
         if condition.key in gene_search_keys and type(condition.value) is str:
             if any([condition.value.startswith(val) for val in KeggTerms.PATHWAY[0]]):
                 prefix = [val for val in KeggTerms.PATHWAY[0] if condition.value.startswith(val)][0]
+                mapping = GeneFunctionMapping.kegg_pathway
                 searchable_name = condition.value.replace(prefix, KeggTerms.PATHWAY[1])
-                gene_terms = db.query(models.KoTermToPathway.term).filter(
-                    models.KoTermToPathway.pathway.ilike(searchable_name)
-                )
             elif condition.value.startswith(KeggTerms.MODULE[0]):
+                mapping = GeneFunctionMapping.kegg_module
                 searchable_name = condition.value.replace(KeggTerms.MODULE[0], KeggTerms.MODULE[1])
-                gene_terms = db.query(models.KoTermToModule.term).filter(
-                    models.KoTermToModule.module.ilike(searchable_name)
-                )
             # Check for searches on cog or pfam as well
             elif condition.value.startswith(CogTerms.FUNCTION):
+                mapping = GeneFunctionMapping.cog_function
                 searchable_name = condition.value.replace(CogTerms.FUNCTION, "")
-                gene_terms = db.query(models.CogTermToFunction.term).filter(
-                    models.CogTermToFunction.function.ilike(searchable_name)
-                )
             elif condition.value.startswith(CogTerms.PATHWAY):
+                mapping = GeneFunctionMapping.cog_pathway
                 searchable_name = condition.value.replace(CogTerms.PATHWAY, "")
-                gene_terms = db.query(models.CogTermToPathway.term).filter(
-                    models.CogTermToPathway.pathway.ilike(searchable_name)
-                )
             elif condition.value.startswith(PfamEntries.CLAN):
+                mapping = GeneFunctionMapping.pfam_clan
                 searchable_name = condition.value.replace(PfamEntries.CLAN, "")
-                gene_terms = db.query(models.PfamEntryToClan.entry).filter(
-                    models.PfamEntryToClan.clan.ilike(searchable_name)
-                )
             elif condition.value.startswith("GO:"):
-                gene_terms = (
-                    db.query(models.GoTermToPfamEntry.entry.label("mapped_term"))
-                    .filter(models.GoTermToPfamEntry.term.ilike(condition.value))
-                    .union(
-                        db.query(models.GoTermToKegg.kegg_term.label("mapped_term")).filter(
-                            models.GoTermToKegg.term.ilike(condition.value)
-                        )
-                    )
-                )
-                term_list = list(gene_terms)
-                if not term_list:
-                    return [condition]
+                mapping = GeneFunctionMapping.go
+                searchable_name = condition.value
             else:
                 # This is not a condition we know how to transform.
                 return [condition]
-            if gene_terms:
-                gene_terms = [_transform_gene_term(term) for term in gene_terms]
+            gene_terms = get_gene_function_index(db).expand(db, mapping, searchable_name)
+            if not gene_terms and mapping == GeneFunctionMapping.go:
+                return [condition]
             return [
                 SimpleConditionSchema(
                     op="==",
                     field=condition.field,
-                    value=term,
+                    value=_transform_gene_term(term),
                     table=condition.table,
                 )
                 for term in gene_terms
             ]
         return [condition]
 
-    def query(self, db) -> Query:
-        """Generate a query selecting all matching id's from the target table."""
-        table_re = re.compile(r"Table.(.*):.*")
-        matches = [db.query(self.table.model.id.label("id"))]
-        has_filters = False
+    def condition_groups(self, db) -> List[Tuple[Table, List[BaseConditionSchema]]]:
+        """Transform and flatten the grouped conditions for each filter table.
 
+        Every condition is assigned a bind parameter prefix, so that the values are
+        rendered as named parameters in the generated query plan.
+        """
+        table_re = re.compile(r"Table.(.*):.*")
+        groups: List[Tuple[Table, List[BaseConditionSchema]]] = []
+        index = 0
         for key, _conditions in self.groups:
-            # Transform and flatten
             conditions = [
                 c for condition in _conditions for c in self.transform_condition(db, condition)
             ]
-            # If transformation eliminated the condition group, report no filters
-            has_filters = len(conditions) > 0
+            if conditions:
+                conditions = _collapse_equality_conditions(conditions)
             match = table_re.match(key)
             if not match:
                 # Not an expected user error
                 raise Exception("Invalid group key")
-            table = Table(match.groups()[0])
-            filter = create_filter_class(table, conditions)
+            for condition in conditions:
+                condition._param_prefix = f"p{index}"
+                index += 1
+            groups.append((Table(match.groups()[0]), conditions))
+        return groups
 
-            # Gene function queries are treated differently because they join
-            # in three different places (metaT, metaG and metaP).
-            if table in [
-                Table.gene_function,
-                Table.kegg_function,
-                Table.go_function,
-                Table.pfam_function,
-                Table.cog_function,
-            ]:
-                metag_matches = filter.matches(db, self.table)
-                metap_conditions = [
-                    SimpleConditionSchema(
-                        table=Table.metap_gene_function,
-                        field=c.field,
-                        value=c.value,
-                    )
-                    for c in conditions
-                ]
-                metap_filter = create_filter_class(
-                    Table.metap_gene_function,
-                    metap_conditions,
-                )
-                gene_matches = metag_matches.union(metap_filter.matches(db, self.table))
-
-                metat_conditions = [
-                    SimpleConditionSchema(
-                        table=Table.metat_gene_function,
-                        field=c.field,
-                        value=c.value,
-                    )
-                    for c in conditions
-                ]
-                metat_filter = create_filter_class(Table.metat_gene_function, metat_conditions)
-                gene_matches = gene_matches.union(metat_filter.matches(db, self.table))
-                matches.append(gene_matches)
-            else:
-                matches.append(filter.matches(db, self.table))
+    def query(self, db) -> Query:
+        """Generate a query selecting all matching id's from the target table."""
+        groups = self.condition_groups(db)
+        # If transformation eliminated the condition group, report no filters
+        has_filters = len(groups) > 0 and len(groups[-1][1]) > 0
 
         # Handle full-text search conditions by delegating to the per-entity subquery method.
+        fts_matches: List[Any] = []
         for fts_cond in [
             c for c in self.conditions if isinstance(c, FullTextSearchConditionSchema)
         ]:
             fts_match = self._fts_subquery(db, fts_cond.value)
             if fts_match is not None:
-                matches.append(fts_match)
+                fts_matches.append(fts_match)
                 has_filters = True
 
         query = db.query(self.table.model.id.label("id"))
         if has_filters:
-            matches_query = intersect(*matches).alias("intersect")
+            planner = query_planner.get()
+            if fts_matches:
+                # Full-text search subqueries are built per search term, so they aren't cached.
+                plan = self._plan(db, groups, planner, fts_matches)
+            else:
+                plan_key = (
+                    planner,
+                    self.table,
+                    any(table in _gene_function_tables for table, _ in groups)
+                    and self._use_gene_function_presence(db),
+                    tuple(
+                        (table, tuple(c.shape for c in conditions)) for table, conditions in groups
+                    ),
+                )
+                cached_plan = query_plan_cache.get(plan_key)
+                if cached_plan is None:
+                    cached_plan = self._plan(db, groups, planner)
+                    query_plan_cache.set(plan_key, cached_plan)
+                plan = cached_plan
+            # Bind this query's values into a copy of the plan.  The bind parameters are made
+            # unique so that several plans can be embedded in the same statement.
+            matches_query = plan.unique_params(_bind_values(groups))
             query = query.join(
                 matches_query,
                 matches_query.c.id == self.table.model.id,
             )
         return query
 
+    def _plan(
+        self,
+        db,
+        groups: List[Tuple[Table, List[BaseConditionSchema]]],
+        planner: QueryPlanner,
+        extra_matches: Sequence[Any] = (),
+    ) -> FromClause:
+        """Generate a subquery selecting the id's of the target table matching all groups."""
+        if planner == QueryPlanner.merged:
+            merged_match, groups = self._merged_match(db, groups)
+            matches = [merged_match, *self._group_matches(db, groups), *extra_matches]
+            if len(matches) == 1:
+                return merged_match.subquery("matches")
+        else:
+            matches = [
+                db.query(self.table.model.id.label("id")),
+                *self._group_matches(db, groups),
+                *extra_matches,
+            ]
+        return intersect(*matches).alias("intersect")
+
+    def _merged_match(
+        self, db, groups: List[Tuple[Table, List[BaseConditionSchema]]]
+    ) -> Tuple[Query, List[Tuple[Table, List[BaseConditionSchema]]]]:
+        """Apply all groups that don't fan out from the target table in a single query.
+
+        Returns the query along with the remaining groups, which still need their own
+        subqueries because a target row can join to many rows of their filter table.
+        """
+        chain = _many_to_one_filter_tables.get(self.table, [])
+        merged = [(table, c) for table, c in groups if table == self.table or table in chain]
+        remaining = [
+            (table, c) for table, c in groups if table != self.table and table not in chain
+        ]
+
+        query = db.query(self.table.model.id.label("id"))
+        joined = [table for table, _ in merged if table in chain]
+        if joined:
+            # The join path of each table in the chain extends the previous one, so joining
+            # the deepest table joins all of them.
+            deepest = max(joined, key=chain.index)
+            query = create_filter_class(deepest).join(self.table, query)
+        for _, conditions in merged:
+            query = query.filter(or_(*[c.compare() for c in conditions]))
+        return query, remaining
+
+    def _group_matches(
+        self, db, groups: List[Tuple[Table, List[BaseConditionSchema]]]
+    ) -> List[Query]:
+        matches: List[Query] = []
+        for table, conditions in groups:
+            filter = create_filter_class(table, conditions)
+
+            # Gene function queries are treated differently because they join
+            # in three different places (metaT, metaG and metaP).
+            if table in _gene_function_tables:
+                if (
+                    isinstance(filter, GeneFunctionFilter)
+                    and self._use_gene_function_presence(db)
+                    and all(c.op in _gene_function_presence_ops for c in conditions)
+                ):
+                    # The biosample_gene_function table already combines all three sources.
+                    matches.append(filter.biosample_matches(db))
+                    continue
+                gene_matches = filter.matches(db, self.table)
+                for related_table in _related_gene_function_tables:
+                    related_filter = create_filter_class(
+                        related_table,
+                        _related_gene_function_conditions(related_table, conditions),
+                    )
+                    gene_matches = gene_matches.union(related_filter.matches(db, self.table))
+                matches.append(gene_matches)
+            else:
+                matches.append(filter.matches(db, self.table))
+        return matches
+
+    def _use_gene_function_presence(self, db) -> bool:
+        """Return whether gene function conditions can use the biosample_gene_function table."""
+        return self.table == Table.biosample and biosample_gene_function.is_loaded(db)
+
     def execute(self, db: Session) -> Query:
         """Search for entities in the target table."""
         model = self.table.model
@@ -569,31 +882,6 @@ class BaseQuerySchema(BaseModel):
         """
         return None
 
-    def get_query_range(
-        self,
-        db: Session,
-        column: Column,
-        subquery: Any,
-        minimum: Optional[NumericValue] = None,
-        maximum: Optional[NumericValue] = None,
-    ) -> Tuple[Optional[NumericValue], Optional[NumericValue]]:
-        """Get the range of a numeric/datetime quantity matching the conditions.
-
-        The API allows specifying one or both of the min/max.  This method will only
-        compute the min/max if it isn't provided.
-        """
-        if None in [minimum, maximum]:
-            row = (
-                db.query(func.min(column), func.max(column))
-                .join(subquery, self.table.model.id == subquery.c.id)
-                .first()
-            )
-            if row is None:
-                raise InvalidFacetException("No results in the query.")
-            minimum = row[0] if minimum is None else minimum
-            maximum = row[1] if maximum is None else maximum
-        return minimum, maximum
-
     def validate_binning_args(
         self,
         attribute: str,
@@ -639,34 +927,40 @@ class BaseQuerySchema(BaseModel):
         maximum: Optional[NumericValue] = None,
         **kwargs,
     ) -> Tuple[List[NumericValue], List[int]]:
-        """Perform a binned faceting aggregation on an attribute."""
+        """Perform a binned faceting aggregation on an attribute.
+
+        Unspecified bounds come from the range of the matching values, which is computed by
+        the same statement as the aggregation (or read from the ranges computed at ingest
+        when there are no conditions).
+        """
         model: Any = self.table.model
         self.validate_binning_args(attribute, minimum, maximum, kwargs.get("resolution"))
 
         column = getattr(model, attribute)
         subquery = self.query(db).subquery()
 
-        try:
-            min_, max_ = self.get_query_range(db, column, subquery, minimum, maximum)
-        except InvalidFacetException:
-            return [], []
+        min_, max_ = minimum, maximum
+        if None in [min_, max_] and not self.conditions:
+            cached_range = attribute_range.get_range(db, self.table, attribute)
+            if cached_range is not None:
+                min_ = cached_range[0] if min_ is None else min_
+                max_ = cached_range[1] if max_ is None else max_
+                # the only way for min/max to be none is if the table is empty
+                if min_ is None or max_ is None:
+                    return [], []
 
-        # the only way for min/max to be none is if the were no matches to the query
         if min_ is None or max_ is None:
-            return [], []
-
-        # Generate bins to use in the query
-        bins: List[NumericValue]
-        if "num_bins" in kwargs:
-            bins = binning.range_bins(min_, max_, kwargs["num_bins"])  # type: ignore
-        elif "resolution" in kwargs:
-            bins = binning.datetime_bins(min_, max_, kwargs["resolution"])  # type: ignore
+            min_, max_, rows = self._binned_facet_range(db, column, subquery, min_, max_, **kwargs)
+            if min_ is None or max_ is None:
+                return [], []
+            bins = self._bins(min_, max_, **kwargs)
+        else:
+            bins = self._bins(min_, max_, **kwargs)
+            bucket = func.width_bucket(column, cast(bins, ARRAY(column.type)))
+            query = db.query(bucket, func.count(column))
+            query = query.join(subquery, model.id == subquery.c.id)
+            rows = [tuple(row) for row in query.group_by(bucket)]
 
-        # generate the binned aggregation
-        bucket = func.width_bucket(column, cast(bins, ARRAY(column.type)))
-        query = db.query(bucket, func.count(column))
-        query = query.join(subquery, model.id == subquery.c.id)
-        rows = query.group_by(bucket)
         result = [0] * (len(bins) - 1)
 
         # coerce the results into the output format... we need special handling for
@@ -684,21 +978,99 @@ class BaseQuerySchema(BaseModel):
 
         return bins, result
 
+    def _bins(self, min_: NumericValue, max_: NumericValue, **kwargs) -> List[NumericValue]:
+        """Generate the bins to use in the query."""
+        bins: List[NumericValue] = []
+        if "num_bins" in kwargs:
+            bins = binning.range_bins(min_, max_, kwargs["num_bins"])  # type: ignore
+        elif "resolution" in kwargs:
+            bins = binning.datetime_bins(min_, max_, kwargs["resolution"])  # type: ignore
+        return bins
+
+    def _binned_facet_range(
+        self,
+        db: Session,
+        column: Any,
+        subquery: Any,
+        minimum: Optional[NumericValue],
+        maximum: Optional[NumericValue],
+        **kwargs,
+    ) -> Tuple[Optional[NumericValue], Optional[NumericValue], List[Tuple[Optional[int], int]]]:
+        """Compute the range of the matching values and their bins in a single statement.
+
+        The matching values are only computed once: the bounds and the bins are derived from
+        them in SQL (see `binning.range_bins_expression`).  Returns the bounds along with
+        the (bin, count) rows.
+        """
+        model: Any = self.table.model
+        matches = (
+            db.query(column.label("value")).join(subquery, model.id == subquery.c.id).cte("matches")
+        )
+
+        def bound(value: Optional[NumericValue], aggregate: Any) -> Any:
+            if value is None:
+                return aggregate(matches.c.value)
+            return literal(value, column.type)
+
+        bounds = (
+            db.query(
+                bound(minimum, func.min).label("minimum"),
+                bound(maximum, func.max).label("maximum"),
+            )
+            .select_from(matches)
+            .cte("bounds")
+        )
+
+        if "num_bins" in kwargs:
+            # range_bins uses integer steps when the minimum is an integer
+            if minimum is None:
+                integer = schemas.AttributeType.from_column(column) == schemas.AttributeType.integer
+            else:
+                integer = isinstance(minimum, int)
+            bins_expression = binning.range_bins_expression(
+                bounds.c.minimum, bounds.c.maximum, kwargs["num_bins"], integer
+            )
+        else:
+            bins_expression = binning.datetime_bins_expression(
+                bounds.c.minimum, bounds.c.maximum, kwargs["resolution"]
+            )
+        bins = (
+            db.query(cast(bins_expression, ARRAY(column.type)).label("bins"))
+            .select_from(bounds)
+            .cte("bins")
+        )
+
+        bucket = func.width_bucket(matches.c.value, bins.c.bins)
+        query = (
+            db.query(bounds.c.minimum, bounds.c.maximum, bucket, func.count(matches.c.value))
+            .select_from(bounds)
+            .join(bins, true())
+            .outerjoin(matches, true())
+            .group_by(bounds.c.minimum, bounds.c.maximum, bucket)
+        )
+        rows = query.all()
+        # There is always a row for the bounds, even if nothing matched.
+        minimum, maximum = rows[0][0], rows[0][1]
+        return minimum, maximum, [(row[2], row[3]) for row in rows]
+
     # TODO: This method will always return all values of the attribute matching
     # the query.  For attributes with a lot of unique values, this could be too
     # much data.  Consider limiting the results in the future.
-    def facet(self, db: Session, attribute: str) -> Dict[schemas.AnnotationValue, int]:
-        """Perform simple faceting on an attribute."""
+    def _facet_column(self, attribute: str) -> Tuple[Any, Any, Callable[[Query], Query]]:
+        """Resolve the column holding the values of an attribute.
+
+        Returns the model whose id's are matched, the column and a function performing the
+        joins necessary to relate the column to the model.
+        """
         model: Any = self.table.model
 
         # special joins need to be performed for faceting on either envo or
         # association proxies.
-        join_ap = False
-        join_envo = False
+        join: Callable[[Query], Query] = _join_nothing
         if attribute in _envo_keys and self.table == Table.biosample:
             table, field = _envo_keys[attribute]
             column = getattr(table.model, field)
-            join_envo = True
+            join = partial(_join_envo_facet, attribute=attribute)
         elif attribute in inspect(model).columns.keys():
             column = getattr(model, attribute)
         elif (
@@ -706,28 +1078,91 @@ class BaseQuerySchema(BaseModel):
             and self.table.model == _association_proxy_keys[attribute][0]
         ):
             model, column = _association_proxy_keys[attribute]
-            join_ap = True
+            join = operator.methodcaller("join", model)
         elif hasattr(model, "annotations"):
             column = model.annotations[attribute]
         else:
             raise InvalidAttributeException(self.table.value, attribute)
+        return model, column, join
+
+    def facet(self, db: Session, attribute: str) -> Dict[schemas.AnnotationValue, int]:
+        """Perform simple faceting on an attribute."""
+        model, column, join = self._facet_column(attribute)
 
         # generate the subquery of id's matching the filters and join with the
         # aggregation query
         subquery = self.query(db).subquery()
-        query = db.query(column, func.count(column))
-
-        # join additional tables if necessary
-        if join_envo:
-            query = _join_envo_facet(query, attribute)
-        elif join_ap:
-            query = query.join(model)
+        query = join(db.query(column, func.count(column)))
         query = query.join(subquery, model.id == subquery.c.id)
 
         # collect the results
         rows = query.group_by(column)
         return {value: count for value, count in rows if value is not None}
 
+    def facets(
+        self, db: Session, attributes: List[str]
+    ) -> Dict[str, Dict[schemas.AnnotationValue, int]]:
+        """Perform simple faceting on several attributes at once.
+
+        The id's matching the filters are selected once in a common table expression that
+        is shared by the aggregations of every attribute.  Attributes stored on the target
+        table itself are aggregated together using grouping sets.
+        """
+        attributes = list(dict.fromkeys(attributes))
+        if not attributes:
+            return {}
+        resolved = [self._facet_column(attribute) for attribute in attributes]
+        matches = self.query(db).cte("matches")
+
+        # Each attribute is selected in its own output column, which is null in the rows
+        # aggregating the other attributes.
+        def output_columns(selected: List[int]) -> List[Any]:
+            return [
+                (column if index in selected else cast(null(), column.type)).label(f"facet_{index}")
+                for index, (_, column, _) in enumerate(resolved)
+            ]
+
+        direct = [index for index, (_, _, join) in enumerate(resolved) if join is _join_nothing]
+        branches = [direct] if direct else []
+        branches += [[index] for index in range(len(resolved)) if index not in direct]
+
+        queries = []
+        for branch in branches:
+            model, _, join = resolved[branch[0]]
+            columns = [resolved[index][1] for index in branch]
+            query = join(db.query(*output_columns(branch), func.count().label("count")))
+            query = query.join(matches, model.id == matches.c.id)
+            if len(columns) > 1:
+                query = query.group_by(func.grouping_sets(*columns))
+            else:
+                query = query.group_by(*columns)
+            queries.append(query)
+
+        facets: Dict[str, Dict[schemas.AnnotationValue, int]] = {a: {} for a in attributes}
+        for row in queries[0].union_all(*queries[1:]):
+            *values, count = row
+            for attribute, value in zip(attributes, values):
+                if value is not None:
+                    facets[attribute][value] = count
+                    break
+        return facets
+
+    def facet_members(self, db: Session, attribute: str) -> Query:
+        """Generate a query of (value, id) pairs relating the values of an attribute to
+        the matching rows of the target table."""
+        model, column, join = self._facet_column(attribute)
+        subquery = self.query(db).subquery()
+        query = join(db.query(column, subquery.c.id))
+        return query.join(subquery, model.id == subquery.c.id).filter(column.isnot(None))
+
+
+def _has_parent(study: Any) -> ClauseElement:
+    """Generate a clause that is true for studies that are part of another study."""
+    part_of = study.part_of
+    return (
+        case((func.jsonb_typeof(part_of) == "array", func.jsonb_array_length(part_of)), else_=0) > 0
+    )
+
 
 class StudyQuerySchema(BaseQuerySchema):
     @property
@@ -917,6 +1352,31 @@ class StudyQuerySchema(BaseQuerySchema):
             .options(with_expression(models.Study.sample_count, sample_count.c.sample_count)),
         )
 
+    def execute_top_level(self, db: Session) -> Query:
+        """Search for the studies listed at the top level of hierarchical search results.
+
+        These are the matching studies without a parent, followed by the matching studies
+        none of whose parents are listed at the top level.
+        """
+        matches = self.query(db).subquery()
+        parent = aliased(models.Study)
+        listed_parent = (
+            db.query(parent.id)
+            .join(matches, parent.id == matches.c.id)
+            .filter(~_has_parent(parent), models.Study.part_of.op("?")(parent.id))
+        )
+        return (
+            self.execute(db)
+            .filter(~listed_parent.exists())
+            .order_by(None)
+            .order_by(_has_parent(models.Study), models.Study.annotations["title"].astext)
+        )
+
+    def execute_children(self, db: Session, parent_ids: List[str]) -> Query:
+        """Search for the matching studies that are part of any of the given studies."""
+        parent_ids_param = bindparam("parent_ids", parent_ids, type_=ARRAY(String))
+        return self.execute(db).filter(models.Study.part_of.op("?|")(parent_ids_param))
+
 
 class OmicsProcessingQuerySchema(BaseQuerySchema):
     @property
@@ -986,6 +1446,12 @@ class BiosampleQuerySchema(BaseQuerySchema):
     include_superseded_workflow_executions: bool = False
     """If True, include workflow executions that have been superseded by other ones."""
 
+    # Search results are ordered by this key, which also supports cursor pagination.
+    sort_key: ClassVar[SortKey] = [
+        (models.Biosample.multiomics, True),
+        (models.Biosample.id, False),
+    ]
+
     @property
     def table(self) -> Table:
         return Table.biosample
@@ -1030,10 +1496,8 @@ class BiosampleQuerySchema(BaseQuerySchema):
         # These searches will return 0 results.
         if typecode is not None:
             brd_subquery = (
-                db.query(
-                    func.unnest(models.BiosampleRelatedDocument.biosample_ids).label("biosample_id")
-                )
-                .filter(models.BiosampleRelatedDocument.id.like(f"{term}%"))
+                db.query(models.DocumentBiosample.biosample_id)
+                .filter(models.DocumentBiosample.document_id.like(f"{term}%"))
                 .subquery()
             )
             return (
@@ -1076,16 +1540,20 @@ class BiosampleQuerySchema(BaseQuerySchema):
         biosample_query = (
             db.query(model)
             .join(subquery, model.id == subquery.c.id)
-            .order_by(self.table.model.multiomics.desc(), self.table.model.id)
+            .order_by(*sort_order(self.sort_key))
         )
 
         if prefetch_omics_processing_data:
             from nmdc_server.models import workflow_activity_types
 
+            # Flag the outputs matching the data object filter as they are loaded.
+            selected = with_expression(
+                models.DataObject.selected, data_object_selected(self.data_object_filter)
+            )
             biosample_query = biosample_query.options(
-                selectinload(models.Biosample.omics_processing).selectinload(
-                    models.OmicsProcessing.outputs
-                ),
+                selectinload(models.Biosample.omics_processing)
+                .selectinload(models.OmicsProcessing.outputs)
+                .options(selected),
                 selectinload(models.Biosample.omics_processing).selectinload(
                     models.OmicsProcessing.biosample_inputs
                 ),
@@ -1098,6 +1566,7 @@ class BiosampleQuerySchema(BaseQuerySchema):
                         getattr(models.OmicsProcessing, model.__tablename__)
                     )  # noqa: E501
                     .selectinload(model.outputs)  # type: ignore
+                    .options(selected)
                 )
 
                 # The MAGsAnalysis specifically needs to also prefetch the mags_list
@@ -1184,6 +1653,25 @@ class DataObjectAggregation(BaseModel):
     size: int
 
 
+def _data_object_filter_condition(filter: DataObjectFilter) -> ClauseElement:
+    """Return the condition of the data objects matching a data object filter."""
+    # we can't download files without urls
+    conditions = [models.DataObject.url != None]  # noqa: E711
+    if filter.workflow:
+        conditions.append(models.DataObject.workflow_type == filter.workflow.value)
+    if filter.file_type:
+        conditions.append(models.DataObject.file_type == filter.file_type)
+    return and_(*conditions)
+
+
+def data_object_selected(filters: List[DataObjectFilter]) -> ClauseElement:
+    """Return an expression telling whether a data object matches any of the filters.
+
+    This populates `DataObject.selected` in biosample search results.
+    """
+    return or_(false(), *[_data_object_filter_condition(f) for f in filters])
+
+
 class DataObjectQuerySchema(BaseQuerySchema):
     data_object_filter: List[DataObjectFilter] = []
     include_superseded_workflow_executions: bool = False
@@ -1232,7 +1720,6 @@ class DataObjectQuerySchema(BaseQuerySchema):
     def execute(self, db: Session) -> Query:
         return self.query(db)
 
-    # WARNING: This logic is duplicated in the DataObject.is_selected method.
     def _data_object_filter_subquery(
         self, db: Session, filter: DataObjectFilter, op_cte: CTE
     ) -> Query:
@@ -1248,14 +1735,7 @@ class DataObjectQuerySchema(BaseQuerySchema):
                 models.omics_processing_output_association.c.omics_processing_id == op_cte.c.id,
             )
         )
-        if filter.workflow:
-            query = query.filter(models.DataObject.workflow_type == filter.workflow.value)
-
-        if filter.file_type:
-            query = query.filter(models.DataObject.file_type == filter.file_type)
-
-        query = query.filter(models.DataObject.url != None)  # noqa
-        return query
+        return query.filter(_data_object_filter_condition(filter))
 
     def aggregate(self, db: Session) -> DataObjectAggregation:
         """Return the number of files and total size of matched data objects."""
@@ -1282,6 +1762,8 @@ T = TypeVar("T")
 
 class Paginated(BaseModel, Generic[T]):
     count: int
+    count_exact: bool = True
+    """False if `count` is an estimate (see the `count` query parameter)."""
     results: List[T]
 
 
@@ -1303,6 +1785,10 @@ class FacetQuery(SearchQuery):
     attribute: str
 
 
+class BatchFacetQuery(SearchQuery):
+    attributes: List[str]
+
+
 class BiosampleSearchQuery(SearchQuery):
     data_object_filter: List[DataObjectFilter] = []
     """
@@ -1336,6 +1822,10 @@ class FacetResponse(BaseModel):
     facets: Dict[schemas.AnnotationValue, int]
 
 
+class BatchFacetResponse(BaseModel):
+    facets: Dict[str, Dict[schemas.AnnotationValue, int]]
+
+
 class BinnedFacetResponse(BaseModel):
     facets: List[int]
     bins: List[NumericValue]
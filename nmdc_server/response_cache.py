@@ -0,0 +1,73 @@
+"""
+Responses of the search, facet and aggregation endpoints are cached in memory by each
+worker, keyed by the ingest generation, the request path, its query parameters and its
+parsed body.  Identical requests arriving while a response is being computed wait for it
+instead of running the same queries again.
+
+Cached responses are serialized once, so hits skip both the database and the response
+model validation.  Responses with fields that change between ingests (the download counts
+of data objects) are instead cached as validated content, which is serialized for each
+request with the current values of those fields.
+"""
+
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.orm import Session
+
+from nmdc_server.cache import SingleFlightCache
+from nmdc_server.config import settings
+from nmdc_server.ingest.generation import current_generation
+
+# Serialized response bodies (or validated content, see `cached`) and the headers set by the
+# endpoint (e.g. pagination links).
+response_cache: SingleFlightCache[Tuple[Any, Dict[str, str]]] = SingleFlightCache(
+    settings.response_cache_size, settings.response_cache_ttl
+)
+
+
+@lru_cache
+def _adapter(response_model: Any) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+def cached(
+    request: Request,
+    response: Response,
+    db: Session,
+    body: BaseModel,
+    compute: Callable[[], Any],
+    live_context: Optional[Callable[[Any], Dict[str, Any]]] = None,
+) -> Any:
+    """Return the response of an endpoint of ingested data, computing it on a miss.
+
+    `compute` returns the endpoint's content, which is serialized with the response model
+    of the route.  Databases ingested before generations were recorded are not cached.
+
+    Endpoints whose content has live fields pass `live_context`, which is called with the
+    cached content on each request.  Its result is passed as the serialization context to
+    the response model, whose serializers fill in the live fields from it.
+    """
+    generation = current_generation(db)
+    if generation is None:
+        return compute()
+    adapter = _adapter(request.scope["route"].response_model)
+
+    def render() -> Tuple[Any, Dict[str, str]]:
+        content = adapter.validate_python(compute(), from_attributes=True)
+        if live_context is None:
+            content = adapter.dump_json(content, by_alias=True)
+        return content, dict(response.headers)
+
+    key = (
+        generation,
+        request.url.path,
+        tuple(sorted(request.query_params.multi_items())),
+        body.model_dump_json(),
+    )
+    content, headers = response_cache.get_or_create(key, render)
+    if live_context is not None:
+        content = adapter.dump_json(content, by_alias=True, context=live_context(content))
+    return Response(content, media_type="application/json", headers=headers)
@@ -105,6 +105,22 @@ def _get_related_documents(
     return {row.id: row for row in rows}
 
 
+def _get_related_biosample_ids(db: Session, document_ids: list[str]) -> dict[str, list[str]]:
+    """Map each of the specified documents to the IDs of the biosamples it is related to."""
+    rows = db.execute(
+        select(
+            models.DocumentBiosample.document_id,  # type: ignore[arg-type]
+            models.DocumentBiosample.biosample_id,
+        )
+        .where(models.DocumentBiosample.document_id.in_(document_ids))
+        .order_by(models.DocumentBiosample.document_id, models.DocumentBiosample.biosample_id)
+    )
+    biosample_ids: dict[str, list[str]] = {}
+    for document_id, biosample_id in rows:
+        biosample_ids.setdefault(document_id, []).append(biosample_id)
+    return biosample_ids
+
+
 def _references(ids):
     return [{"@id": id_} for id_ in sorted(dict.fromkeys(ids))]
 
@@ -333,8 +349,13 @@ def generate_rocrate_for_bulk_download(  # noqa: C901
         *data_generation_rows.values(),
         *workflow_rows.values(),
     ]
+    related_biosample_ids = _get_related_biosample_ids(db, [row.id for row in related_rows])
     biosample_ids = list(
-        dict.fromkeys(biosample_id for row in related_rows for biosample_id in row.biosample_ids)
+        dict.fromkeys(
+            biosample_id
+            for row in related_rows
+            for biosample_id in related_biosample_ids.get(row.id, [])
+        )
     )
     biosample_rows = _get_related_documents(db, biosample_ids)
     biosample_rows = {
@@ -403,7 +424,11 @@ def generate_rocrate_for_bulk_download(  # noqa: C901
             "@type": "nmdc:DataGeneration",
             "sameAs": f"{IDENTIFIER_PREFIX_URL}/{id_}",
         }
-        related_biosamples = [id_ for id_ in row.biosample_ids if id_ in biosample_rows]
+        related_biosamples = [
+            biosample_id
+            for biosample_id in related_biosample_ids.get(id_, [])
+            if biosample_id in biosample_rows
+        ]
         if related_biosamples:
             node["prov:used"] = _references(related_biosamples)
         graph.append(node)
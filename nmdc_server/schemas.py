@@ -15,12 +15,21 @@ from urllib.parse import quote
 from uuid import UUID
 
 from pint import Unit
-from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, ValidationInfo, field_validator
+from pydantic import (
+    BaseModel,
+    BeforeValidator,
+    ConfigDict,
+    Field,
+    SerializationInfo,
+    ValidationInfo,
+    field_serializer,
+    field_validator,
+)
 from sqlalchemy import BigInteger, Column, DateTime, Float, Integer, LargeBinary, String
 from sqlalchemy.dialects.postgresql.json import JSONB
 
 from nmdc_server import __version__, models
-from nmdc_server.data_object_filters import DataObjectFilter, WorkflowActivityTypeEnum
+from nmdc_server.data_object_filters import WorkflowActivityTypeEnum
 
 DateType = Union[datetime, date]
 
@@ -198,12 +207,38 @@ class AggregationSummary(BaseModel):
     data_size: int
 
 
+class CacheStats(BaseModel):
+    """Counters describing the effectiveness of an in-process cache of a single worker."""
+
+    hits: int
+    misses: int
+    size: int
+    maxsize: int
+
+
+class ResponseCacheStats(CacheStats):
+    """Counters of the in-process response cache of a single worker."""
+
+    waits: int = Field(
+        description="Number of requests that waited for an identical request in progress."
+    )
+
+
 class AdminStats(BaseModel):
     """Statistics designed for consumption by Data Portal/Submission Portal administrators."""
 
     num_user_accounts: int = Field(
         description="Number of distinct ORCIDs that have been used to sign in."
     )
+    query_plan_cache: CacheStats = Field(
+        description="Search query plan cache counters of the worker serving the request."
+    )
+    count_cache: CacheStats = Field(
+        description="Search result count cache counters of the worker serving the request."
+    )
+    response_cache: ResponseCacheStats = Field(
+        description="Response cache counters of the worker serving the request."
+    )
 
 
 class EnvironmentSankeyAggregation(BaseModel):
@@ -415,35 +450,11 @@ class DataObject(DataObjectBase):
         id_str = quote(info.data["id"])
         return f"/api/data_object/{id_str}/download" if url else None
 
-    # Determine if the data object is selected by the provided filter.
-    # WARNING: This logic is duplicated in the bulk download query
-    #          (see `_data_object_filter_subquery`)
-    @classmethod
-    def is_selected(
-        cls,
-        workflow: WorkflowActivityTypeEnum,
-        data_object: "DataObject",
-        filters: List[DataObjectFilter],
-    ) -> bool:
-        # we can't download files without urls
-        if not data_object.url:
-            return False
-
-        def workflow_match(f, workflow) -> bool:
-            if f.workflow is None or f.workflow == workflow:
-                return True
-            return False
-
-        def file_type_match(f, file_type) -> bool:
-            if f.file_type is None or f.file_type == file_type:
-                return True
-            return False
-
-        for f in filters:
-            if workflow_match(f, workflow) and file_type_match(f, data_object.file_type):
-                return True
-
-        return False
+    @field_serializer("downloads")
+    def serialize_downloads(self, downloads: int, info: SerializationInfo) -> int:
+        # Cached search responses are serialized with the current download counts.
+        counts = (info.context or {}).get("download_counts")
+        return downloads if counts is None else counts[self.id]
 
 
 class GeneFunction(BaseModel):
@@ -665,6 +676,17 @@ class FileDownloadCreate(FileDownloadBase):
     pass
 
 
+class MetadataExport(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    created: datetime
+    status: models.MetadataExportStatus
+    completed: Optional[datetime] = None
+    size: Optional[int] = None
+    """The size of the archive in bytes, once the export is complete."""
+
+
 class EnvoTreeNode(BaseModel):
     id: str
     label: str
@@ -0,0 +1,104 @@
+"""
+A pre-fork server running the API in several uvicorn worker processes.
+
+The application and the immutable reference data it serves (ENVO trees, gene function
+mappings, submission schema enums) are loaded once in the parent process before the
+workers are forked, so the workers share them copy-on-write instead of each building its
+own copy.  Each worker opens its own database connection pool after the fork.
+"""
+
+import gc
+import os
+import signal
+import socket
+from typing import Optional, Set
+
+import uvicorn
+from uvicorn.config import LOGGING_CONFIG
+
+from nmdc_server.api import fetch_nmdc_submission_schema
+from nmdc_server.config import settings
+from nmdc_server.database import SessionLocal, engine
+from nmdc_server.facet_bitmap import get_biosample_bitmap_index
+from nmdc_server.gene_function_index import get_gene_function_index
+from nmdc_server.ingest.envo import nested_envo_trees
+from nmdc_server.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def warm_caches() -> None:
+    """Build the reference data that is shared by the workers."""
+    fetch_nmdc_submission_schema()
+    try:
+        nested_envo_trees()
+        with SessionLocal() as db:
+            get_gene_function_index(db)
+            get_biosample_bitmap_index(db)
+    except Exception:
+        logger.exception("Failed to preload the reference data, the workers will load it")
+    finally:
+        # Connections can't be shared between processes, so every worker starts its own pool.
+        engine.dispose()
+
+
+def _run_worker(config: uvicorn.Config, sock: socket.socket) -> None:
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, signal.SIG_DFL)
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    finally:
+        os._exit(0)
+
+
+def serve(
+    host: str, port: int, workers: Optional[int] = None, log_config: Optional[str] = None
+) -> None:
+    """Serve the API, forking `workers` processes (defaults to the `web_workers` setting)."""
+    workers = workers or settings.web_workers
+    config = uvicorn.Config(
+        "nmdc_server.asgi:app", host=host, port=port, log_config=log_config or LOGGING_CONFIG
+    )
+    if workers <= 1:
+        uvicorn.Server(config).run()
+        return
+
+    config.load()
+    sock = config.bind_socket()
+    warm_caches()
+    # Keep the warmed objects out of the garbage collector's generations, so that collections
+    # in the workers don't write to (and copy) the shared pages.
+    gc.freeze()
+    pool = settings.db_pool_size + settings.db_pool_max_overflow
+    logger.info(f"Starting {workers} workers, using up to {workers * pool} database connections")
+
+    children: Set[int] = set()
+    stopping = False
+
+    def fork() -> None:
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(config, sock)
+        children.add(pid)
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(workers):
+        fork()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            logger.warning(f"Worker {pid} exited with status {status}, restarting it")
+            fork()
+    sock.close()
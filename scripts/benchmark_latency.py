@@ -0,0 +1,79 @@
+"""
+Measure the latency of the portal API under a concurrent mix of requests.
+
+Slow search and facet requests are sent alongside cheap `/api/health` requests, so that a
+handler blocking the event loop shows up as a high p99 latency of the health checks.
+
+Usage:
+    python scripts/benchmark_latency.py [--url http://localhost:8000] [--concurrency 32]
+                                        [--requests 2000]
+
+Run the server with `NMDC_RESPONSE_CACHE_SIZE=0` to measure the database queries rather
+than the response cache.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+# (weight, method, path, JSON body)
+REQUESTS: List[Tuple[int, str, str, Optional[Dict[str, Any]]]] = [
+    (4, "GET", "/api/health", None),
+    (2, "POST", "/api/biosample/search?limit=25", {"conditions": []}),
+    (2, "POST", "/api/biosample/facet", {"attribute": "ecosystem_category", "conditions": []}),
+    (1, "POST", "/api/biosample/binned_facet", {"attribute": "depth", "conditions": []}),
+    (1, "POST", "/api/environment/sankey", {"conditions": []}),
+    (1, "POST", "/api/study/search?limit=25", {"conditions": []}),
+]
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run(url: str, concurrency: int, total: int) -> Dict[str, List[float]]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    weights = [weight for weight, *_ in REQUESTS]
+    remaining = total
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            _, method, path, body = random.choices(REQUESTS, weights)[0]
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies[path].append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    async with httpx.AsyncClient(base_url=url, timeout=None) as client:
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    latencies = asyncio.run(run(args.url, args.concurrency, args.requests))
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.requests} requests in {elapsed:.1f}s ({args.requests / elapsed:.1f} req/s)")
+    print(f"{'endpoint':<40} {'count':>6} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    for path, values in sorted(latencies.items()):
+        p50, p99 = (1000 * percentile(values, p) for p in (0.5, 0.99))
+        print(f"{path:<40} {len(values):>6} {p50:>10.1f} {p99:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ from google.cloud.storage import Blob
 from starlette.testclient import TestClient
 
 import nmdc_server.api
-from nmdc_server import database, schemas
+from nmdc_server import cache, database, schemas
 from nmdc_server.app import create_app
 from nmdc_server.auth import create_token_response
 from nmdc_server.config import settings
@@ -72,6 +72,7 @@ def db(connection):
     for table in reversed(database.metadata.sorted_tables):
         connection.execute(table.delete())
     connection.commit()
+    cache.clear_all()
 
 
 @pytest.fixture
@@ -12,6 +12,9 @@ from sqlalchemy.orm.session import Session
 from starlette import status as http_status
 
 import nmdc_server
+from nmdc_server import crud, response_cache
+from nmdc_server.config import settings
+from nmdc_server.ingest import biosample_card, environment_rollup, generation, summary
 from nmdc_server.schemas import DatabaseSummary
 from tests import fakes
 
@@ -94,6 +97,101 @@ def test_api_faceting(db: Session, client: TestClient):
     assert resp.json()["facets"] == {"value2": 2, "value3": 1}
 
 
+def test_api_batch_faceting(db: Session, client: TestClient):
+    env_local1 = fakes.EnvoTermFactory(label="local1")
+    fakes.BiosampleFactory(
+        id="sample1", ecosystem="soil", env_local_scale=env_local1, annotations={"key1": "value1"}
+    )
+    fakes.BiosampleFactory(id="sample2", ecosystem="soil", annotations={"key1": "value1"})
+    fakes.BiosampleFactory(id="sample3", ecosystem="water", annotations={"key1": "value4"})
+    db.commit()
+
+    resp = client.post(
+        "/api/biosample/facets",
+        json={
+            "conditions": [{"table": "biosample", "field": "id", "op": "!=", "value": "sample2"}],
+            "attributes": ["key1", "ecosystem", "env_local_scale"],
+        },
+    )
+    assert_status(resp)
+    assert resp.json()["facets"] == {
+        "key1": {"value1": 1, "value4": 1},
+        "ecosystem": {"soil": 1, "water": 1},
+        "env_local_scale": {"local1": 1},
+    }
+
+
+def test_search_study_hierarchy(db: Session, client: TestClient):
+    parent = fakes.StudyFactory(id="parent", annotations={"title": "a"})
+    fakes.StudyFactory(id="child", part_of=[parent.id], annotations={"title": "b"})
+    excluded = fakes.StudyFactory(id="excluded", gold_name="excluded", annotations={"title": "c"})
+    fakes.StudyFactory(id="orphan", part_of=[excluded.id], annotations={"title": "d"})
+    db.commit()
+
+    conditions = [{"table": "study", "field": "gold_name", "op": "!=", "value": "excluded"}]
+    resp = client.post("/api/study/search", json={"conditions": conditions})
+    assert_status(resp)
+    data = resp.json()
+    assert data["count"] == 2
+    assert data["total"] == 3
+    assert [(s["id"], [c["id"] for c in s["children"]]) for s in data["results"]] == [
+        ("parent", ["child"]),
+        ("orphan", []),
+    ]
+
+    resp = client.post("/api/study/search?limit=1&offset=1", json={"conditions": conditions})
+    assert_status(resp)
+    assert resp.json()["count"] == 2
+    assert [s["id"] for s in resp.json()["results"]] == ["orphan"]
+
+
+def test_search_biosample_cards(db: Session, client: TestClient, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_generation_check_interval", 0)
+    biosample = fakes.BiosampleFactory(id="b")
+    omics_processing = fakes.OmicsProcessingFactory(id="op", biosample_inputs=[biosample])
+    omics_processing.outputs = [fakes.DataObjectFactory(id="do", url="https://example.com")]
+    db.commit()
+
+    def search():
+        resp = client.post("/api/biosample/search", json={"conditions": []})
+        assert_status(resp)
+        return resp.json()
+
+    expected = search()
+    assert expected["results"][0]["omics_processing"][0]["outputs"][0]["id"] == "do"
+
+    biosample_card.load(db)
+    generation.load(db)
+    db.commit()
+    assert biosample_card.is_loaded(db)
+    assert search() == expected
+
+
+@pytest.mark.parametrize("cards", [False, True])
+def test_search_biosample_selected(db: Session, client: TestClient, monkeypatch, cards: bool):
+    monkeypatch.setattr(settings, "ingest_generation_check_interval", 0)
+    biosample = fakes.BiosampleFactory(id="b")
+    omics_processing = fakes.OmicsProcessingFactory(id="op", biosample_inputs=[biosample])
+    for id, file_type in [("match", "a"), ("other", "b")]:
+        data_object = fakes.DataObjectFactory(
+            id=id, file_type=file_type, workflow_type="nmdc:RawData", url="https://example.com"
+        )
+        omics_processing.outputs.append(data_object)
+    db.commit()
+    if cards:
+        biosample_card.load(db)
+        generation.load(db)
+        db.commit()
+
+    resp = client.post(
+        "/api/biosample/search",
+        json={"conditions": [], "data_object_filter": [{"file_type": "a"}]},
+    )
+    assert_status(resp)
+    outputs = resp.json()["results"][0]["omics_processing"][0]["outputs"]
+    assert {da["id"]: da["selected"] for da in outputs} == {"match": True, "other": False}
+
+
 def test_api_summary(client: TestClient):
     """
     Check the `/api/summary` endpoint to ensure it returns a complete
@@ -107,6 +205,126 @@ def test_api_summary(client: TestClient):
         assert field in data
 
 
+def test_stored_summaries(db: Session, client: TestClient):
+    fakes.BiosampleFactory()
+    db.commit()
+    expected = {
+        endpoint: client.get(f"/api/{endpoint}").json() for endpoint in ["summary", "stats"]
+    }
+
+    summary.load(db)
+    db.commit()
+    # The stored payloads are served until the next ingest.
+    fakes.StudyFactory()
+    db.commit()
+    for endpoint, payload in expected.items():
+        resp = client.get(f"/api/{endpoint}")
+        assert_status(resp)
+        assert resp.json() == payload
+
+
+def test_generation_etag(db: Session, client: TestClient, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_generation_check_interval", 0)
+    fakes.BiosampleFactory()
+    db.commit()
+    resp = client.get("/api/summary")
+    assert_status(resp)
+    assert "ETag" not in resp.headers
+
+    generation.load(db)
+    db.commit()
+    resp = client.get("/api/summary")
+    assert_status(resp)
+    etag = resp.headers["ETag"]
+    assert resp.headers["Cache-Control"] == f"public, max-age={settings.http_cache_max_age}"
+
+    resp = client.get("/api/summary", headers={"If-None-Match": etag})
+    assert resp.status_code == status.HTTP_304_NOT_MODIFIED
+    assert resp.headers["ETag"] == etag
+    assert resp.content == b""
+
+    # Equivalent search bodies share an ETag, other searches don't.
+    body = {"conditions": [{"table": "study", "field": "id", "op": "==", "value": "x"}]}
+    resp = client.post("/api/study/search", json=body)
+    assert_status(resp)
+    search_etag = resp.headers["ETag"]
+    reordered = json.dumps({"conditions": [dict(reversed(body["conditions"][0].items()))]})
+    resp = client.post(
+        "/api/study/search",
+        content=reordered,
+        headers={"Content-Type": "application/json", "If-None-Match": search_etag},
+    )
+    assert resp.status_code == status.HTTP_304_NOT_MODIFIED
+    resp = client.post(
+        "/api/study/search?limit=1", json=body, headers={"If-None-Match": search_etag}
+    )
+    assert_status(resp)
+    assert resp.headers["ETag"] != search_etag
+
+    # Searches returning download counts, which change between ingests, have no ETag.
+    resp = client.post("/api/biosample/search", json=body)
+    assert_status(resp)
+    assert "ETag" not in resp.headers
+
+    # A new ingest invalidates the ETag.
+    generation.load(db)
+    db.commit()
+    resp = client.get("/api/summary", headers={"If-None-Match": etag})
+    assert_status(resp)
+    assert resp.headers["ETag"] != etag
+
+
+def test_response_cache(db: Session, client: TestClient, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_generation_check_interval", 0)
+    fakes.BiosampleFactory()
+    generation.load(db)
+    db.commit()
+    body = {"attribute": "id", "conditions": []}
+    resp = client.post("/api/biosample/facet", json=body)
+    assert_status(resp)
+    expected = resp.json()
+
+    # The cached response is served until the next ingest.
+    fakes.BiosampleFactory()
+    db.commit()
+    resp = client.post("/api/biosample/facet", json={"conditions": [], "attribute": "id"})
+    assert_status(resp)
+    assert resp.json() == expected
+    assert response_cache.response_cache.stats()["hits"] == 1
+
+    generation.load(db)
+    db.commit()
+    resp = client.post("/api/biosample/facet", json=body)
+    assert len(resp.json()["facets"]) == 2
+
+    # Pagination headers are cached with the response.
+    search = client.post("/api/biosample/search?limit=1")
+    assert client.post("/api/biosample/search?limit=1").headers["Links"] == search.headers["Links"]
+    assert search.headers["Resource-Count"] == "2"
+
+
+def test_response_cache_download_counts(db: Session, client: TestClient, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_generation_check_interval", 0)
+    sample = fakes.BiosampleFactory()
+    omics_processing = fakes.OmicsProcessingFactory(biosample_inputs=[sample])
+    data_object = fakes.DataObjectFactory(omics_processing=omics_processing)
+    omics_processing.outputs.append(data_object)
+    generation.load(db)
+    db.commit()
+
+    def downloads() -> int:
+        resp = client.post("/api/biosample/search")
+        assert_status(resp)
+        return resp.json()["results"][0]["omics_processing"][0]["outputs"][0]["downloads"]
+
+    # Cached search results have the current download counts.
+    assert downloads() == 0
+    crud.increment_data_object_download_counts(db, [data_object.id])
+    db.commit()
+    assert downloads() == 1
+    assert response_cache.response_cache.stats()["hits"] == 1
+
+
 def test_api_stats(db: Session, client: TestClient):
     """
     This test checks the `/api/stats` endpoint to ensure it returns the expected
@@ -229,6 +447,41 @@ def test_get_environmental_aggregation(db: Session, client: TestClient):
     assert resp.json() == []
 
 
+def test_environmental_rollup(db: Session, client: TestClient, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_generation_check_interval", 0)
+    for latitude, longitude in [(10.0, 10.0), (10.0, 10.0), (12.0, 14.0), (-50.0, 100.0)]:
+        fakes.BiosampleFactory(
+            latitude=latitude,
+            longitude=longitude,
+            ecosystem="Environmental",
+            ecosystem_category="Aquatic",
+        )
+    db.commit()
+
+    def aggregate(endpoint, **params):
+        resp = client.post(f"/api/environment/{endpoint}", params=params)
+        assert_status(resp)
+        return sorted(resp.json(), key=lambda r: (r["count"], json.dumps(r)))
+
+    expected_sankey = aggregate("sankey")
+    expected_geospatial = aggregate("geospatial")
+    assert [r["count"] for r in expected_geospatial] == [1, 1, 2]
+
+    environment_rollup.load(db)
+    generation.load(db)
+    db.commit()
+    assert environment_rollup.is_loaded(db)
+    assert aggregate("sankey") == expected_sankey
+    assert aggregate("geospatial") == expected_geospatial
+
+    # At zoom level 2 the cells span 90 degrees.
+    clusters = aggregate("geospatial", zoom=2)
+    assert [(r["count"], r["latitude"], r["longitude"]) for r in clusters] == [
+        (1, -50.0, 100.0),
+        (3, 32 / 3, 34 / 3),
+    ]
+
+
 @pytest.mark.parametrize(
     "endpoint",
     [
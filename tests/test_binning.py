@@ -6,6 +6,8 @@ from sqlalchemy.orm.session import Session
 
 from nmdc_server import query
 from nmdc_server.binning import DateBinResolution
+from nmdc_server.config import settings
+from nmdc_server.ingest import attribute_range, generation
 from tests import fakes
 
 
@@ -62,6 +64,26 @@ def test_date_range_bins_year(db: Session, biosamples):
     assert result == [6]
 
 
+def test_cached_range_bins(db: Session, biosamples, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_generation_check_interval", 0)
+    attribute_range.load(db)
+    generation.load(db)
+    db.commit()
+
+    # Ranges are only recomputed by the next ingest.
+    fakes.BiosampleFactory(depth=100, collection_date=datetime(2020, 1, 1))
+    db.commit()
+
+    q = query.BiosampleQuerySchema()
+    bins, result = q.binned_facet(db, "depth", num_bins=3)
+    assert bins == [1, 8, 15, 22]
+    assert result == [3, 2, 2]
+
+    bins, result = q.binned_facet(db, "collection_date", resolution=DateBinResolution.month)
+    assert len(bins) == 3
+    assert result == [5, 2]
+
+
 def test_filtered_bins(db: Session, biosamples):
     q = query.BiosampleQuerySchema(
         conditions=[
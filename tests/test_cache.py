@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from nmdc_server.cache import SingleFlightCache
+
+
+def test_single_flight_coalesces_concurrent_misses():
+    cache: SingleFlightCache[int] = SingleFlightCache(maxsize=2, ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 42
+
+    leader = threading.Thread(target=lambda: cache.get_or_create("key", factory))
+    leader.start()
+    started.wait(5)
+    results = []
+    waiters = [
+        threading.Thread(target=lambda: results.append(cache.get_or_create("key", factory)))
+        for _ in range(3)
+    ]
+    for waiter in waiters:
+        waiter.start()
+    while cache.waits < 3:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in [leader, *waiters]:
+        thread.join(5)
+
+    assert results == [42, 42, 42]
+    assert len(calls) == 1
+    assert cache.get_or_create("key", factory) == 42
+    assert cache.stats() == {"hits": 1, "misses": 1, "waits": 3, "size": 1, "maxsize": 2}
+
+
+def test_single_flight_expiry_and_errors():
+    cache: SingleFlightCache[int] = SingleFlightCache(maxsize=1, ttl=0)
+    assert cache.get_or_create("a", lambda: 1) == 1
+    # Expired entries are recomputed.
+    assert cache.get_or_create("a", lambda: 2) == 2
+
+    def fail():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        cache.get_or_create("b", fail)
+    assert cache.stats()["misses"] == 3
+    assert len(cache) == 1
@@ -1,13 +1,16 @@
 import io
 import json
+import time
 import zipfile
 from typing import Any
+from uuid import UUID
 
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.orm.session import Session
 
-from nmdc_server import models, query
+from nmdc_server import crud, metadata_export, models, query
+from nmdc_server.config import settings
 from nmdc_server.data_object_filters import WorkflowActivityTypeEnum
 from nmdc_server.rocrate import _add_archive_entities, generate_rocrate_for_bulk_download
 from tests import fakes
@@ -18,6 +21,21 @@ def _metadata_zip_documents(response, filename: str) -> list[dict]:
         return json.loads(archive.read(filename))
 
 
+def add_documents(db: Session, documents: list[models.BiosampleRelatedDocument]):
+    """Add the documents, and relate them to their `biosample_ids` as the ingest would."""
+    db.add_all(documents)
+    db.flush()
+    db.add_all(
+        models.DocumentBiosample(
+            document_id=document.id,
+            biosample_id=biosample_id,
+            high_level_type=document.high_level_type,
+        )
+        for document in documents
+        for biosample_id in document.biosample_ids
+    )
+
+
 def test_metadata_download_filters_superseded_workflow_executions_and_outputs(
     db: Session, client: TestClient
 ):
@@ -55,7 +73,7 @@ def test_metadata_download_filters_superseded_workflow_executions_and_outputs(
             document={"id": superseded_output.id},
         ),
     ]
-    db.add_all(documents)
+    add_documents(db, documents)
     db.commit()
 
     request = {
@@ -86,6 +104,157 @@ def test_metadata_download_filters_superseded_workflow_executions_and_outputs(
     }
 
 
+def test_metadata_download_search_conditions(db: Session, client: TestClient):
+    documents = []
+    for id in ["sample1", "sample2"]:
+        fakes.BiosampleFactory(id=id)
+        documents.append(
+            models.BiosampleRelatedDocument(
+                id=id, biosample_ids=[id], high_level_type="nmdc:Biosample", document={"id": id}
+            )
+        )
+    documents.append(
+        models.BiosampleRelatedDocument(
+            id="study",
+            biosample_ids=["sample1", "sample2"],
+            high_level_type="nmdc:Study",
+            document={"id": "study"},
+        )
+    )
+    add_documents(db, documents)
+    db.commit()
+
+    def download(value: str):
+        condition = {"table": "biosample", "field": "id", "op": "==", "value": value}
+        request = {"endpoints": ["nmdc:Biosample", "nmdc:Study"], "conditions": [condition]}
+        response = client.post("/api/download_metadata", json=request)
+        assert response.status_code == 200
+        return [
+            [doc["id"] for doc in _metadata_zip_documents(response, filename)]
+            for filename in ["biosamples.json", "studies.json"]
+        ]
+
+    assert download("sample2") == [["sample2"], ["study"]]
+    assert download("missing") == [[], []]
+
+
+def test_metadata_download_writes_documents_as_stored(db: Session, client: TestClient):
+    fakes.BiosampleFactory(id="sample1")
+    document = {"id": "sample1", "name": "Échantillon du sol", "depth": {"value": 0.5}}
+    add_documents(
+        db,
+        [
+            models.BiosampleRelatedDocument(
+                id="sample1",
+                biosample_ids=["sample1"],
+                high_level_type="nmdc:Biosample",
+                document=document,
+            )
+        ],
+    )
+    db.commit()
+
+    response = client.post("/api/download_metadata", json={"endpoints": ["nmdc:Biosample"]})
+
+    assert response.status_code == 200
+    assert _metadata_zip_documents(response, "biosamples.json") == [document]
+
+
+def test_metadata_export(db: Session, client: TestClient, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "metadata_export_dir", str(tmp_path))
+    fakes.BiosampleFactory(id="sample1")
+    add_documents(
+        db,
+        [
+            models.BiosampleRelatedDocument(
+                id="sample1",
+                biosample_ids=["sample1"],
+                high_level_type="nmdc:Biosample",
+                document={"id": "sample1"},
+            )
+        ],
+    )
+    db.commit()
+    request = {"endpoints": ["nmdc:Biosample"]}
+
+    response = client.post("/api/metadata_export", json=request)
+    assert response.status_code == 202
+    export_id = response.json()["id"]
+    for _ in range(100):
+        export = client.get(f"/api/metadata_export/{export_id}").json()
+        if export["status"] not in ["pending", "running"]:
+            break
+        time.sleep(0.1)
+    assert export["status"] == "complete"
+
+    # An identical export reuses the archive.
+    assert client.post("/api/metadata_export", json=request).json()["id"] == export_id
+
+    response = client.get(f"/api/metadata_export/{export_id}/download")
+    assert response.status_code == 200
+    assert int(response.headers["content-length"]) == export["size"]
+    assert _metadata_zip_documents(response, "biosamples.json") == [{"id": "sample1"}]
+
+    archive = response.content
+    response = client.get(
+        f"/api/metadata_export/{export_id}/download", headers={"Range": "bytes=10-"}
+    )
+    assert response.status_code == 206
+    assert response.content == archive[10:]
+
+
+def test_metadata_export_of_previous_generation(db: Session, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "metadata_export_dir", str(tmp_path))
+    db.add(models.IngestGeneration(generation="new"))
+    (tmp_path / "new").mkdir()
+    (tmp_path / "new" / "current.zip").write_bytes(b"archive")
+    (tmp_path / "old").mkdir()
+    (tmp_path / "old" / "previous.zip").write_bytes(b"archive")
+    (tmp_path / "old" / "other.partial").write_bytes(b"partial")
+    search = {"conditions": [], "endpoints": ["nmdc:Biosample"]}
+    old_export = models.MetadataExport(key="key", generation="old", search=search)
+    new_export = models.MetadataExport(key="key", generation="new", search=search)
+    db.add_all([old_export, new_export])
+    db.commit()
+
+    # An export submitted before the last ingest finishes after it.
+    metadata_export._run_export(UUID(str(old_export.id)))
+    db.refresh(old_export)
+    assert old_export.status == models.MetadataExportStatus.failed
+    assert not (tmp_path / "old" / "key.zip").exists()
+    assert (tmp_path / "new" / "current.zip").exists()
+    assert (tmp_path / "old" / "previous.zip").exists()
+
+    metadata_export._run_export(UUID(str(new_export.id)))
+    db.refresh(new_export)
+    assert new_export.status == models.MetadataExportStatus.complete
+    assert (tmp_path / "new" / "key.zip").exists()
+    assert (tmp_path / "new" / "current.zip").exists()
+    assert not (tmp_path / "old" / "previous.zip").exists()
+    assert (tmp_path / "old" / "other.partial").exists()
+
+
+def test_orphaned_metadata_export(db: Session, client: TestClient):
+    search = {"conditions": [], "endpoints": ["nmdc:Biosample"]}
+    running = models.MetadataExportStatus.running
+    # The owner of the first export has exited, and this process owns the second one.
+    orphaned_export = models.MetadataExport(
+        key="key", generation="none", search=search, status=running, owner=1
+    )
+    live_export = models.MetadataExport(
+        key="key",
+        generation="none",
+        search=search,
+        status=running,
+        owner=metadata_export._get_owner(),
+    )
+    db.add_all([orphaned_export, live_export])
+    db.commit()
+
+    assert client.get(f"/api/metadata_export/{orphaned_export.id}").json()["status"] == "failed"
+    assert client.get(f"/api/metadata_export/{live_export.id}").json()["status"] == "running"
+
+
 def test_bulk_download_query(db: Session):
     sample = fakes.BiosampleFactory()
     op1 = fakes.OmicsProcessingFactory(biosample_inputs=[sample])
@@ -238,6 +407,31 @@ def test_generate_bulk_download_filtered(
     assert resp.status_code == 410
 
 
+def test_data_object_download_counts(db: Session, client: TestClient, logged_in_user):
+    sample = fakes.BiosampleFactory()
+    op = fakes.OmicsProcessingFactory(biosample_inputs=[sample])
+    raw = fakes.DataObjectFactory(
+        url="https://data.microbiomedata.org/data/raw",
+        omics_processing=op,
+        workflow_type=WorkflowActivityTypeEnum.raw_data.value,
+    )
+    op.outputs.append(raw)
+    db.commit()
+
+    resp = client.get(f"/api/data_object/{raw.id}/download")
+    assert resp.status_code == 200
+    resp = client.post("/api/bulk_download", json={"data_object_filter": [{}]})
+    assert resp.status_code == 201
+    db.expire_all()
+
+    assert crud.get_data_object_counts(db, [raw.id])[raw.id] == 2
+    assert db.get(models.DataObject, raw.id).downloads == 2
+
+    crud.rebuild_data_object_download_counts(db)
+    db.commit()
+    assert crud.get_data_object_counts(db, [raw.id])[raw.id] == 2
+
+
 def test_generate_rocrate_for_bulk_download_includes_compact_related_graph(db: Session):
     data_generation = fakes.OmicsProcessingFactory(
         id="nmdc:dgns-1",
@@ -355,7 +549,7 @@ def test_generate_rocrate_for_bulk_download_includes_compact_related_graph(db: S
             downstream_neighbor_ids=[],
         ),
     ]
-    db.add_all(documents)
+    add_documents(db, documents)
     bulk_download = models.BulkDownload(
         orcid="0000",
         ip="127.0.0.1",
@@ -497,14 +691,17 @@ def test_bulk_download_data_object_metadata_uses_archive_path(db: Session, clien
             path=path,
         )
     )
-    db.add(
-        models.BiosampleRelatedDocument(
-            id=data_object.id,
-            biosample_ids=["nmdc:bsm-1"],
-            high_level_type="nmdc:DataObject",
-            document={"id": data_object.id, "name": data_object.name, "url": data_object.url},
-            downstream_neighbor_ids=[],
-        )
+    add_documents(
+        db,
+        [
+            models.BiosampleRelatedDocument(
+                id=data_object.id,
+                biosample_ids=["nmdc:bsm-1"],
+                high_level_type="nmdc:DataObject",
+                document={"id": data_object.id, "name": data_object.name, "url": data_object.url},
+                downstream_neighbor_ids=[],
+            )
+        ],
     )
     db.commit()
 
@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy.orm.session import Session
+
+from nmdc_server import crud, facet_bitmap, query
+from nmdc_server.config import settings
+from tests import fakes
+
+
+@pytest.mark.parametrize(
+    "conditions",
+    [
+        [],
+        [{"table": "biosample", "field": "ecosystem", "op": "==", "value": "soil"}],
+        [
+            {"table": "biosample", "field": "ecosystem", "op": "==", "value": "soil"},
+            {"table": "biosample", "field": "ecosystem", "op": "==", "value": "water"},
+            {"table": "biosample", "field": "ecosystem_type", "op": "==", "value": "type1"},
+        ],
+        [
+            {"table": "biosample", "field": "ecosystem", "op": "==", "value": "soil"},
+            {"table": "biosample", "field": "depth", "op": "between", "value": [0, 5]},
+        ],
+        [{"table": "biosample", "field": "ecosystem", "op": "like", "value": "o"}],
+    ],
+)
+def test_bitmap_facet(db: Session, monkeypatch, conditions):
+    monkeypatch.setattr(settings, "bitmap_facets", True)
+    fakes.BiosampleFactory(id="sample1", ecosystem="soil", ecosystem_type="type1", depth=1)
+    fakes.BiosampleFactory(id="sample2", ecosystem="soil", ecosystem_type="type2", depth=10)
+    fakes.BiosampleFactory(id="sample3", ecosystem="water", ecosystem_type="type1", depth=2)
+    fakes.BiosampleFactory(id="sample4", ecosystem="air", ecosystem_type="type2", depth=3)
+    db.commit()
+
+    index = facet_bitmap.get_biosample_bitmap_index(db)
+    assert index is not None
+    q = query.BiosampleQuerySchema(conditions=conditions)
+    for attribute in ["ecosystem", "ecosystem_type"]:
+        assert index.facet(db, q, attribute) == q.facet(db, attribute)
+        assert crud.facet_biosample(db, attribute, q.conditions).facets == q.facet(db, attribute)
+
+    batch = crud.batch_facet_biosample(db, ["ecosystem", "depth"], q.conditions).facets
+    assert batch == {"ecosystem": q.facet(db, "ecosystem"), "depth": q.facet(db, "depth")}
+
+    # Attributes that aren't indexed are faceted with SQL.
+    assert index.facet(db, q, "depth") is None
+
+
+def test_bitmap_facet_disabled(db: Session):
+    assert facet_bitmap.get_biosample_bitmap_index(db) is None
@@ -0,0 +1,60 @@
+import io
+import threading
+import time
+import zipfile
+from unittest import mock
+
+import pytest
+
+from nmdc_server import crud, metadata_export, query
+from nmdc_server.metadata_export import CHUNK_SIZE, ZipStream, compress_entry
+
+
+def _archive(entries: dict[str, list[bytes]]) -> zipfile.ZipFile:
+    stream = ZipStream()
+    data = b"".join(
+        chunk
+        for filename, chunks in entries.items()
+        for chunk in stream.write(compress_entry(filename, chunks))
+    )
+    return zipfile.ZipFile(io.BytesIO(data + stream.close()))
+
+
+@pytest.mark.parametrize("zip64", [False, True])
+def test_zip_stream(monkeypatch, zip64: bool):
+    if zip64:
+        monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 16)
+    large = [bytes([i % 251]) * 1000 for i in range(2 * CHUNK_SIZE // 1000)]
+    entries = {"empty.json": [], "small.json": [b"[", b"\xc3\x89", b"]"], "large.json": large}
+
+    archive = _archive(entries)
+
+    assert archive.testzip() is None
+    assert archive.namelist() == list(entries)
+    for filename, chunks in entries.items():
+        assert archive.read(filename) == b"".join(chunks)
+
+
+def test_generate_metadata_zip_stops_when_closed(monkeypatch):
+    started = threading.Event()
+
+    def export_documents(q, export_id, high_level_type, filename, stop):
+        if high_level_type == "nmdc:Study":
+            # A slow document type, which runs until the export is abandoned.
+            started.set()
+            stop.wait(5)
+        return compress_entry(f"{filename}.json", [b"[]"])
+
+    monkeypatch.setattr(metadata_export, "SessionLocal", mock.MagicMock)
+    monkeypatch.setattr(crud, "store_export_biosample_ids", lambda db, export_id, conditions: None)
+    monkeypatch.setattr(crud, "delete_export_biosample_ids", lambda db, export_id: None)
+    monkeypatch.setattr(metadata_export, "_export_documents", export_documents)
+    archive = metadata_export.generate_metadata_zip(
+        query.MultiSearchQuery(endpoints=["nmdc:Biosample", "nmdc:Study"])
+    )
+
+    next(archive)
+    assert started.wait(5)
+    start = time.monotonic()
+    archive.close()
+    assert time.monotonic() - start < 1
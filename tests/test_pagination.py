@@ -1,9 +1,13 @@
 import re
 from typing import Any, Dict
 
+import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.orm.session import Session
 
+from nmdc_server import pagination
+from nmdc_server.config import settings
+from nmdc_server.ingest import generation
 from tests import fakes
 
 _link_re = re.compile('<(?P<url>[^>]*)>; rel="(?P<name>[^ ]*)"')
@@ -59,3 +63,101 @@ def test_last_page(db: Session, client: TestClient):
     assert "offset=0" in links["first"]
     assert "next" not in links
     assert "offset=9" in links["last"]
+
+
+def test_cursor_pages(db: Session, client: TestClient):
+    for _ in range(10):
+        fakes.BiosampleFactory()
+    generation.load(db)
+    db.commit()
+
+    pagination.count_cache.clear()
+    expected = [r["id"] for r in client.post("/api/biosample/search?limit=10").json()["results"]]
+
+    ids = []
+    url = "/api/biosample/search?limit=4&after="
+    while url:
+        resp = client.post(url)
+        assert resp.json()["count"] == 10
+        ids += [r["id"] for r in resp.json()["results"]]
+        links = parse_links(resp)
+        assert "after=" in links["first"]
+        url = links.get("next", "")
+        assert "offset" not in url
+    assert ids == expected
+    # Only the first page counted the results.
+    assert pagination.count_cache.stats()["misses"] == 1
+
+
+def test_cursor_pages_without_cached_count(db: Session, client: TestClient):
+    for _ in range(10):
+        fakes.BiosampleFactory()
+    db.commit()
+
+    resp = client.post("/api/biosample/search?limit=4&after=")
+    assert resp.json()["count"] == 10
+    assert resp.json()["count_exact"] is True
+
+    resp = client.post(parse_links(resp)["next"])
+    assert len(resp.json()["results"]) == 4
+    assert resp.json()["count_exact"] is False
+    assert resp.headers["Resource-Count-Estimated"] == "true"
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "invalid",
+        pagination.encode_cursor([1]),
+        pagination.encode_cursor(["1", "nmdc:bsm-1"]),
+        pagination.encode_cursor([True, "nmdc:bsm-1"]),
+        pagination.encode_cursor([1, 2]),
+    ],
+)
+def test_invalid_cursor(client: TestClient, cursor: str):
+    resp = client.post(f"/api/biosample/search?after={cursor}")
+    assert resp.status_code == 400
+
+
+def test_cached_count(db: Session, client: TestClient):
+    for _ in range(10):
+        fakes.BiosampleFactory()
+    generation.load(db)
+    db.commit()
+
+    pagination.count_cache.clear()
+    resp = client.post("/api/biosample/search?limit=4")
+    assert resp.json()["count"] == 10
+    resp = client.post("/api/biosample/search?limit=4&offset=4")
+    assert resp.json()["count"] == 10
+    assert resp.json()["count_exact"] is True
+    assert pagination.count_cache.stats()["misses"] == 1
+    assert pagination.count_cache.stats()["hits"] == 1
+
+
+def test_estimated_count(db: Session, client: TestClient, monkeypatch):
+    for _ in range(10):
+        fakes.BiosampleFactory()
+    db.commit()
+
+    resp = client.post("/api/biosample/search?count=estimate")
+    assert resp.json()["count"] == 10
+    assert resp.json()["count_exact"] is True
+
+    monkeypatch.setattr(settings, "count_estimate_threshold", 0)
+    resp = client.post("/api/biosample/search?count=estimate")
+    assert resp.json()["count_exact"] is False
+    assert resp.headers["Resource-Count-Estimated"] == "true"
+
+
+def test_estimated_count_with_array_parameter(db: Session, client: TestClient, monkeypatch):
+    samples = [fakes.BiosampleFactory() for _ in range(5)]
+    db.commit()
+    monkeypatch.setattr(settings, "count_estimate_threshold", 0)
+
+    # Enough equality conditions on `id` to be compared against a single array parameter
+    conditions = [{"table": "biosample", "field": "id", "value": s.id} for s in samples]
+    resp = client.post("/api/biosample/search?count=estimate", json={"conditions": conditions})
+    assert resp.status_code == 200
+    assert resp.json()["count_exact"] is False
+    assert len(resp.json()["results"]) == 5
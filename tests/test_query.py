@@ -5,6 +5,8 @@ import pytest
 from sqlalchemy.orm.session import Session
 
 from nmdc_server import models, query
+from nmdc_server.config import settings
+from nmdc_server.ingest import biosample_gene_function, generation
 from tests import fakes
 
 date0 = datetime(1990, 1, 1)
@@ -37,6 +39,31 @@ def test_string_query(db: Session, condition, expected):
     assert results == expected
 
 
+def test_query_plan_cache(db: Session):
+    fakes.BiosampleFactory(id="sample1", depth=1, annotations={"key1": "value1"})
+    fakes.BiosampleFactory(id="sample2", depth=2, annotations={"key1": "value2"})
+    db.commit()
+    query.query_plan_cache.clear()
+
+    def search(depth, value):
+        q = query.BiosampleQuerySchema(
+            conditions=[
+                {"table": "biosample", "field": "depth", "op": ">=", "value": depth},
+                {"table": "biosample", "field": "key1", "op": "==", "value": value},
+            ]
+        )
+        return {s.id for s in q.execute(db)}
+
+    assert search(1, "value1") == {"sample1"}
+    assert query.query_plan_cache.stats()["misses"] == 1
+
+    # The same condition shape reuses the plan with the new values bound.
+    assert search(2, "value2") == {"sample2"}
+    assert search(2, "value1") == set()
+    assert query.query_plan_cache.stats()["hits"] == 2
+    assert query.query_plan_cache.stats()["size"] == 1
+
+
 @pytest.mark.parametrize(
     "condition,expected",
     [
@@ -125,6 +152,61 @@ def test_study_search_biosample_conditions(db: Session):
     assert sample_3.study_id in results
 
 
+def test_collapse_equality_conditions(db: Session):
+    for i in range(6):
+        fakes.BiosampleFactory(id=f"sample{i}")
+    db.commit()
+
+    conditions = [
+        {"table": "biosample", "field": "id", "op": "==", "value": f"sample{i}"} for i in range(5)
+    ]
+    q = query.BiosampleQuerySchema(conditions=conditions)
+    [(_, group)] = q.condition_groups(db)
+    assert len(group) == 1
+    assert isinstance(group[0], query.ArrayConditionSchema)
+    assert {s.id for s in q.execute(db)} == {f"sample{i}" for i in range(5)}
+
+
+@pytest.mark.parametrize("planner", list(query.QueryPlanner))
+def test_query_planner(db: Session, planner):
+    study = fakes.StudyFactory(name="study")
+    sample = fakes.BiosampleFactory(
+        id="sample1", depth=1, annotations={"key1": "value1"}, study=study
+    )
+    fakes.BiosampleFactory(id="sample2", depth=2, annotations={"key1": "value1"}, study=study)
+    fakes.BiosampleFactory(id="sample3", depth=1, annotations={"key1": "value1"})
+    fakes.OmicsProcessingFactory(
+        annotations={"omics_type": "Metagenome"}, biosample_inputs=[sample]
+    )
+    db.commit()
+
+    token = query.query_planner.set(planner)
+    try:
+        q = query.BiosampleQuerySchema(
+            conditions=[
+                {"table": "biosample", "field": "depth", "op": "==", "value": 1},
+                {"table": "biosample", "field": "key1", "op": "==", "value": "value1"},
+                {"table": "study", "field": "name", "op": "==", "value": "study"},
+            ]
+        )
+        assert {s.id for s in q.execute(db)} == {"sample1"}
+
+        q = query.BiosampleQuerySchema(
+            conditions=[
+                {"table": "study", "field": "name", "op": "==", "value": "study"},
+                {
+                    "table": "omics_processing",
+                    "field": "omics_type",
+                    "op": "==",
+                    "value": "Metagenome",
+                },
+            ]
+        )
+        assert {s.id for s in q.execute(db)} == {"sample1"}
+    finally:
+        query.query_planner.reset(token)
+
+
 @pytest.mark.parametrize(
     "op,value,expected",
     [
@@ -617,3 +699,67 @@ def test_full_text_search_studies(db: Session):
     )
     results = {s.id for s in sample_q.execute(db)}
     assert results == {"sample1", "sample2"}
+
+
+def test_gene_function_index(db: Session, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_generation_check_interval", 0)
+    db.add_all(
+        [
+            models.KoTermToPathway(term="KO:K00001", pathway="map00010"),
+            models.KoTermToPathway(term="KO:K00002", pathway="map00010"),
+            models.GoTermToPfamEntry(term="GO:0000001", entry="PF00001"),
+            models.GoTermToKegg(term="GO:0000001", kegg_term="KO:K00003"),
+        ]
+    )
+    db.commit()
+
+    def transform(table, value):
+        condition = query.SimpleConditionSchema(table=table, field="id", value=value)
+        return [c.value for c in query.BiosampleQuerySchema().transform_condition(db, condition)]
+
+    assert transform("kegg_function", "KEGG.PATHWAY:MAP00010") == [
+        "KEGG.ORTHOLOGY:K00001",
+        "KEGG.ORTHOLOGY:K00002",
+    ]
+    assert transform("go_function", "GO:0000001") == ["KEGG.ORTHOLOGY:K00003", "PFAM:PF00001"]
+    assert transform("go_function", "GO:0000002") == ["GO:0000002"]
+    assert transform("kegg_function", "KEGG.MODULE:M00001") == []
+
+    # The index is rebuilt when a new ingest generation is recorded.
+    db.add(models.KoTermToModule(term="KO:K00004", module="M00001"))
+    generation.load(db)
+    db.commit()
+    assert transform("kegg_function", "KEGG.MODULE:M00001") == ["KEGG.ORTHOLOGY:K00004"]
+
+
+def test_biosample_gene_function_search(db: Session, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_generation_check_interval", 0)
+    biosample = fakes.BiosampleFactory()
+    other = fakes.BiosampleFactory()
+    omics_processing = fakes.OmicsProcessingFactory(biosample_inputs=[biosample])
+    fakes.OmicsProcessingFactory(biosample_inputs=[other])
+    annotation = fakes.MetagenomeAnnotationFactory(was_informed_by=[omics_processing])
+    gene_function = fakes.GeneFunction(id="KEGG.ORTHOLOGY:K00001")
+    db.add(
+        models.MGAGeneFunctionAggregation(
+            metagenome_annotation_id=annotation.id, gene_function_id=gene_function.id, count=1
+        )
+    )
+    db.commit()
+
+    def search(value):
+        q = query.BiosampleQuerySchema(
+            conditions=[{"table": "gene_function", "field": "id", "value": value}]
+        )
+        return {r.id for r in q.execute(db)}
+
+    # The aggregations are searched directly until the presence table is loaded.
+    assert search("KEGG.ORTHOLOGY:K00001") == {biosample.id}
+
+    biosample_gene_function.load(db)
+    generation.load(db)
+    db.commit()
+    assert biosample_gene_function.is_loaded(db)
+    assert db.query(models.BiosampleGeneFunction).count() == 1
+    assert search("KEGG.ORTHOLOGY:K00001") == {biosample.id}
+    assert search("KEGG.ORTHOLOGY:K00002") == set()